@@ -45,6 +45,10 @@ def _load_users() -> Dict[str, Any]:
 
     return {"users": {}}
 
+def list_usernames() -> list[str]:
+    """Usuarios dados de alta (para filtros), sin depender de qué filas haya traído una consulta."""
+    return sorted(str(u) for u in (_load_users().get("users") or {}))
+
 def _verify_password(password: str, entry: Dict[str, Any]) -> bool:
     """
     Valida password con bcrypt (password_hash).
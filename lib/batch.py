@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable, Iterator, Optional
+
+from lib.calc import (
+    TIPO_EXTENDIDO, TIPO_LIBRO,
+    FinishSelection, PricingParams, QuoteInputs, QuoteResult,
+)
+from lib.quote_cache import cached_price
+
+# -------------------------
+# Cotización por lote (CSV / JSONL -> filas con precio)
+# -------------------------
+# Formato de entrada (una fila = un trabajo). Columnas = campos de QuoteInputs:
+#   id, tipo_producto, ancho_final_cm, alto_final_cm, piezas, lados, paginas,
+#   hoja_w_cm, hoja_h_cm, area_w_cm, area_h_cm, bleed_cm, gutter_cm,
+#   allow_rotate, allow_mixed, tipo_papel, papel_gramaje_gm2, papel_key, n_tintas,
+#   acabados, extras
+# Columnas vacías o faltantes toman el default de QuoteInputs. papel_key (papel del
+# catálogo cfg["papeles"]) tiene prioridad sobre tipo_papel + gramaje.
+#
+# acabados (CSV):  "barniz_uv:coverage=0.5; doblado:folds=2; =Troquel manual:350"
+#   - key[:coverage=x,folds=x,mult=x]  -> acabado del catálogo
+#   - =Nombre:importe                   -> acabado manual (importe total)
+# extras (CSV):    "Flete=250; Empaque=80"
+# En JSONL ambos pueden venir como listas (dicts con los mismos nombres).
+
+OUTPUT_COLUMNS = [
+    "id",
+    "tipo_producto",
+    "piezas",
+    "piezas_por_lado",
+    "orientacion",
+    "hojas_fisicas",
+    "hojas_con_merma",
+    "unidades_carta_lado",
+    "clicks_maquina",
+    "costo_impresion",
+    "costo_papel",
+    "total_acabados",
+    "total_adicionales",
+    "subtotal_costos",
+    "margen",
+    "precio_unitario",
+    "precio_total",
+    "error",
+]
+
+_FLOAT_FIELDS = (
+    "ancho_final_cm", "alto_final_cm",
+    "hoja_w_cm", "hoja_h_cm", "area_w_cm", "area_h_cm",
+    "bleed_cm", "gutter_cm", "papel_gramaje_gm2",
+)
+_INT_FIELDS = ("piezas", "lados", "paginas", "n_tintas")
+_BOOL_FIELDS = ("allow_rotate", "allow_mixed")
+
+_FINISH_OPT_ALIASES = {
+    "coverage": "coverage",
+    "cov": "coverage",
+    "folds": "folds_per_sheet",
+    "folds_per_sheet": "folds_per_sheet",
+    "mult": "mult_per_piece",
+    "mult_per_piece": "mult_per_piece",
+}
+
+
+def _blank(v: Any) -> bool:
+    return v is None or (isinstance(v, str) and not v.strip())
+
+
+def _parse_bool(v: Any) -> bool:
+    if isinstance(v, bool):
+        return v
+    return str(v).strip().lower() in ("1", "true", "t", "si", "sí", "s", "yes", "y", "x")
+
+
+def _parse_tipo(v: Any) -> str:
+    s = str(v or "").strip().lower()
+    if s.startswith("lib") or s.startswith("fol"):
+        return TIPO_LIBRO
+    return TIPO_EXTENDIDO
+
+
+def _parse_acabados(v: Any) -> tuple[FinishSelection, ...]:
+    if _blank(v):
+        return ()
+
+    if isinstance(v, list):
+        out = []
+        for it in v:
+            if isinstance(it, str):
+                out.extend(_parse_acabados(it))
+            elif isinstance(it, dict):
+                is_manual = it.get("manual_total") is not None or (
+                    it.get("total") is not None and not (it.get("finish_key") or it.get("key"))
+                )
+                if is_manual:
+                    out.append(FinishSelection(
+                        display_name=str(it.get("display_name", "")),
+                        manual_total=float(it.get("manual_total", it.get("total")) or 0.0),
+                    ))
+                else:
+                    opts = {
+                        _FINISH_OPT_ALIASES[k]: float(it[k])
+                        for k in it
+                        if k in _FINISH_OPT_ALIASES and not _blank(it[k])
+                    }
+                    out.append(FinishSelection(
+                        finish_key=str(it.get("finish_key") or it.get("key") or ""),
+                        display_name=str(it.get("display_name", "")),
+                        **opts,
+                    ))
+        return tuple(out)
+
+    out = []
+    for tok in str(v).split(";"):
+        tok = tok.strip()
+        if not tok:
+            continue
+        if tok.startswith("="):
+            name, _, amount = tok[1:].rpartition(":")
+            out.append(FinishSelection(display_name=name.strip(), manual_total=float(amount)))
+            continue
+        key, _, opts_txt = tok.partition(":")
+        opts = {}
+        for pair in opts_txt.split(","):
+            k, _, val = pair.partition("=")
+            k = k.strip().lower()
+            if k in _FINISH_OPT_ALIASES and val.strip():
+                opts[_FINISH_OPT_ALIASES[k]] = float(val)
+        out.append(FinishSelection(finish_key=key.strip(), **opts))
+    return tuple(out)
+
+
+def _parse_extras(v: Any) -> tuple[tuple[str, float], ...]:
+    if _blank(v):
+        return ()
+    if isinstance(v, list):
+        out = []
+        for it in v:
+            if isinstance(it, dict):
+                out.append((str(it.get("concepto", it.get("Concepto", ""))), float(it.get("importe", it.get("Importe", 0.0)) or 0.0)))
+            elif isinstance(it, (list, tuple)) and len(it) == 2:
+                out.append((str(it[0]), float(it[1])))
+        return tuple(out)
+    out = []
+    for tok in str(v).split(";"):
+        concepto, _, importe = tok.rpartition("=")
+        if concepto.strip():
+            out.append((concepto.strip(), float(importe)))
+    return tuple(out)
+
+
+def inputs_from_record(rec: dict) -> QuoteInputs:
+    """Convierte una fila CSV/JSONL en QuoteInputs (ValueError si algo no se puede leer)."""
+    kw: dict[str, Any] = {}
+
+    if not _blank(rec.get("tipo_producto")):
+        kw["tipo_producto"] = _parse_tipo(rec["tipo_producto"])
+    for k in _FLOAT_FIELDS:
+        if not _blank(rec.get(k)):
+            kw[k] = float(rec[k])
+    for k in _INT_FIELDS:
+        if not _blank(rec.get(k)):
+            kw[k] = int(float(rec[k]))
+    for k in _BOOL_FIELDS:
+        if not _blank(rec.get(k)):
+            kw[k] = _parse_bool(rec[k])
+    if not _blank(rec.get("tipo_papel")):
+        kw["tipo_papel"] = str(rec["tipo_papel"]).strip()
+    if not _blank(rec.get("papel_key")):
+        kw["papel_key"] = str(rec["papel_key"]).strip()
+
+    acabados = rec.get("acabados")
+    if isinstance(acabados, str) and acabados.strip().startswith("["):
+        acabados = json.loads(acabados)
+    kw["acabados"] = _parse_acabados(acabados)
+
+    extras = rec.get("extras")
+    if isinstance(extras, str) and extras.strip().startswith("["):
+        extras = json.loads(extras)
+    kw["extras"] = _parse_extras(extras)
+
+    if kw.get("tipo_producto") == TIPO_LIBRO:
+        kw["lados"] = 2  # libro: siempre frente y vuelta
+
+    inputs = QuoteInputs(**kw)
+    if inputs.piezas <= 0:
+        raise ValueError("piezas debe ser > 0")
+    if inputs.tipo_producto == TIPO_LIBRO and inputs.paginas <= 0:
+        raise ValueError("paginas debe ser > 0 para libro/folleto")
+    return inputs
+
+
+def result_row(rec_id: Any, res: QuoteResult) -> dict:
+    row = {
+        "id": rec_id,
+        "tipo_producto": res.inputs.tipo_producto,
+        "piezas": res.inputs.piezas,
+        "piezas_por_lado": res.piezas_por_lado,
+        "orientacion": res.orientacion,
+        "hojas_fisicas": res.hojas_fisicas,
+        "hojas_con_merma": res.hojas_con_merma,
+        "unidades_carta_lado": round(res.unidades_carta_lado, 4),
+        "clicks_maquina": res.clicks_maquina,
+        "costo_impresion": round(res.costo_impresion, 4),
+        "costo_papel": round(res.costo_papel, 4),
+        "total_acabados": round(res.total_acabados, 4),
+        "total_adicionales": round(res.total_adicionales, 4),
+        "subtotal_costos": round(res.subtotal_costos, 4),
+        "margen": res.margen,
+        "precio_unitario": round(res.precio_unitario, 6),
+        "precio_total": round(res.precio_total, 4),
+        "error": "",
+    }
+    if not res.restriccion_ok:
+        row["error"] = res.motivo
+    missing = [it.get("finish_key", "") for it in res.acabados_items if (it.get("breakdown") or {}).get("missing_in_catalog")]
+    if missing:
+        row["error"] = (row["error"] + " | " if row["error"] else "") + f"acabado no existe en catálogo: {', '.join(missing)}"
+    return row
+
+
+def price_record(rec: dict, params: PricingParams) -> dict:
+    """Cotiza una fila; los errores se reportan en la columna 'error' (no detienen el lote)."""
+    rec_id = rec.get("id", "")
+    try:
+        return result_row(rec_id, cached_price(inputs_from_record(rec), params))
+    except Exception as e:
+        row = {c: "" for c in OUTPUT_COLUMNS}
+        row["id"] = rec_id
+        row["error"] = f"{type(e).__name__}: {e}"
+        return row
+
+
+def chunked(records: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    buf: list[dict] = []
+    for rec in records:
+        buf.append(rec)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def price_records(records: Iterable[dict], params: PricingParams, ids_from: Optional[int] = None) -> list[dict]:
+    """Cotiza una lista de filas en el proceso actual (lo usa cada worker del pool)."""
+    out = []
+    for i, rec in enumerate(records):
+        if ids_from is not None and _blank(rec.get("id")):
+            rec = {**rec, "id": ids_from + i}
+        out.append(price_record(rec, params))
+    return out
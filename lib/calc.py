@@ -0,0 +1,732 @@
+from __future__ import annotations
+
+import hashlib
+import math
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from lib.config_store import derived_from_config
+from lib.finishes import CompiledCatalog, FinishEvaluator, compile_catalog
+from lib.imposition import best_layout
+from lib.papers import PaperCatalog, compile_papers
+
+# -------------------------
+# Constantes
+# -------------------------
+CARTA_W = 21.5
+CARTA_H = 28.0
+AREA_CARTA_CM2 = CARTA_W * CARTA_H  # 602 cm²
+
+DEFAULT_HOJA_W = 48.0
+DEFAULT_HOJA_H = 33.0
+DEFAULT_AREA_W = 47.4
+DEFAULT_AREA_H = 32.4
+
+TIPO_EXTENDIDO = "Extendido"
+TIPO_LIBRO = "Libro / Folleto (interiores)"
+
+PAPEL_TIPOS = ("Couché", "Bond", "Especial")
+
+
+# -------------------------
+# Fórmulas base
+# -------------------------
+def factor_vs_carta(ancho_cm: float, alto_cm: float) -> float:
+    return (ancho_cm * alto_cm) / AREA_CARTA_CM2
+
+
+def calc_piezas_por_lado(
+    area_w_cm: float,
+    area_h_cm: float,
+    pieza_w_cm: float,
+    pieza_h_cm: float,
+    gutter_cm: float,
+    bleed_cm: float,
+    allow_rotate: bool,
+    allow_mixed: bool = False,
+) -> tuple[int, str, float, float]:
+    """
+    Devuelve (piezas_por_lado, orientacion, w_eff, h_eff).
+    La búsqueda vive en lib/imposition.py (memorizada); con allow_mixed también
+    prueba bloque normal + franja rotada.
+    """
+    layout = best_layout(
+        float(area_w_cm), float(area_h_cm),
+        float(pieza_w_cm), float(pieza_h_cm),
+        float(bleed_cm), float(gutter_cm),
+        bool(allow_rotate), bool(allow_mixed),
+    )
+    return layout.up, layout.describe(), layout.w_eff_cm, layout.h_eff_cm
+
+
+def check_restrictions(
+    tipo_producto: str,
+    area_w_cm: float,
+    area_h_cm: float,
+    ancho_cm: float,
+    alto_cm: float,
+    bleed_cm: float,
+    piezas_por_lado: int,
+) -> tuple[bool, str]:
+    """Devuelve (ok, motivo). motivo vacío si ok."""
+    area_huella = area_w_cm * area_h_cm
+    area_pieza_eff = (ancho_cm + 2 * bleed_cm) * (alto_cm + 2 * bleed_cm)
+
+    ok = True
+    motivo = ""
+
+    if piezas_por_lado <= 0:
+        ok = False
+        motivo = "La pieza no cabe en el área útil (huella) del tabloide con estos parámetros."
+
+    if tipo_producto == TIPO_LIBRO:
+        if area_pieza_eff > 0.5 * area_huella:
+            ok = False
+            motivo = "Para libro/folleto (doblado), el área final (con sangrado) debe ser ≤ 50% del área útil del tabloide."
+
+    return ok, motivo
+
+
+def paper_cost_for_sheet(w_cm: float, h_cm: float, gramaje_gm2: float, costo_kg: float) -> tuple[float, float, float]:
+    """Devuelve (area_m2, peso_hoja_kg, costo_hoja)"""
+    w_m = w_cm / 100.0
+    h_m = h_cm / 100.0
+    area_m2 = w_m * h_m
+    peso_kg = area_m2 * gramaje_gm2 / 1000.0
+    costo_hoja = peso_kg * costo_kg
+    return area_m2, peso_kg, costo_hoja
+
+
+def compute_finish_cost(fdef: dict, metrics: dict, user_inputs: dict) -> dict:
+    """
+    Costo de un acabado (dict de breakdown).
+    - Si basis == sheet_m2_total => SIEMPRE aplica coverage (default 1.0)
+    Para muchos cálculos contra el mismo catálogo usar PricingParams.catalog
+    (evaluadores ya compilados, ver lib/finishes.py).
+    """
+    return FinishEvaluator.from_def(fdef).evaluate(metrics, user_inputs)
+
+
+# -------------------------
+# Tipos
+# -------------------------
+@dataclass(frozen=True, slots=True)
+class PricingParams:
+    """Parámetros de costo ya extraídos/convertidos de la config (una vez por config)."""
+    mo_dep: float
+    tinta_cmyk_base: float
+    click_base: float
+    cobertura_op: float
+    cov_base: float
+    papel_costos_kg: Dict[str, float]
+    merma_papel: float
+    margen: float
+    finishes_by_key: Dict[str, dict] = field(default_factory=dict)
+    catalog: CompiledCatalog = field(default_factory=lambda: compile_catalog([]))
+    papers: PaperCatalog = field(default_factory=lambda: compile_papers([]))
+    version: str = ""  # hash de todo lo que mueve el precio (llave de caché)
+
+
+@dataclass(frozen=True, slots=True)
+class FinishSelection:
+    """
+    Acabado elegido en una cotización.
+    - Catálogo: finish_key + inputs de usuario (coverage / folds_per_sheet / mult_per_piece)
+    - Manual: manual_total != None (importe total capturado a mano)
+    """
+    finish_key: str = ""
+    display_name: str = ""
+    coverage: Optional[float] = None
+    folds_per_sheet: Optional[float] = None
+    mult_per_piece: Optional[float] = None
+    manual_total: Optional[float] = None
+
+
+@dataclass(frozen=True, slots=True)
+class QuoteInputs:
+    tipo_producto: str = TIPO_EXTENDIDO
+    ancho_final_cm: float = CARTA_W
+    alto_final_cm: float = CARTA_H
+
+    # Extendido: piezas = tiraje en piezas; Libro: piezas = tiraje en libros
+    piezas: int = 1000
+    lados: int = 1
+    paginas: int = 0  # páginas interiores por libro (solo libro)
+
+    hoja_w_cm: float = DEFAULT_HOJA_W
+    hoja_h_cm: float = DEFAULT_HOJA_H
+    area_w_cm: float = DEFAULT_AREA_W
+    area_h_cm: float = DEFAULT_AREA_H
+    bleed_cm: float = 0.3
+    gutter_cm: float = 0.2
+    allow_rotate: bool = True
+    allow_mixed: bool = False  # cubicación mixta (bloque normal + franja rotada)
+
+    tipo_papel: str = "Couché"
+    papel_gramaje_gm2: float = 150.0
+    papel_key: str = ""  # papel del catálogo (cfg["papeles"]); vacío = tipo genérico + gramaje
+    n_tintas: int = 4
+
+    acabados: tuple[FinishSelection, ...] = ()
+    extras: tuple[tuple[str, float], ...] = ()  # (concepto, importe)
+
+
+@dataclass(frozen=True, slots=True)
+class QuoteResult:
+    inputs: QuoteInputs
+
+    factor_carta: float
+    piezas_por_lado: int
+    orientacion: str
+    w_eff_cm: float
+    h_eff_cm: float
+    restriccion_ok: bool
+    motivo: str
+
+    paginas_totales: int
+    unidades_carta_lado: float
+    hojas_fisicas: int
+    hojas_con_merma: int
+    clicks_maquina: int
+    clicks_facturable: float
+    metrics: Dict[str, Any]
+
+    factor_tintas: float
+    tinta_unit: float
+    click_unit: float
+    costo_unitario_carta_lado: float
+    costo_mo_dep: float
+    costo_tinta: float
+    costo_click: float
+    costo_cobertura_op: float
+    costo_impresion: float
+
+    papel_costo_kg: float
+    area_hoja_m2: float
+    peso_hoja_kg: float
+    costo_hoja: float
+    costo_papel: float
+
+    acabados_items: tuple[dict, ...]
+    total_acabados: float
+    total_adicionales: float
+
+    subtotal_costos: float
+    margen: float
+    precio_total: float
+    precio_unitario: float
+
+
+# -------------------------
+# Config -> parámetros
+# -------------------------
+def params_from_config(cfg: dict) -> PricingParams:
+    """
+    PricingParams de una config. Con la config vigente (get_config) se arman una
+    vez por revisión cargada; reruns y otras sesiones reusan el mismo objeto.
+    """
+    return derived_from_config(cfg, "pricing_params", _params_from_config)
+
+
+def _params_from_config(cfg: dict) -> PricingParams:
+    imp_cfg = cfg.get("impresion", {}) or {}
+    pap_cfg = cfg.get("papel", {}) or {}
+
+    finishes = cfg.get("acabados") or []
+    finishes_by_key = {
+        str(f.get("key")): f
+        for f in finishes
+        if isinstance(f, dict) and str(f.get("key", "")).strip()
+    }
+
+    params = PricingParams(
+        mo_dep=float(imp_cfg.get("mo_dep", 0.0)),
+        tinta_cmyk_base=float(imp_cfg.get("tinta_cmyk_base", imp_cfg.get("tinta", 0.0))),
+        click_base=float(imp_cfg.get("click_base", imp_cfg.get("click", 0.0))),
+        cobertura_op=float(imp_cfg.get("cobertura_op", imp_cfg.get("cobertura", 0.0))),
+        cov_base=max(float(imp_cfg.get("cobertura_tinta_base_pct", 7.5)), 0.0001),
+        papel_costos_kg={
+            "Couché": float(pap_cfg.get("cuche_costo_kg", 0.0)),
+            "Bond": float(pap_cfg.get("bond_costo_kg", 0.0)),
+            "Especial": float(pap_cfg.get("especial_costo_kg", 0.0)),
+        },
+        merma_papel=float(pap_cfg.get("merma", 0.0)),
+        margen=float((cfg.get("margen", {}) or {}).get("margen", 0.0)),
+        finishes_by_key=finishes_by_key,
+        catalog=compile_catalog(finishes),
+        papers=compile_papers(cfg.get("papeles") or [], cfg.get("pliegos") or []),
+    )
+    return replace(params, version=pricing_version(params))
+
+
+def pricing_version(p: PricingParams) -> str:
+    """Huella de los parámetros que afectan price(): misma versión -> mismos precios."""
+    raw = repr((
+        p.mo_dep, p.tinta_cmyk_base, p.click_base, p.cobertura_op, p.cov_base,
+        sorted(p.papel_costos_kg.items()), p.merma_papel, p.margen,
+        p.catalog.version, p.papers.version,
+    ))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _as_params(config: dict | PricingParams) -> PricingParams:
+    if isinstance(config, PricingParams):
+        return config
+    return params_from_config(config)
+
+
+# -------------------------
+# Papel (catálogo o tipo genérico)
+# -------------------------
+def paper_sheet(inputs: QuoteInputs, p: PricingParams) -> tuple[float, float, float, float]:
+    """($/kg aplicado, area_m2, peso_hoja_kg, costo_hoja) de la hoja de impresión."""
+    stock = p.papers.get(inputs.papel_key)
+    if stock is not None:
+        area_m2, peso_kg, costo_hoja = p.papers.sheet_cost(stock.key, inputs.hoja_w_cm, inputs.hoja_h_cm)
+        return stock.costo_kg_efectivo, area_m2, peso_kg, costo_hoja
+    costo_kg = float(p.papel_costos_kg.get(inputs.tipo_papel, 0.0))
+    area_m2, peso_kg, costo_hoja = paper_cost_for_sheet(
+        inputs.hoja_w_cm, inputs.hoja_h_cm, inputs.papel_gramaje_gm2, costo_kg
+    )
+    return costo_kg, area_m2, peso_kg, costo_hoja
+
+
+# -------------------------
+# Acabados (selección <-> items guardados)
+# -------------------------
+def finish_user_inputs(sel: FinishSelection, fdef: dict) -> dict:
+    """Reconstruye el dict user_inputs que espera compute_finish_cost."""
+    user_inputs = {}
+    if fdef.get("basis") == "sheet_m2_total":
+        user_inputs["coverage"] = 1.0 if sel.coverage is None else float(sel.coverage)
+    if sel.folds_per_sheet is not None or "folds_per_sheet" in (fdef.get("requires") or []):
+        user_inputs["folds_per_sheet"] = 1.0 if sel.folds_per_sheet is None else float(sel.folds_per_sheet)
+    if sel.mult_per_piece is not None:
+        user_inputs["mult_per_piece"] = float(sel.mult_per_piece)
+    return user_inputs
+
+
+def selections_from_items(items: list[dict] | None) -> tuple[FinishSelection, ...]:
+    """Convierte acabados_items (session_state / inputs guardados) a FinishSelection."""
+    out = []
+    for it in (items or []):
+        if not isinstance(it, dict):
+            continue
+        if it.get("type") == "manual_total":
+            out.append(FinishSelection(
+                display_name=str(it.get("display_name", "")),
+                manual_total=float(it.get("total", 0.0) or 0.0),
+            ))
+            continue
+        ui = it.get("inputs") or {}
+        out.append(FinishSelection(
+            finish_key=str(it.get("finish_key", "")),
+            display_name=str(it.get("display_name", "")),
+            coverage=(float(ui["coverage"]) if "coverage" in ui else None),
+            folds_per_sheet=(float(ui["folds_per_sheet"]) if "folds_per_sheet" in ui else None),
+            mult_per_piece=(float(ui["mult_per_piece"]) if "mult_per_piece" in ui else None),
+        ))
+    return tuple(out)
+
+
+def price_finish_items(
+    selections: tuple[FinishSelection, ...],
+    params: PricingParams,
+    metrics: dict,
+) -> tuple[list[dict], float]:
+    """Calcula acabados contra las métricas actuales. Devuelve (items, total)."""
+    items: list[dict] = []
+    total = 0.0
+    for sel in selections:
+        if sel.manual_total is not None:
+            it = {
+                "type": "manual_total",
+                "display_name": sel.display_name,
+                "total": float(sel.manual_total),
+                "breakdown": {"manual_total": True},
+            }
+        else:
+            fdef = params.finishes_by_key.get(sel.finish_key)
+            ev = params.catalog.get(sel.finish_key)
+            if fdef is None or ev is None:
+                # acabado borrado del catálogo: se conserva en la lista pero no se cobra
+                items.append({
+                    "type": "computed",
+                    "finish_key": sel.finish_key,
+                    "display_name": sel.display_name,
+                    "inputs": {},
+                    "total": 0.0,
+                    "breakdown": {"missing_in_catalog": True},
+                })
+                continue
+            user_inputs = finish_user_inputs(sel, fdef)
+            preview = ev.evaluate(metrics, user_inputs)
+            it = {
+                "type": "computed",
+                "finish_key": sel.finish_key,
+                "display_name": sel.display_name or fdef.get("display_name", ""),
+                "inputs": user_inputs,
+                "total": float(preview["total"]),
+                "breakdown": preview,
+            }
+        items.append(it)
+        total += float(it["total"])
+    return items, float(total)
+
+
+# -------------------------
+# Motor de precio
+# -------------------------
+def _unidades_carta_lado(inputs: QuoteInputs, factor_carta: float) -> float:
+    """Cartas-lado facturables: dependen de la pieza y el tiraje, no de la hoja."""
+    if inputs.tipo_producto == TIPO_EXTENDIDO:
+        return float(int(inputs.piezas)) * float(factor_carta) * float(int(inputs.lados))
+    return float(int(inputs.piezas) * int(inputs.paginas)) * float(factor_carta)
+
+
+def _costos_impresion(unidades_carta_lado: float, n_tintas: int, p: PricingParams) -> tuple[float, ...]:
+    """(tinta_unit, click_unit, mo_dep, tinta, click, cobertura_op, total) por carta-lado."""
+    factor_tintas = float(n_tintas) / 4.0
+    tinta_unit = p.tinta_cmyk_base * factor_tintas
+    click_unit = p.click_base * factor_tintas
+    costo_mo_dep = unidades_carta_lado * p.mo_dep
+    costo_tinta = unidades_carta_lado * tinta_unit
+    costo_click = unidades_carta_lado * click_unit
+    costo_cobertura_op = unidades_carta_lado * p.cobertura_op
+    total = costo_mo_dep + costo_tinta + costo_click + costo_cobertura_op
+    return tinta_unit, click_unit, costo_mo_dep, costo_tinta, costo_click, costo_cobertura_op, total
+
+
+def price(inputs: QuoteInputs, config: dict | PricingParams) -> QuoteResult:
+    """
+    Punto de entrada único del cotizador: mismos cálculos que la página 1_Cotizador.
+    `config` puede ser la config normalizada (dict) o PricingParams ya extraídos.
+    """
+    p = _as_params(config)
+    es_extendido = inputs.tipo_producto == TIPO_EXTENDIDO
+
+    ancho = float(inputs.ancho_final_cm)
+    alto = float(inputs.alto_final_cm)
+    factor_carta = factor_vs_carta(ancho, alto)
+
+    # Cubicación
+    piezas_por_lado, orientacion, w_eff, h_eff = calc_piezas_por_lado(
+        inputs.area_w_cm, inputs.area_h_cm,
+        ancho, alto,
+        inputs.gutter_cm, inputs.bleed_cm,
+        inputs.allow_rotate, inputs.allow_mixed,
+    )
+    restriccion_ok, motivo = check_restrictions(
+        inputs.tipo_producto,
+        inputs.area_w_cm, inputs.area_h_cm,
+        ancho, alto, inputs.bleed_cm,
+        piezas_por_lado,
+    )
+
+    # Tiraje / hojas / unidades
+    piezas = int(inputs.piezas)
+    paginas_totales = 0
+    unidades_carta_lado = _unidades_carta_lado(inputs, factor_carta)
+    if es_extendido:
+        lados = int(inputs.lados)
+        hojas_fisicas = math.ceil(piezas / max(int(piezas_por_lado), 1))
+        clicks_maquina = int(hojas_fisicas) * lados
+    else:
+        paginas_totales = piezas * int(inputs.paginas)
+        hojas_fisicas = math.ceil(paginas_totales / max(int(piezas_por_lado) * 2, 1))
+        clicks_maquina = int(hojas_fisicas) * 2
+    clicks_facturable = float(unidades_carta_lado)
+
+    # Métricas acabados
+    sheet_area_m2 = (float(inputs.hoja_w_cm) / 100.0) * (float(inputs.hoja_h_cm) / 100.0)
+    metrics = {
+        "sheet_m2_total": float(sheet_area_m2 * int(hojas_fisicas)),
+        "sheets_total": int(hojas_fisicas),
+        "pieces_total": int(piezas),
+    }
+
+    # Costos impresión
+    factor_tintas = float(inputs.n_tintas) / 4.0
+    (
+        tinta_unit, click_unit, costo_mo_dep, costo_tinta, costo_click, costo_cobertura_op, costo_impresion,
+    ) = _costos_impresion(unidades_carta_lado, inputs.n_tintas, p)
+
+    # Costo papel (catálogo: lectura de tabla)
+    papel_costo_kg, area_m2, peso_hoja_kg, costo_hoja = paper_sheet(inputs, p)
+    hojas_con_merma = math.ceil(hojas_fisicas * (1 + p.merma_papel))
+    costo_papel = hojas_con_merma * costo_hoja
+
+    # Acabados + extras
+    acabados_items, total_acabados = price_finish_items(inputs.acabados, p, metrics)
+    total_adicionales = float(sum(
+        float(importe) for concepto, importe in inputs.extras if str(concepto).strip()
+    ))
+
+    # Subtotal y precio
+    subtotal_costos = costo_impresion + costo_papel + total_acabados + total_adicionales
+    precio_total = subtotal_costos * (1 + p.margen)
+    precio_unitario = precio_total / max(piezas, 1)
+
+    return QuoteResult(
+        inputs=inputs,
+        factor_carta=float(factor_carta),
+        piezas_por_lado=int(piezas_por_lado),
+        orientacion=orientacion,
+        w_eff_cm=float(w_eff),
+        h_eff_cm=float(h_eff),
+        restriccion_ok=restriccion_ok,
+        motivo=motivo,
+        paginas_totales=int(paginas_totales),
+        unidades_carta_lado=float(unidades_carta_lado),
+        hojas_fisicas=int(hojas_fisicas),
+        hojas_con_merma=int(hojas_con_merma),
+        clicks_maquina=int(clicks_maquina),
+        clicks_facturable=float(clicks_facturable),
+        metrics=metrics,
+        factor_tintas=float(factor_tintas),
+        tinta_unit=float(tinta_unit),
+        click_unit=float(click_unit),
+        costo_unitario_carta_lado=float(p.mo_dep + tinta_unit + click_unit + p.cobertura_op),
+        costo_mo_dep=float(costo_mo_dep),
+        costo_tinta=float(costo_tinta),
+        costo_click=float(costo_click),
+        costo_cobertura_op=float(costo_cobertura_op),
+        costo_impresion=float(costo_impresion),
+        papel_costo_kg=papel_costo_kg,
+        area_hoja_m2=float(area_m2),
+        peso_hoja_kg=float(peso_hoja_kg),
+        costo_hoja=float(costo_hoja),
+        costo_papel=float(costo_papel),
+        acabados_items=tuple(acabados_items),
+        total_acabados=float(total_acabados),
+        total_adicionales=float(total_adicionales),
+        subtotal_costos=float(subtotal_costos),
+        margen=float(p.margen),
+        precio_total=float(precio_total),
+        precio_unitario=float(precio_unitario),
+    )
+
+
+# -------------------------
+# Escalera de precios (vectorizada)
+# -------------------------
+def price_ladder(
+    inputs: QuoteInputs,
+    config: dict | PricingParams,
+    quantities: Sequence[int],
+    lados_options: Sequence[int] | None = None,
+    tintas_options: Sequence[int] | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Precio para varios tirajes (y variantes lados/tintas) en una sola pasada NumPy.
+    Mismas fórmulas que price(); la cubicación no depende del tiraje, se calcula una vez.
+
+    Devuelve arrays alineados (una fila por combinación tiraje × lados × tintas):
+      piezas, lados, n_tintas, unidades_carta_lado, hojas_fisicas, hojas_con_merma,
+      costo_impresion, costo_papel, total_acabados, subtotal_costos, precio_total, precio_unitario
+    """
+    p = _as_params(config)
+    es_extendido = inputs.tipo_producto == TIPO_EXTENDIDO
+
+    if not es_extendido:
+        lados_options = [2]  # libro: siempre frente y vuelta
+    lados_options = list(lados_options or [inputs.lados])
+    tintas_options = list(tintas_options or [inputs.n_tintas])
+
+    # Grid: tiraje × lados × tintas (aplanado)
+    q, lados, tintas = np.meshgrid(
+        np.asarray(quantities, dtype=np.int64),
+        np.asarray(lados_options, dtype=np.int64),
+        np.asarray(tintas_options, dtype=np.int64),
+        indexing="ij",
+    )
+    q = q.ravel()
+    lados = lados.ravel()
+    tintas = tintas.ravel()
+
+    factor_carta = factor_vs_carta(float(inputs.ancho_final_cm), float(inputs.alto_final_cm))
+    piezas_por_lado, _, _, _ = calc_piezas_por_lado(
+        inputs.area_w_cm, inputs.area_h_cm,
+        inputs.ancho_final_cm, inputs.alto_final_cm,
+        inputs.gutter_cm, inputs.bleed_cm,
+        inputs.allow_rotate, inputs.allow_mixed,
+    )
+
+    # Tiraje / hojas / unidades
+    if es_extendido:
+        unidades_carta_lado = q * float(factor_carta) * lados
+        hojas_fisicas = np.ceil(q / max(int(piezas_por_lado), 1))
+    else:
+        paginas_totales = q * int(inputs.paginas)
+        unidades_carta_lado = paginas_totales * float(factor_carta)
+        hojas_fisicas = np.ceil(paginas_totales / max(int(piezas_por_lado) * 2, 1))
+
+    # Impresión
+    factor_tintas = tintas / 4.0
+    costo_unitario = p.mo_dep + p.tinta_cmyk_base * factor_tintas + p.click_base * factor_tintas + p.cobertura_op
+    costo_impresion = unidades_carta_lado * costo_unitario
+
+    # Papel
+    _, area_m2, _, costo_hoja = paper_sheet(inputs, p)
+    hojas_con_merma = np.ceil(hojas_fisicas * (1 + p.merma_papel))
+    costo_papel = hojas_con_merma * costo_hoja
+
+    # Acabados (mismas selecciones, métricas por tiraje)
+    metrics = {
+        "sheet_m2_total": area_m2 * hojas_fisicas,
+        "sheets_total": hojas_fisicas,
+        "pieces_total": q.astype(np.float64),
+    }
+    total_acabados = np.zeros(q.shape, dtype=np.float64)
+    for sel in inputs.acabados:
+        if sel.manual_total is not None:
+            total_acabados += float(sel.manual_total)
+            continue
+        fdef = p.finishes_by_key.get(sel.finish_key)
+        ev = p.catalog.get(sel.finish_key)
+        if fdef is None or ev is None:
+            continue
+        total_acabados += ev.total_array(metrics, finish_user_inputs(sel, fdef))
+
+    total_adicionales = float(sum(
+        float(importe) for concepto, importe in inputs.extras if str(concepto).strip()
+    ))
+
+    subtotal_costos = costo_impresion + costo_papel + total_acabados + total_adicionales
+    precio_total = subtotal_costos * (1 + p.margen)
+    precio_unitario = precio_total / np.maximum(q, 1)
+
+    return {
+        "piezas": q,
+        "lados": lados,
+        "n_tintas": tintas,
+        "unidades_carta_lado": unidades_carta_lado.astype(np.float64),
+        "hojas_fisicas": hojas_fisicas.astype(np.int64),
+        "hojas_con_merma": hojas_con_merma.astype(np.int64),
+        "costo_impresion": costo_impresion,
+        "costo_papel": costo_papel,
+        "total_acabados": total_acabados,
+        "subtotal_costos": subtotal_costos,
+        "precio_total": precio_total,
+        "precio_unitario": precio_unitario,
+    }
+
+
+# -------------------------
+# Optimizador de hoja (catálogo de pliegos)
+# -------------------------
+def rank_sheets(
+    inputs: QuoteInputs,
+    config: dict | PricingParams,
+    pliegos: Sequence[dict],
+) -> list[dict]:
+    """
+    Evalúa cada hoja activa del catálogo × orientación (tal cual / girada 90°)
+    y las ordena por costo (papel + impresión + acabados). Solo se calcula lo
+    que depende de la hoja: la cubicación (best_layout, memorizada; respeta
+    allow_rotate / allow_mixed como price) y papel / acabados en una pasada
+    NumPy. La impresión se cobra por carta-lado y es la misma para todas.
+    Las hojas donde la pieza no cabe (o no cumple la restricción de libro) se omiten.
+    """
+    p = _as_params(config)
+    es_extendido = inputs.tipo_producto == TIPO_EXTENDIDO
+
+    rows = []
+    for s in pliegos:
+        if not isinstance(s, dict) or not s.get("activo", True):
+            continue
+        hw, hh, aw, ah = (float(s[k]) for k in ("hoja_w", "hoja_h", "area_w", "area_h"))
+        rows.append((s, "Horizontal", hw, hh, aw, ah))
+        if hw != hh:
+            rows.append((s, "Vertical", hh, hw, ah, aw))
+    if not rows:
+        return []
+
+    hoja_w = np.array([r[2] for r in rows])
+    hoja_h = np.array([r[3] for r in rows])
+    area_w = np.array([r[4] for r in rows])
+    area_h = np.array([r[5] for r in rows])
+
+    # Cubicación: la misma búsqueda que price() (memorizada por huella)
+    w_eff = float(inputs.ancho_final_cm) + 2 * float(inputs.bleed_cm)
+    h_eff = float(inputs.alto_final_cm) + 2 * float(inputs.bleed_cm)
+    up = np.array([
+        calc_piezas_por_lado(
+            r[4], r[5],
+            inputs.ancho_final_cm, inputs.alto_final_cm,
+            inputs.gutter_cm, inputs.bleed_cm,
+            inputs.allow_rotate, inputs.allow_mixed,
+        )[0]
+        for r in rows
+    ], dtype=np.float64)
+
+    valid = up > 0
+    if not es_extendido:
+        valid &= (w_eff * h_eff) <= 0.5 * (area_w * area_h)
+
+    # Hojas
+    piezas = int(inputs.piezas)
+    up_safe = np.maximum(up, 1)
+    if es_extendido:
+        hojas_fisicas = np.ceil(piezas / up_safe)
+    else:
+        hojas_fisicas = np.ceil((piezas * int(inputs.paginas)) / (up_safe * 2))
+    hojas_con_merma = np.ceil(hojas_fisicas * (1 + p.merma_papel))
+
+    # Papel
+    area_m2 = (hoja_w / 100.0) * (hoja_h / 100.0)
+    stock = p.papers.get(inputs.papel_key)
+    if stock is not None:
+        costo_hoja = area_m2 * stock.costo_m2
+    else:
+        papel_costo_kg = float(p.papel_costos_kg.get(inputs.tipo_papel, 0.0))
+        costo_hoja = area_m2 * float(inputs.papel_gramaje_gm2) / 1000.0 * papel_costo_kg
+    costo_papel = hojas_con_merma * costo_hoja
+
+    # Impresión (se cobra por carta-lado: no depende de la hoja)
+    factor_carta = factor_vs_carta(float(inputs.ancho_final_cm), float(inputs.alto_final_cm))
+    costo_impresion = _costos_impresion(_unidades_carta_lado(inputs, factor_carta), inputs.n_tintas, p)[-1]
+
+    # Acabados que dependen de pliegos / m²
+    metrics = {
+        "sheet_m2_total": area_m2 * hojas_fisicas,
+        "sheets_total": hojas_fisicas,
+        "pieces_total": np.full(hojas_fisicas.shape, float(piezas)),
+    }
+    total_acabados = np.zeros(hojas_fisicas.shape, dtype=np.float64)
+    for sel in inputs.acabados:
+        if sel.manual_total is not None:
+            total_acabados += float(sel.manual_total)
+            continue
+        fdef = p.finishes_by_key.get(sel.finish_key)
+        ev = p.catalog.get(sel.finish_key)
+        if fdef is not None and ev is not None:
+            total_acabados += ev.total_array(metrics, finish_user_inputs(sel, fdef))
+
+    costo_total = costo_papel + costo_impresion + total_acabados
+
+    idx = np.flatnonzero(valid)
+    idx = idx[np.lexsort((hojas_fisicas[idx], costo_total[idx]))]
+
+    out = []
+    for i in idx:
+        s, orient = rows[i][0], rows[i][1]
+        out.append({
+            "key": s.get("key", ""),
+            "display_name": s.get("display_name", ""),
+            "orientacion_hoja": orient,
+            "hoja_w": float(hoja_w[i]),
+            "hoja_h": float(hoja_h[i]),
+            "area_w": float(area_w[i]),
+            "area_h": float(area_h[i]),
+            "piezas_por_lado": int(up[i]),
+            "hojas_fisicas": int(hojas_fisicas[i]),
+            "hojas_con_merma": int(hojas_con_merma[i]),
+            "costo_papel": float(costo_papel[i]),
+            "costo_impresion": float(costo_impresion),
+            "total_acabados": float(total_acabados[i]),
+            "costo_total": float(costo_total[i]),
+        })
+    return out
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# -------------------------
+# Cambios pendientes de la config (página Configuración)
+# -------------------------
+# ChangeTracker es la copia de trabajo de la config compartida (get_config):
+# cada widget escribe con set(path, valor) y el cambio queda registrado en ese
+# momento contra el original, así que la revisión antes de guardar cuesta
+# O(cambios) y no copiar + comparar todo el árbol en cada rerun.
+#
+# Copia al escribir: solo se copian los dicts / listas de la ruta que se
+# modifica; lo demás se comparte (de solo lectura) con la config cacheada.
+#
+# Las listas de catálogo (acabados, pliegos) se comparan por "key": insertar un
+# acabado es UN cambio ("acabados[barniz]"), no un corrimiento de índices.
+
+Change = Tuple[str, Any, Any]  # (ruta, antes, después)
+
+_MISSING = object()
+
+
+def changed(a: Any, b: Any, tol: float = 1e-9) -> bool:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(float(a) - float(b)) > tol
+    return a != b
+
+
+def _keyed(items: list) -> bool:
+    """True si todos los elementos son dicts con "key" única (catálogos)."""
+    keys = set()
+    for it in items:
+        k = it.get("key") if isinstance(it, dict) else None
+        if not k or k in keys:
+            return False
+        keys.add(k)
+    return True
+
+
+def diff_values(old: Any, new: Any, prefix: str = "") -> List[Change]:
+    """
+    Cambios entre dos valores JSON. `prefix` termina en "." (o vacío).
+    Subárboles idénticos (el mismo objeto) no se recorren.
+    """
+    if old is new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        cambios: List[Change] = []
+        for k in sorted(set(old.keys()) | set(new.keys())):
+            cambios += diff_values(old.get(k, None), new.get(k, None), prefix + f"{k}.")
+        return cambios
+
+    if isinstance(old, list) and isinstance(new, list):
+        if _keyed(old) and _keyed(new):
+            return _diff_by_key(old, new, prefix[:-1])
+        cambios = []
+        if len(old) != len(new):
+            cambios.append((prefix[:-1], old, new))
+        else:
+            for i, (ov, nv) in enumerate(zip(old, new)):
+                cambios += diff_values(ov, nv, prefix[:-1] + f"[{i}].")
+        return cambios
+
+    if changed(old, new):
+        return [(prefix[:-1], old, new)]
+    return []
+
+
+def _diff_by_key(old: list, new: list, path: str) -> List[Change]:
+    old_by_key = {it["key"]: it for it in old}
+    new_keys = set()
+    cambios: List[Change] = []
+    for it in new:
+        k = it["key"]
+        new_keys.add(k)
+        cambios += diff_values(old_by_key.get(k), it, f"{path}[{k}].")
+    for it in old:
+        if it["key"] not in new_keys:
+            cambios.append((f"{path}[{it['key']}]", it, None))
+    return cambios
+
+
+def apply_editor_delta(base: list, delta: Optional[dict], normalize: Callable[[dict], Optional[dict]]) -> list:
+    """
+    Lista que resulta de un st.data_editor: filas base + su delta acumulado
+    (edited_rows / added_rows / deleted_rows). Las filas no tocadas son los
+    mismos objetos de la base, así que diff_values no las recorre.
+    `normalize` devuelve None para descartar una fila (p.ej. vacía).
+    """
+    delta = delta or {}
+    edited = {int(i): v for i, v in (delta.get("edited_rows") or {}).items()}
+    deleted = {int(i) for i in (delta.get("deleted_rows") or [])}
+    out = []
+    for i, row in enumerate(base):
+        if i in deleted:
+            continue
+        if i in edited:
+            row = normalize({**row, **edited[i]})
+        if row is not None:
+            out.append(row)
+    for row in delta.get("added_rows") or []:
+        row = normalize(row)
+        if row is not None:
+            out.append(row)
+    return out
+
+
+def _get(d: Any, path: Tuple[str, ...]) -> Any:
+    for k in path:
+        if not isinstance(d, dict) or k not in d:
+            return _MISSING
+        d = d[k]
+    return d
+
+
+class ChangeTracker:
+    """Copia de trabajo de una config + registro incremental de sus cambios."""
+
+    def __init__(self, original: dict):
+        self.original = original
+        self.cfg: Dict[str, Any] = dict(original)
+        self._owned = {()}
+        self._changes: Dict[str, Change] = {}
+        self._original_items: Dict[Tuple[str, ...], Dict[str, dict]] = {}
+
+    # --- copia al escribir ---
+    def _own(self, path: Tuple[str, ...]):
+        node = self.cfg
+        for i, k in enumerate(path):
+            child = node.get(k)
+            if path[:i + 1] not in self._owned:
+                child = list(child) if isinstance(child, list) else dict(child or {})
+                node[k] = child
+                self._owned.add(path[:i + 1])
+            node = child
+        return node
+
+    def _forget(self, prefix: str) -> None:
+        for p in [p for p in self._changes if p == prefix or p.startswith(prefix + ".") or p.startswith(prefix + "[")]:
+            del self._changes[p]
+
+    def _record(self, cambios: List[Change]) -> None:
+        for c in cambios:
+            self._changes[c[0]] = c
+
+    # --- escrituras ---
+    def set(self, path: Tuple[str, ...], value: Any) -> Any:
+        """Escribe un valor escalar y registra (o descarta) el cambio. Devuelve value."""
+        self._own(path[:-1])[path[-1]] = value
+        old = _get(self.original, path)
+        p = ".".join(path)
+        if changed(None if old is _MISSING else old, value):
+            self._changes[p] = (p, None if old is _MISSING else old, value)
+        else:
+            self._changes.pop(p, None)
+        return value
+
+    def set_list(self, path: Tuple[str, ...], items: list) -> list:
+        """Reemplaza una lista completa (p.ej. el data_editor de pliegos), comparada por key."""
+        self._own(path[:-1])[path[-1]] = items
+        self._owned.add(path)
+        p = ".".join(path)
+        self._forget(p)
+        old = _get(self.original, path)
+        self._record(diff_values(None if old is _MISSING else old, items, p + "."))
+        return items
+
+    def edit_list(self, path: Tuple[str, ...]) -> list:
+        """La lista de trabajo (copia superficial) para mutarla junto con record_item."""
+        return self._own(path)
+
+    def record_item(self, path: Tuple[str, ...], key: str, new: Optional[dict]) -> None:
+        """Registra el alta / edición (new) o baja (None) del elemento `key` de una lista de catálogo."""
+        if path not in self._original_items:
+            old_list = _get(self.original, path)
+            self._original_items[path] = {
+                it.get("key"): it for it in (old_list if isinstance(old_list, list) else []) if isinstance(it, dict)
+            }
+        p = f"{'.'.join(path)}[{key}]"
+        self._forget(p)
+        self._record(diff_values(self._original_items[path].get(key), new, p + "."))
+
+    # --- lectura ---
+    def changes(self) -> List[Change]:
+        return [self._changes[p] for p in sorted(self._changes)]
+
+    def signature(self) -> Tuple[Tuple[str, str, str], ...]:
+        return tuple((p, repr(ov), repr(nv)) for p, ov, nv in self.changes())
+
+    def __len__(self) -> int:
+        return len(self._changes)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional
+
+from lib.config_store import DATA_DIR, config_revision, save_config
+
+# -------------------------
+# Historial de versiones de la config (append-only)
+# -------------------------
+# data/config_history.jsonl: una línea JSON por versión guardada
+#   {"revision", "saved_at", "saved_by", "config"}
+# data/config_history.idx: un registro de tamaño fijo por línea
+#   (offset, largo, revision, saved_at, saved_by[32])
+# La versión n se lee con un seek al registro n del índice y otro a su línea:
+# listar / comparar / restaurar no carga el historial completo.
+#
+# Las escrituras ocurren dentro de save_config (bajo el lock de config).
+# Si el proceso muere entre la línea y su registro, el índice se completa
+# al siguiente append escaneando solo la cola del .jsonl.
+
+HISTORY_PATH = DATA_DIR / "config_history.jsonl"
+INDEX_PATH = DATA_DIR / "config_history.idx"
+
+_RECORD = struct.Struct("<QIqd32s")
+
+
+def _pack(offset: int, length: int, revision: int, saved_at: float, saved_by: str) -> bytes:
+    return _RECORD.pack(offset, length, revision, saved_at, (saved_by or "").encode("utf-8")[:32])
+
+
+def _unpack(n: int, raw: bytes) -> Dict[str, Any]:
+    offset, length, revision, saved_at, saved_by = _RECORD.unpack(raw)
+    return {
+        "n": n,
+        "offset": offset,
+        "length": length,
+        "revision": revision,
+        "saved_at": saved_at,
+        "saved_by": saved_by.rstrip(b"\0").decode("utf-8", "ignore"),
+    }
+
+
+def history_count() -> int:
+    try:
+        return INDEX_PATH.stat().st_size // _RECORD.size
+    except OSError:
+        return 0
+
+
+def _repair_index() -> None:
+    """Indexa las líneas del .jsonl que quedaron sin registro (p.ej. caída a media escritura)."""
+    if not HISTORY_PATH.exists():
+        return
+    n = history_count()
+    with open(INDEX_PATH, "a+b") as idx:
+        idx.truncate(n * _RECORD.size)  # registro incompleto al final
+        end = 0
+        if n:
+            idx.seek((n - 1) * _RECORD.size)
+            last = _unpack(n - 1, idx.read(_RECORD.size))
+            end = last["offset"] + last["length"]
+        if end >= HISTORY_PATH.stat().st_size:
+            return
+        with open(HISTORY_PATH, "r+b") as f:
+            f.seek(end)
+            offset = end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = {}
+                idx.write(_pack(offset, len(line), int(entry.get("revision", 0) or 0),
+                                float(entry.get("saved_at", 0.0) or 0.0), str(entry.get("saved_by", ""))))
+                offset += len(line)
+            f.truncate(offset)  # línea a medias: se descarta
+        idx.flush()
+        os.fsync(idx.fileno())
+
+
+def append_version(cfg: dict, saved_by: str = "", previous: Optional[dict] = None) -> int:
+    """
+    Agrega una versión al historial y devuelve su número (n).
+    `previous`: la config que se está reemplazando; con el historial vacío se
+    registra primero, para poder volver a lo que había antes del primer guardado.
+    """
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    _repair_index()
+
+    pending = []
+    if history_count() == 0 and isinstance(previous, dict):
+        pending.append((previous, "", 0.0))
+    pending.append((cfg, saved_by, time.time()))
+
+    with open(HISTORY_PATH, "ab") as f, open(INDEX_PATH, "ab") as idx:
+        for c, who, ts in pending:
+            line = (json.dumps(
+                {"revision": config_revision(c), "saved_at": ts, "saved_by": who, "config": c},
+                ensure_ascii=False, separators=(",", ":"),
+            ) + "\n").encode("utf-8")
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            idx.write(_pack(offset, len(line), config_revision(c), ts, who))
+        idx.flush()
+        os.fsync(idx.fileno())
+    return history_count() - 1
+
+
+def list_versions(limit: int = 50, before: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Metadatos (solo del índice) de las versiones más recientes, de la más nueva a la más vieja."""
+    end = history_count() if before is None else max(0, min(int(before), history_count()))
+    start = max(0, end - max(int(limit), 0))
+    if end <= start:
+        return []
+    with open(INDEX_PATH, "rb") as idx:
+        idx.seek(start * _RECORD.size)
+        raw = idx.read((end - start) * _RECORD.size)
+    out = [_unpack(start + i, raw[i * _RECORD.size:(i + 1) * _RECORD.size]) for i in range(end - start)]
+    out.reverse()
+    return out
+
+
+def read_version(n: int) -> Dict[str, Any]:
+    """Entrada completa de la versión n: {"revision", "saved_at", "saved_by", "config"}."""
+    if not 0 <= int(n) < history_count():
+        raise IndexError(f"No existe la versión {n} del historial")
+    with open(INDEX_PATH, "rb") as idx:
+        idx.seek(int(n) * _RECORD.size)
+        rec = _unpack(int(n), idx.read(_RECORD.size))
+    with open(HISTORY_PATH, "rb") as f:
+        f.seek(rec["offset"])
+        entry = json.loads(f.read(rec["length"]))
+    entry["n"] = int(n)
+    return entry
+
+
+def restore_version(n: int, expected_revision: Optional[int] = None, saved_by: str = "") -> int:
+    """Restaura la versión n como una versión NUEVA (el historial nunca se reescribe)."""
+    return save_config(read_version(n)["config"], expected_revision=expected_revision, saved_by=saved_by)
@@ -1,14 +1,41 @@
+import contextlib
 import copy
+import hashlib
 import json
+import os
 import re
+import shutil
+import tempfile
+import threading
 from pathlib import Path
-import streamlit as st
 from typing import Optional, Dict, Any
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
 
 DATA_DIR = Path("data")
 DEFAULT_PATH = DATA_DIR / "config.default.json"
 CONFIG_PATH = DATA_DIR / "config.json"
+LOCK_PATH = DATA_DIR / "config.json.lock"
+
+# Revisión de la config: sube en cada save_config (control optimista de concurrencia)
+REVISION_KEY = "revision"
+
+# Versión del esquema del archivo (ver migraciones abajo)
+SCHEMA_VERSION_KEY = "schema_version"
+CONFIG_SCHEMA_VERSION = 2
+
+
+class ConfigConflictError(RuntimeError):
+    """Otra sesión guardó la config después de que se empezó a editar."""
+
 
 DEFAULT_CONFIG = {
     "impresion": {
@@ -31,6 +58,15 @@ DEFAULT_CONFIG = {
     },
     # OJO: aquí “acabados” es el CATÁLOGO que tu Cotizador consume
     "acabados": [],
+    # Catálogo de hojas de impresión disponibles (hoja física + huella/área útil), en cm
+    "pliegos": [
+        {"key": "tabloide_48x33", "display_name": "Tabloide 48×33", "hoja_w": 48.0, "hoja_h": 33.0, "area_w": 47.4, "area_h": 32.4, "activo": True},
+        {"key": "sra3_45x32", "display_name": "SRA3 45×32", "hoja_w": 45.0, "hoja_h": 32.0, "area_w": 44.4, "area_h": 31.4, "activo": True},
+        {"key": "doble_carta_43x28", "display_name": "Doble carta 43×28", "hoja_w": 43.0, "hoja_h": 28.0, "area_w": 42.4, "area_h": 27.4, "activo": True},
+        {"key": "carta_28x21_5", "display_name": "Carta 28×21.5", "hoja_w": 28.0, "hoja_h": 21.5, "area_w": 27.4, "area_h": 20.9, "activo": True},
+    ],
+    # Catálogo de papeles en stock (vacío: el Cotizador usa los tipos genéricos de "papel")
+    "papeles": [],
     "margen": {"margen": 0.40},
 }
 
@@ -48,18 +84,56 @@ def _load_json(path: Path) -> Optional[Dict[str, Any]]:
     except Exception:
         return None
 
-def _write_json(path: Path, data: dict) -> None:
+@contextlib.contextmanager
+def _file_lock(path: Path = LOCK_PATH):
+    """Lock consultivo entre procesos (flock / msvcrt); serializa las escrituras de config."""
     _ensure_data_dir()
-
-    # backup simple
-    if path.exists():
-        bak = path.with_suffix(path.suffix + ".bak")
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _backup(path: Path) -> None:
+    """El archivo actual pasa a .bak sin copiar bytes (hard link + rename atómico)."""
+    bak = path.with_suffix(path.suffix + ".bak")
+    tmp = bak.with_suffix(bak.suffix + ".tmp")
+    try:
+        with contextlib.suppress(FileNotFoundError):
+            tmp.unlink()
         try:
-            bak.write_text(path.read_text(encoding="utf-8"), encoding="utf-8")
-        except Exception:
-            pass
+            os.link(path, tmp)
+        except OSError:
+            shutil.copyfile(path, tmp)  # FS sin hard links
+        os.replace(tmp, bak)
+    except Exception:
+        pass
 
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+def _write_json(path: Path, data: dict) -> None:
+    """Escritura atómica: archivo temporal en el mismo directorio + os.replace (nunca queda a medias)."""
+    _ensure_data_dir()
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False, indent=2))
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            _backup(path)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
 
 def _get_default_config() -> dict:
     default = _load_json(DEFAULT_PATH)
@@ -231,6 +305,85 @@ def _normalize_acabados_catalog(acabados: Any) -> list[dict]:
 
     return out
 
+# -------------------------
+# PLIEGOS (catálogo de hojas de impresión)
+# -------------------------
+def _normalize_pliegos_catalog(pliegos: Any) -> list[dict]:
+    """
+    Lista de hojas {key, display_name, hoja_w, hoja_h, area_w, area_h, activo}.
+    Descarta entradas inválidas (medidas <= 0 o huella mayor que la hoja).
+    """
+    if not isinstance(pliegos, list):
+        return []
+
+    out: list[dict] = []
+    used_keys: set[str] = set()
+
+    for item in pliegos:
+        if not isinstance(item, dict):
+            continue
+        p = dict(item)  # conserva extras
+        p["display_name"] = str(p.get("display_name", "")).strip()
+        for k in ("hoja_w", "hoja_h", "area_w", "area_h"):
+            p[k] = _to_float(p.get(k, 0.0), 0.0)
+        p["activo"] = _to_bool(p.get("activo", True), True)
+
+        if min(p["hoja_w"], p["hoja_h"], p["area_w"], p["area_h"]) <= 0:
+            continue
+        if p["area_w"] > p["hoja_w"] or p["area_h"] > p["hoja_h"]:
+            continue
+
+        if not p["display_name"]:
+            p["display_name"] = f"{p['hoja_w']:g}×{p['hoja_h']:g}"
+        key = str(p.get("key", "")).strip() or _slugify(p["display_name"])
+        if key in used_keys:
+            continue
+        p["key"] = key
+        used_keys.add(key)
+        out.append(p)
+
+    return out
+
+# -------------------------
+# PAPELES (catálogo de stock)
+# -------------------------
+def _normalize_papeles_catalog(papeles: Any) -> list[dict]:
+    """
+    Lista de papeles {key, tipo, marca, gramaje, hoja_w, hoja_h, costo_kg, costo_hoja, en_stock}.
+    Precio por kg (costo_kg) o por hoja de compra (costo_hoja + medida); descarta
+    entradas sin tipo, sin gramaje o sin precio utilizable.
+    """
+    if not isinstance(papeles, list):
+        return []
+
+    out: list[dict] = []
+    used_keys: set[str] = set()
+
+    for item in papeles:
+        if not isinstance(item, dict):
+            continue
+        p = dict(item)  # conserva extras
+        p["tipo"] = str(p.get("tipo", "")).strip()
+        p["marca"] = str(p.get("marca", "")).strip()
+        for k in ("gramaje", "hoja_w", "hoja_h", "costo_kg", "costo_hoja"):
+            p[k] = max(_to_float(p.get(k, 0.0), 0.0), 0.0)
+        p["en_stock"] = _to_bool(p.get("en_stock", True), True)
+
+        if not p["tipo"] or p["gramaje"] <= 0:
+            continue
+        por_hoja = p["costo_hoja"] > 0 and p["hoja_w"] > 0 and p["hoja_h"] > 0
+        if not por_hoja and p["costo_kg"] <= 0:
+            continue
+
+        key = str(p.get("key", "")).strip() or _slugify(f"{p['tipo']} {p['marca']} {p['gramaje']:g}")
+        if key in used_keys:
+            continue
+        p["key"] = key
+        used_keys.add(key)
+        out.append(p)
+
+    return out
+
 # -------------------------
 # Normalización global
 # -------------------------
@@ -246,6 +399,13 @@ def _normalize_config(cfg: dict, default: dict) -> dict:
     # Acabados catálogo: SIEMPRE dejarlo compatible con Cotizador.py
     cfg["acabados"] = _normalize_acabados_catalog(cfg.get("acabados", default.get("acabados", [])))
 
+    # Pliegos: si la config no trae catálogo, usar el default
+    if "pliegos" not in cfg:
+        cfg["pliegos"] = copy.deepcopy(default.get("pliegos", DEFAULT_CONFIG["pliegos"]))
+    cfg["pliegos"] = _normalize_pliegos_catalog(cfg["pliegos"])
+
+    cfg["papeles"] = _normalize_papeles_catalog(cfg.get("papeles", default.get("papeles", [])))
+
     # -------------------------
     # Impresión
     # -------------------------
@@ -307,36 +467,201 @@ def _normalize_config(cfg: dict, default: dict) -> dict:
     return cfg
 
 
+# -------------------------
+# Migraciones de esquema (una vez por archivo, persistidas)
+# -------------------------
+# Cada migración lleva la config de la versión anterior a `target`. Un archivo
+# ya en CONFIG_SCHEMA_VERSION se usa tal cual al leerlo (solo se valida al guardar).
+def _migrate_to_v1(cfg: dict, default: dict) -> dict:
+    """
+    Archivos sin schema_version: llaves legacy (tinta / click / cobertura,
+    papel.costo_kg, acabados como dict o list[str]) -> esquema actual.
+    """
+    return _normalize_config(cfg, default)
+
+def _migrate_to_v2(cfg: dict, default: dict) -> dict:
+    """v2: catálogo de papeles (vacío; los tipos genéricos de "papel" siguen igual)."""
+    cfg["papeles"] = _normalize_papeles_catalog(cfg.get("papeles", default.get("papeles", [])))
+    return cfg
+
+_MIGRATIONS = [
+    (1, _migrate_to_v1),
+    (2, _migrate_to_v2),
+]
+
+def schema_version(cfg: Optional[dict]) -> int:
+    try:
+        return int((cfg or {}).get(SCHEMA_VERSION_KEY, 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def migrate_config(cfg: dict, default: Optional[dict] = None) -> dict:
+    """Aplica las migraciones pendientes (in place). Sin pendientes: solo compara la versión."""
+    version = schema_version(cfg)
+    if version >= CONFIG_SCHEMA_VERSION:
+        return cfg
+    if default is None:
+        default = _get_default_config()
+    for target, migrate in _MIGRATIONS:
+        if version < target:
+            cfg = migrate(cfg, default)
+            cfg[SCHEMA_VERSION_KEY] = target
+            version = target
+    return cfg
+
+
+# -------------------------
+# Caché de proceso (compartida entre sesiones)
+# -------------------------
+# La config normalizada se lee de disco una sola vez por proceso; se invalida
+# cuando cambia (mtime, tamaño) de config.json / config.default.json o al guardar
+# con save_config. El dict es COMPARTIDO: tratarlo como solo-lectura (quien lo
+# vaya a editar, copy.deepcopy primero).
+_cache_lock = threading.Lock()
+_cache: Dict[str, Any] = {"sig": None, "cfg": None}
+
+# Derivados de la config vigente (p.ej. PricingParams): uno por nombre, ligado
+# al dict cacheado; se descartan cuando el caché carga otra revisión.
+_derived: Dict[str, tuple] = {}
+
+def _file_sig(path: Path):
+    try:
+        s = path.stat()
+    except OSError:
+        return None
+    return (s.st_mtime_ns, s.st_size)
+
+def _cache_sig():
+    return (_file_sig(CONFIG_PATH), _file_sig(DEFAULT_PATH))
+
+def _set_cache(cfg: dict) -> None:
+    _cache["cfg"] = cfg
+    _cache["sig"] = _cache_sig()
+    _derived.clear()
+
+
 # -------------------------
 # API pública
 # -------------------------
 def get_config() -> dict:
-    if "config" in st.session_state:
+    """
+    Config vigente normalizada (compartida, solo-lectura).
+    Si config.json no cambió no hay lectura ni normalización: solo un stat.
+    """
+    cfg = _cache["cfg"]
+    if cfg is not None and _cache["sig"] == _cache_sig():
+        return cfg
+
+    with _cache_lock:
+        cfg = _cache["cfg"]
+        if cfg is not None and _cache["sig"] == _cache_sig():
+            return cfg
+
+        default_sig = _file_sig(DEFAULT_PATH)
         default = _get_default_config()
-        st.session_state.config = _normalize_config(st.session_state.config, default)
-        return st.session_state.config
+        sig = _file_sig(CONFIG_PATH)
+        raw = _load_json(CONFIG_PATH)
+        if not isinstance(raw, dict):
+            raw, before = copy.deepcopy(default), None
+        else:
+            before = schema_version(raw)
+        cfg = migrate_config(raw, default)
+
+        # Solo reescribir (y rotar .bak) si hubo migración, y sin pisar un
+        # save_config de otro proceso ocurrido mientras tanto
+        if schema_version(cfg) != before:
+            with _file_lock():
+                if _file_sig(CONFIG_PATH) == sig:
+                    _write_json(CONFIG_PATH, cfg)
+                    sig = _file_sig(CONFIG_PATH)
+
+        # Firma de lo que se leyó: si otro proceso guardó entretanto, la próxima llamada recarga
+        _cache["cfg"] = cfg
+        _cache["sig"] = (sig, default_sig)
+        _derived.clear()
+        return cfg
 
-    default = _get_default_config()
 
-    cfg = _load_json(CONFIG_PATH)
+def derived_from_config(cfg: dict, name: str, build):
+    """
+    build(cfg), memorizado mientras `cfg` sea el dict de get_config() (misma
+    revisión en disco: mtime / tamaño): sin hashear el contenido en cada llamada.
+    Otros dicts (copias de trabajo, snapshots) se calculan cada vez.
+    """
+    if cfg is None or cfg is not _cache["cfg"]:
+        return build(cfg)
+    hit = _derived.get(name)
+    if hit is not None and hit[0] is cfg:
+        return hit[1]
+    value = build(cfg)
+    with _cache_lock:
+        if _cache["cfg"] is cfg:
+            _derived[name] = (cfg, value)
+    return value
+
+
+def load_config_file(path: Optional[Path] = None) -> dict:
+    """
+    Lee y normaliza una config desde disco SIN tocar st.session_state ni escribir
+    (scripts / procesos por lote). Acepta también un row de quotes con config_snapshot.
+    """
+    cfg = _load_json(Path(path) if path else CONFIG_PATH)
+    if isinstance(cfg, dict) and isinstance(cfg.get("config_snapshot"), dict):
+        cfg = cfg["config_snapshot"]
+    return config_from_dict(cfg)
+
+
+def config_hash(cfg: dict) -> str:
+    """Huella estable del contenido de una config (mismo contenido -> mismo hash)."""
+    raw = json.dumps(cfg, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def config_from_dict(cfg: Any) -> dict:
+    """Config en memoria (p.ej. config_snapshot de una cotización guardada) al esquema actual."""
+    default = _get_default_config()
     if not isinstance(cfg, dict):
-        _write_json(CONFIG_PATH, default)
         cfg = copy.deepcopy(default)
+    return migrate_config(copy.deepcopy(cfg), default)
 
-    cfg = _normalize_config(cfg, default)
-    _write_json(CONFIG_PATH, cfg)
 
-    st.session_state.config = cfg
-    return st.session_state.config
+def config_revision(cfg: Optional[dict]) -> int:
+    try:
+        return int((cfg or {}).get(REVISION_KEY, 0) or 0)
+    except (TypeError, ValueError):
+        return 0
 
 
-def save_config(cfg: dict) -> None:
+def save_config(cfg: dict, expected_revision: Optional[int] = None, saved_by: str = "") -> int:
+    """
+    Guarda la config (normalizada) y devuelve su nueva revisión.
+    Con expected_revision (la revisión sobre la que se editó) rechaza con
+    ConfigConflictError si otra sesión guardó antes; sin ella sobrescribe
+    (importar / restablecer defaults). Cada guardado queda en el historial
+    (lib/config_history.py).
+    """
+    from lib.config_history import append_version
+
     default = _get_default_config()
-    cfg = _normalize_config(cfg, default)
-    st.session_state.config = cfg
-    _write_json(CONFIG_PATH, cfg)
+    cfg = _normalize_config(copy.deepcopy(cfg), default)
+    cfg[SCHEMA_VERSION_KEY] = CONFIG_SCHEMA_VERSION
+    with _cache_lock, _file_lock():
+        previous = _load_json(CONFIG_PATH)
+        current = config_revision(previous)
+        if expected_revision is not None and int(expected_revision) != current:
+            raise ConfigConflictError(
+                f"La configuración cambió mientras la editabas (revisión {expected_revision} → {current})."
+            )
+        cfg[REVISION_KEY] = current + 1
+        _write_json(CONFIG_PATH, cfg)
+        _set_cache(cfg)
+        try:
+            append_version(cfg, saved_by=saved_by, previous=previous)
+        except OSError:
+            pass  # la config ya quedó guardada; el historial es auxiliar
+    return cfg[REVISION_KEY]
 
 
-def reset_config() -> None:
+def reset_config(saved_by: str = "") -> None:
     default = _get_default_config()
-    save_config(copy.deepcopy(default))
+    save_config(copy.deepcopy(default), saved_by=saved_by)
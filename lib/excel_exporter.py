@@ -2,7 +2,10 @@ import io
 import pandas as pd
 from datetime import datetime
 
+from lib.quote_codec import decode_quote_row
+
 def build_quote_excel_bytes(row: dict, role: str) -> bytes:
+    row = decode_quote_row(row)
     inputs = row.get("inputs") or {}
     breakdown = row.get("breakdown") or {}
 
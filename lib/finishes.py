@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from lib.text import norm_name
+
+# -------------------------
+# Catálogo de acabados compilado
+# -------------------------
+# compute_finish_cost resolvía basis / calc_type / qty_rounding (strings) y hacía
+# float() de rate/setup/minimum en cada llamada. Aquí el catálogo normalizado
+# (config_store._normalize_acabados_catalog) se compila UNA vez por versión:
+#   - FinishEvaluator: un acabado con todo ya convertido (evaluación escalar o por arrays)
+#   - CompiledCatalog: todos los evaluadores + columnas NumPy para evaluar el
+#     catálogo completo de una sola vez (simulador de Configuración)
+#
+# Regla de cobertura (única para Cotizador y Configuración):
+#   basis == sheet_m2_total  => SIEMPRE aplica coverage (default 1.0, recortada a [0, 1])
+
+BASIS_M2 = "sheet_m2_total"
+BASIS_SHEETS = "sheets_total"
+BASIS_PIECES = "pieces_total"
+
+# basis -> (métrica, input de usuario que la multiplica)
+_BASIS_INPUT = {
+    BASIS_M2: "coverage",
+    BASIS_SHEETS: "folds_per_sheet",
+    BASIS_PIECES: "mult_per_piece",
+}
+_BASIS_INDEX = {BASIS_M2: 0, BASIS_SHEETS: 1, BASIS_PIECES: 2}
+
+# calc_type -> (suma setup, aplica mínimo)
+_CALC_TYPES = {
+    "unit": (False, False),
+    "min_or_unit": (False, True),
+    "setup_plus_unit": (True, False),
+    "setup_plus_min_or_unit": (True, True),
+}
+
+_COMPILED_MAX = 32
+_compiled: Dict[str, "CompiledCatalog"] = {}
+
+
+def _num(x: Any) -> float:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class FinishEvaluator:
+    key: str
+    display_name: str
+    basis: Any
+    calc_type: Any
+    rounding: Any
+    rate: float
+    setup: float
+    minimum: float
+    requires: tuple[str, ...] = ()
+
+    # Precompilado desde basis / calc_type / qty_rounding
+    metric: str | None = None
+    input_name: str | None = None
+    ceil_1000: bool = False
+    valid_calc: bool = False
+    use_setup: bool = False
+    use_min: bool = False
+
+    @classmethod
+    def from_def(cls, fdef: Mapping[str, Any]) -> "FinishEvaluator":
+        basis = fdef.get("basis")
+        calc_type = fdef.get("calc_type")
+        rounding = fdef.get("qty_rounding", "none")
+        use_setup, use_min = _CALC_TYPES.get(calc_type, (False, False))
+        return cls(
+            key=str(fdef.get("key", "")),
+            display_name=str(fdef.get("display_name", "")),
+            basis=basis,
+            calc_type=calc_type,
+            rounding=rounding,
+            rate=_num(fdef.get("rate", 0.0)),
+            setup=_num(fdef.get("setup", 0.0)),
+            minimum=_num(fdef.get("minimum", 0.0)),
+            requires=tuple(fdef.get("requires") or ()),
+            metric=(basis if basis in _BASIS_INPUT else None),
+            input_name=_BASIS_INPUT.get(basis),
+            ceil_1000=(rounding == "ceil_1000"),
+            valid_calc=(calc_type in _CALC_TYPES),
+            use_setup=use_setup,
+            use_min=use_min,
+        )
+
+    def _factor(self, user_inputs: Mapping[str, Any]) -> float:
+        v = float(user_inputs.get(self.input_name, 1.0))
+        if self.metric == BASIS_M2:
+            return max(0.0, min(1.0, v))
+        return max(v, 0.0)
+
+    def _total(self, variable):
+        if not self.valid_calc:
+            return 0.0
+        total = self.setup + variable if self.use_setup else variable
+        return max(self.minimum, total) if self.use_min else total
+
+    def evaluate(self, metrics: Mapping[str, Any], user_inputs: Mapping[str, Any]) -> dict:
+        """Mismo resultado (dict de breakdown) que compute_finish_cost."""
+        if self.metric is None:
+            qty = 0.0
+        else:
+            qty = float(metrics.get(self.metric, 0.0))
+            qty *= self._factor(user_inputs)
+
+        qty_rounded = math.ceil(qty / 1000.0) if self.ceil_1000 else qty
+        variable = self.rate * float(qty_rounded)
+        total = self._total(variable)
+
+        return {
+            "qty_base": float(qty),
+            "qty_used": float(qty_rounded),
+            "rate": self.rate,
+            "setup": self.setup,
+            "minimum": self.minimum,
+            "variable": float(variable),
+            "total": float(total),
+            "basis": self.basis,
+            "calc_type": self.calc_type,
+            "rounding": self.rounding,
+        }
+
+    def total_array(self, metrics: Mapping[str, np.ndarray], user_inputs: Mapping[str, Any]) -> np.ndarray:
+        """Total sobre arrays de métricas (p.ej. varios tirajes a la vez)."""
+        if self.metric is None:
+            qty = np.zeros_like(np.asarray(metrics[BASIS_SHEETS], dtype=float))
+        else:
+            qty = np.asarray(metrics[self.metric], dtype=float) * self._factor(user_inputs)
+        if self.ceil_1000:
+            qty = np.ceil(qty / 1000.0)
+        variable = self.rate * qty
+        if not self.valid_calc:
+            return np.zeros_like(variable)
+        total = self.setup + variable if self.use_setup else variable
+        return np.maximum(self.minimum, total) if self.use_min else total
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledCatalog:
+    version: str
+    evaluators: tuple[FinishEvaluator, ...]
+    by_key: Dict[str, FinishEvaluator] = field(default_factory=dict)
+
+    # Columnas (una fila por acabado) para evaluate_all
+    basis_idx: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int8))
+    rate: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    setup: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    minimum: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    ceil_1000: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    use_setup: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    use_min: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    valid: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    requires_folds: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+
+    # (key, display_name) de los acabados seleccionables, en orden de catálogo
+    options: tuple[tuple[str, str], ...] = ()
+
+    def __len__(self) -> int:
+        return len(self.evaluators)
+
+    def get(self, key: str) -> FinishEvaluator | None:
+        return self.by_key.get(key)
+
+    def evaluate_all(
+        self,
+        metrics: Mapping[str, float],
+        coverage: float = 1.0,
+        folds_per_sheet: float = 1.0,
+        mult_per_piece: float = 1.0,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Evalúa TODO el catálogo contra unas métricas (arrays en el orden de `evaluators`).
+        Como en el Cotizador: coverage aplica a los de m²; folds_per_sheet solo a los
+        que lo requieren (base hojas); mult_per_piece a los de base piezas.
+        """
+        m = np.array([
+            float(metrics.get(BASIS_M2, 0.0)),
+            float(metrics.get(BASIS_SHEETS, 0.0)),
+            float(metrics.get(BASIS_PIECES, 0.0)),
+            0.0,
+        ])
+        cov = max(0.0, min(1.0, float(coverage)))
+        folds = max(float(folds_per_sheet), 0.0)
+        mult = max(float(mult_per_piece), 0.0)
+
+        factor = np.array([cov, 1.0, mult, 0.0])[self.basis_idx]
+        factor = np.where(self.requires_folds & (self.basis_idx == 1), folds, factor)
+
+        qty = m[self.basis_idx] * factor
+        qty_used = np.where(self.ceil_1000, np.ceil(qty / 1000.0), qty)
+        variable = self.rate * qty_used
+        total = np.where(self.use_setup, self.setup + variable, variable)
+        total = np.where(self.use_min, np.maximum(self.minimum, total), total)
+        total = np.where(self.valid, total, 0.0)
+        return {"qty_base": qty, "qty_used": qty_used, "variable": variable, "total": total}
+
+
+def catalog_version(acabados: Any) -> str:
+    """Hash del contenido del catálogo: misma lista de acabados -> misma versión."""
+    raw = json.dumps(acabados, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _compile(acabados: list, version: str) -> CompiledCatalog:
+    evs = tuple(FinishEvaluator.from_def(f) for f in acabados if isinstance(f, dict))
+    return CompiledCatalog(
+        version=version,
+        evaluators=evs,
+        by_key={e.key: e for e in evs if e.key},
+        basis_idx=np.array([_BASIS_INDEX.get(e.basis, 3) for e in evs], dtype=np.int8),
+        rate=np.array([e.rate for e in evs], dtype=float),
+        setup=np.array([e.setup for e in evs], dtype=float),
+        minimum=np.array([e.minimum for e in evs], dtype=float),
+        ceil_1000=np.array([e.ceil_1000 for e in evs], dtype=bool),
+        use_setup=np.array([e.use_setup for e in evs], dtype=bool),
+        use_min=np.array([e.use_min for e in evs], dtype=bool),
+        valid=np.array([e.valid_calc for e in evs], dtype=bool),
+        requires_folds=np.array(["folds_per_sheet" in e.requires for e in evs], dtype=bool),
+        options=tuple(
+            (str(f.get("key", "")), str(f.get("display_name", "")))
+            for f in acabados
+            if isinstance(f, dict) and str(f.get("key", "")).strip() and str(f.get("display_name", "")).strip()
+        ),
+    )
+
+
+def compile_catalog(acabados: Any) -> CompiledCatalog:
+    """Catálogo compilado, memorizado por versión (reruns / workers no recompilan)."""
+    if not isinstance(acabados, list):
+        acabados = []
+    version = catalog_version(acabados)
+    cat = _compiled.get(version)
+    if cat is None:
+        if len(_compiled) >= _COMPILED_MAX:
+            _compiled.clear()
+        cat = _compile(acabados, version)
+        _compiled[version] = cat
+    return cat
+
+
+# -------------------------
+# Catálogo editable con índices (Configuración)
+# -------------------------
+class FinishCatalog:
+    """
+    La lista cfg["acabados"] (se edita en su lugar) + índices por key, por nombre
+    exacto y por nombre normalizado. add / update tocan solo los índices del
+    acabado que cambia, sin re-escanear el catálogo. Con duplicados gana el de
+    menor posición (como el escaneo lineal).
+
+    delete conserva el orden de la lista (el del selector del Cotizador y el
+    que se guarda en disco): recorre una posición las entradas posteriores.
+    Es O(n), pero borrar es una acción rara de admin.
+    """
+
+    def __init__(self, acabados: list):
+        self.items = acabados
+        self._by_key: Dict[str, List[int]] = {}
+        self._by_name: Dict[str, List[int]] = {}
+        self._by_norm: Dict[str, List[int]] = {}
+        self._names: Optional[List[str]] = None
+        for i, f in enumerate(acabados):
+            self._index(i, f)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _keys_of(self, f: Any):
+        if not isinstance(f, dict):
+            return ()
+        name = str(f.get("display_name", ""))
+        return (
+            (self._by_key, str(f.get("key", "")).strip()),
+            (self._by_name, name),
+            (self._by_norm, norm_name(name)),
+        )
+
+    def _index(self, i: int, f: Any) -> None:
+        for idx, k in self._keys_of(f):
+            bisect.insort(idx.setdefault(k, []), i)
+        self._names = None
+
+    def _unindex(self, i: int, f: Any) -> None:
+        for idx, k in self._keys_of(f):
+            bucket = idx.get(k)
+            if bucket and i in bucket:
+                bucket.remove(i)
+                if not bucket:
+                    del idx[k]
+        self._names = None
+
+    def _first(self, idx: Dict[str, List[int]], k: str) -> Tuple[Optional[int], Optional[dict]]:
+        bucket = idx.get(k)
+        if not bucket:
+            return None, None
+        return bucket[0], self.items[bucket[0]]
+
+    # Búsquedas: (idx, obj) o (None, None)
+    def find_by_key(self, key: str):
+        key = (key or "").strip()
+        return self._first(self._by_key, key) if key else (None, None)
+
+    def find_by_display_name(self, display_name: str):
+        return self._first(self._by_name, display_name)
+
+    def find_by_name_insensitive(self, name: str):
+        return self._first(self._by_norm, norm_name(name))
+
+    def display_names(self) -> List[str]:
+        """Nombres no vacíos, ordenados (para el selector)."""
+        if self._names is None:
+            self._names = sorted(k for k in self._by_name if k.strip())
+        return self._names
+
+    # Cambios (la lista subyacente y los índices a la vez)
+    def add(self, f: dict) -> int:
+        self.items.append(f)
+        i = len(self.items) - 1
+        self._index(i, f)
+        return i
+
+    def update(self, i: int, f: dict) -> None:
+        self._unindex(i, self.items[i])
+        self.items[i] = f
+        self._index(i, f)
+
+    def delete(self, i: int) -> dict:
+        f = self.items[i]
+        self._unindex(i, f)
+        self.items.pop(i)
+        # Las posiciones mayores a i bajan una (las listas siguen ordenadas)
+        for idx in (self._by_key, self._by_name, self._by_norm):
+            for bucket in idx.values():
+                for j in range(bisect.bisect_right(bucket, i), len(bucket)):
+                    bucket[j] -= 1
+        return f
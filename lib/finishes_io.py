@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from lib.finishes import BASIS_M2, BASIS_PIECES, BASIS_SHEETS, FinishCatalog
+from lib.text import canonical_key
+
+# -------------------------
+# Importar / exportar el catálogo de acabados (CSV / XLSX)
+# -------------------------
+# Exportar: una fila por acabado con FINISH_COLUMNS (requires separado por ";").
+# Importar: el archivo se lee fila por fila (csv.DictReader / openpyxl read_only),
+# cada fila se valida sola y los errores se reportan con su número de fila del
+# archivo; nada se guarda hasta aplicar. Aplicar hace upsert por key sobre el
+# FinishCatalog (índices O(1)), así que miles de filas cuestan segundos.
+
+FINISH_COLUMNS = [
+    "key", "display_name", "basis", "calc_type",
+    "rate", "minimum", "setup", "qty_rounding", "allow_partial", "requires",
+]
+
+VALID_BASIS = {BASIS_M2, BASIS_SHEETS, BASIS_PIECES}
+VALID_CALC_TYPES = {"unit", "min_or_unit", "setup_plus_unit", "setup_plus_min_or_unit"}
+VALID_ROUNDING = {"none", "ceil_1000"}
+VALID_REQUIRES = {"folds_per_sheet"}
+
+_TRUE = {"1", "true", "t", "si", "sí", "s", "yes", "y", "x"}
+_FALSE = {"", "0", "false", "f", "no", "n"}
+
+MAX_ERRORS = 1000  # el reporte se corta aquí; el conteo sigue
+
+
+# Miles con punto y decimales con coma (1.200,50) o al revés (1,200.50)
+_THOUSANDS_DOT = re.compile(r"\d{1,3}(\.\d{3})+(,\d+)?")
+_THOUSANDS_COMMA = re.compile(r"\d{1,3}(,\d{3})+(\.\d+)?")
+
+
+# -------------------------
+# Exportar
+# -------------------------
+def _export_row(f: dict) -> list:
+    row = [f.get(c, "") for c in FINISH_COLUMNS]
+    row[FINISH_COLUMNS.index("requires")] = ";".join(f.get("requires") or [])
+    row[FINISH_COLUMNS.index("allow_partial")] = bool(f.get("allow_partial", False))
+    return row
+
+
+def export_finishes_csv(acabados: list) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(FINISH_COLUMNS)
+    for f in acabados:
+        if isinstance(f, dict):
+            w.writerow(_export_row(f))
+    return buf.getvalue().encode("utf-8-sig")  # BOM: Excel abre los acentos bien
+
+
+def export_finishes_xlsx(acabados: list) -> bytes:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("acabados")
+    ws.append(FINISH_COLUMNS)
+    for f in acabados:
+        if isinstance(f, dict):
+            ws.append(_export_row(f))
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+# -------------------------
+# Importar
+# -------------------------
+@dataclass
+class FinishImport:
+    rows: int = 0
+    finishes: List[Tuple[int, dict]] = field(default_factory=list)  # (fila, acabado)
+    errors: List[Tuple[int, str]] = field(default_factory=list)      # (fila, mensaje)
+    error_count: int = 0
+
+    def error(self, row: int, msg: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((row, msg))
+
+
+def _iter_csv(data: bytes) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(text, dialect=dialect)
+    for raw in reader:
+        yield reader.line_num, raw
+
+
+def _iter_xlsx(data: bytes) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(h or "").strip() for h in next(rows, ())]
+        for n, values in enumerate(rows, start=2):
+            if values is None or all(v is None or str(v).strip() == "" for v in values):
+                continue
+            yield n, dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def iter_finish_rows(filename: str, data: bytes) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(número de fila, valores crudos por columna) sin cargar el archivo a memoria como tabla."""
+    if str(filename).lower().endswith((".xlsx", ".xlsm")):
+        return _iter_xlsx(data)
+    return _iter_csv(data)
+
+
+def _text(raw: Dict[str, Any], col: str) -> str:
+    v = raw.get(col)
+    return "" if v is None else str(v).strip()
+
+
+def _number(raw: Dict[str, Any], col: str, errors: List[str]) -> float:
+    s = _text(raw, col).replace("$", "").replace(" ", "")
+    if not s:
+        return 0.0
+    if "," in s and "." in s:
+        if _THOUSANDS_DOT.fullmatch(s.lstrip("-")):
+            s = s.replace(".", "").replace(",", ".")  # 1.200,50
+        elif _THOUSANDS_COMMA.fullmatch(s.lstrip("-")):
+            s = s.replace(",", "")  # 1,200.50
+        else:
+            s = ""  # 1.2,3 / 1,2.3: no se adivina
+    elif "," in s:
+        s = s.replace(",", ".")  # 1,5
+    try:
+        v = float(s)
+    except ValueError:
+        errors.append(f"{col} no es número ({raw.get(col)!r})")
+        return 0.0
+    if v < 0:
+        errors.append(f"{col} no puede ser negativo")
+    return v
+
+
+def validate_finish_row(raw: Dict[str, Any]) -> Tuple[Optional[dict], List[str]]:
+    """Una fila -> (acabado normalizado, []) o (None, errores)."""
+    errors: List[str] = []
+
+    display_name = re.sub(r"\s+", " ", _text(raw, "display_name"))
+    if not display_name:
+        errors.append("display_name vacío")
+    key = canonical_key(_text(raw, "key") or display_name)
+    if display_name and not key:
+        errors.append("no se pudo generar key")
+
+    basis = _text(raw, "basis") or BASIS_M2
+    if basis not in VALID_BASIS:
+        errors.append(f"basis inválido: {basis}")
+    calc_type = _text(raw, "calc_type") or "min_or_unit"
+    if calc_type not in VALID_CALC_TYPES:
+        errors.append(f"calc_type inválido: {calc_type}")
+    rounding = _text(raw, "qty_rounding") or "none"
+    if rounding not in VALID_ROUNDING:
+        errors.append(f"qty_rounding inválido: {rounding}")
+
+    rate = _number(raw, "rate", errors)
+    minimum = _number(raw, "minimum", errors)
+    setup = _number(raw, "setup", errors)
+
+    partial = raw.get("allow_partial")
+    if isinstance(partial, bool):
+        allow_partial = partial
+    else:
+        p = _text(raw, "allow_partial").casefold()
+        allow_partial = p in _TRUE
+        if p not in _TRUE and p not in _FALSE:
+            errors.append(f"allow_partial inválido: {raw.get('allow_partial')!r}")
+
+    requires = [r.strip() for r in re.split(r"[;,|]", _text(raw, "requires")) if r.strip()]
+    bad = [r for r in requires if r not in VALID_REQUIRES]
+    if bad:
+        errors.append(f"requires desconocido: {', '.join(bad)}")
+
+    if errors:
+        return None, errors
+    return {
+        "key": key,
+        "display_name": display_name,
+        "basis": basis,
+        "calc_type": calc_type,
+        "rate": rate,
+        "minimum": minimum,
+        "setup": setup,
+        "qty_rounding": rounding,
+        "allow_partial": bool(allow_partial and basis == BASIS_M2),
+        "requires": requires,
+    }, []
+
+
+def read_finishes(filename: str, data: bytes) -> FinishImport:
+    """Valida el archivo en una pasada; las keys repetidas en el archivo son error (gana la primera)."""
+    out = FinishImport()
+    seen: Dict[str, int] = {}
+    try:
+        for n, raw in iter_finish_rows(filename, data):
+            out.rows += 1
+            f, errs = validate_finish_row(raw)
+            if errs:
+                out.error(n, "; ".join(errs))
+            elif f["key"] in seen:
+                out.error(n, f"key repetida en el archivo (fila {seen[f['key']]}): {f['key']}")
+            else:
+                seen[f["key"]] = n
+                out.finishes.append((n, f))
+    except Exception as e:  # archivo ilegible / corrupto: se reporta, no truena la página
+        out.error(0, f"No se pudo leer el archivo: {e}")
+    return out
+
+
+def upsert_finishes(catalog: FinishCatalog, finishes: List[Tuple[int, dict]]) -> Tuple[int, int, List[Tuple[int, str]]]:
+    """
+    Aplica las filas validadas: misma key -> actualiza (en su posición), key nueva -> alta.
+    Un nombre que ya usa OTRO acabado (ignorando acentos/mayúsculas) se rechaza.
+    Devuelve (altas, actualizados, rechazos); filas idénticas no cuentan.
+    """
+    added = updated = 0
+    rejected: List[Tuple[int, str]] = []
+    for n, f in finishes:
+        idx, _ = catalog.find_by_key(f["key"])
+        dup_idx, dup = catalog.find_by_name_insensitive(f["display_name"])
+        if dup_idx is not None and dup_idx != idx:
+            rejected.append((n, f"el nombre ya lo usa el acabado {dup.get('key')!r}"))
+            continue
+        if idx is None:
+            catalog.add(f)
+            added += 1
+        else:
+            merged = {**catalog.items[idx], **f}
+            if merged != catalog.items[idx]:
+                catalog.update(idx, merged)
+                updated += 1
+    return added, updated, rejected
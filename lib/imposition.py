@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+# -------------------------
+# Cubicación (imposición) en guillotina
+# -------------------------
+# Busca el mejor acomodo de piezas en la huella:
+#   - rejilla pura normal / rotada 90° (lo que hacía calc_piezas_por_lado)
+#   - mixto: un bloque normal + una franja rotada (o al revés), separados por
+#     un solo corte de guillotina vertical u horizontal.
+# Los resultados se memorizan por (huella, pieza, sangrado, separación, flags):
+# reruns de Streamlit y cotización por lote pagan la búsqueda una sola vez.
+
+LAYOUT_CACHE_SIZE = 4096
+
+ORIENT_NORMAL = "Normal"
+ORIENT_ROTADO = "Rotado 90°"
+ORIENT_MIXTO = "Mixto"
+ORIENT_INVALIDO = "Inválido"
+
+
+@dataclass(frozen=True, slots=True)
+class Block:
+    """Rejilla de piezas iguales dentro de la huella (coordenadas en cm desde la esquina)."""
+    x_cm: float
+    y_cm: float
+    cols: int
+    rows: int
+    rotated: bool
+
+    @property
+    def up(self) -> int:
+        return self.cols * self.rows
+
+
+@dataclass(frozen=True, slots=True)
+class Layout:
+    up: int
+    orientacion: str
+    w_eff_cm: float
+    h_eff_cm: float
+    blocks: tuple[Block, ...] = ()
+
+    def describe(self) -> str:
+        if self.orientacion != ORIENT_MIXTO:
+            return self.orientacion
+        partes = []
+        for b in self.blocks:
+            if b.up > 0:
+                partes.append(f"{b.cols}×{b.rows} {'rotadas' if b.rotated else 'normales'}")
+        return f"{ORIENT_MIXTO} ({' + '.join(partes)})"
+
+
+def _fit(length: float, piece: float, g: float) -> int:
+    """Cuántas piezas caben en una longitud con separación g entre ellas."""
+    if (piece + g) <= 0 or length <= 0:
+        return 0
+    return max(int((length + g) // (piece + g)), 0)
+
+
+def _grid(area_w: float, area_h: float, w: float, h: float, g: float) -> tuple[int, int]:
+    return _fit(area_w, w, g), _fit(area_h, h, g)
+
+
+def _best_mixed(area_w: float, area_h: float, w: float, h: float, g: float) -> tuple[int, tuple[Block, ...]]:
+    """
+    Mejor combinación de 2 bloques con un corte de guillotina.
+    Prueba cada número de columnas (corte vertical) y de filas (corte horizontal)
+    para el primer bloque, en ambas orientaciones; la franja restante se llena
+    con la orientación contraria.
+    """
+    best_up = 0
+    best_blocks: tuple[Block, ...] = ()
+
+    for first_rot in (False, True):
+        fw, fh = (h, w) if first_rot else (w, h)
+        sw, sh = (w, h) if first_rot else (h, w)
+
+        # Corte vertical: bloque de n columnas a la izquierda, franja a la derecha
+        max_cols = _fit(area_w, fw, g)
+        rows_first = _fit(area_h, fh, g)
+        for n in range(1, max_cols):
+            rem_w = area_w - n * (fw + g)
+            s_cols, s_rows = _grid(rem_w, area_h, sw, sh, g)
+            up = n * rows_first + s_cols * s_rows
+            if up > best_up:
+                best_up = up
+                best_blocks = (
+                    Block(0.0, 0.0, n, rows_first, first_rot),
+                    Block(n * (fw + g), 0.0, s_cols, s_rows, not first_rot),
+                )
+
+        # Corte horizontal: bloque de n filas arriba, franja abajo
+        max_rows = _fit(area_h, fh, g)
+        cols_first = _fit(area_w, fw, g)
+        for n in range(1, max_rows):
+            rem_h = area_h - n * (fh + g)
+            s_cols, s_rows = _grid(area_w, rem_h, sw, sh, g)
+            up = cols_first * n + s_cols * s_rows
+            if up > best_up:
+                best_up = up
+                best_blocks = (
+                    Block(0.0, 0.0, cols_first, n, first_rot),
+                    Block(0.0, n * (fh + g), s_cols, s_rows, not first_rot),
+                )
+
+    return best_up, best_blocks
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def best_layout(
+    area_w_cm: float,
+    area_h_cm: float,
+    pieza_w_cm: float,
+    pieza_h_cm: float,
+    bleed_cm: float,
+    gutter_cm: float,
+    allow_rotate: bool = True,
+    allow_mixed: bool = False,
+) -> Layout:
+    """
+    Mejor cubicación para la huella. Memorizado (lru_cache): los argumentos
+    deben ser hashables (floats/bools), el Layout devuelto es inmutable.
+    """
+    w_eff = pieza_w_cm + 2 * bleed_cm
+    h_eff = pieza_h_cm + 2 * bleed_cm
+    g = gutter_cm
+
+    if w_eff <= 0 or h_eff <= 0:
+        return Layout(0, ORIENT_INVALIDO, w_eff, h_eff)
+
+    nx, ny = _grid(area_w_cm, area_h_cm, w_eff, h_eff, g)
+    best = Layout(nx * ny, ORIENT_NORMAL, w_eff, h_eff, (Block(0.0, 0.0, nx, ny, False),))
+
+    if allow_rotate:
+        rx, ry = _grid(area_w_cm, area_h_cm, h_eff, w_eff, g)
+        if rx * ry > best.up:
+            best = Layout(rx * ry, ORIENT_ROTADO, w_eff, h_eff, (Block(0.0, 0.0, rx, ry, True),))
+
+        if allow_mixed:
+            up, blocks = _best_mixed(area_w_cm, area_h_cm, w_eff, h_eff, g)
+            # Solo si mejora estrictamente a la rejilla pura (más simple de imponer)
+            if up > best.up:
+                best = Layout(up, ORIENT_MIXTO, w_eff, h_eff, blocks)
+
+    return best
+
+
+def layout_cache_info():
+    """Hits/misses del caché de cubicaciones (para diagnóstico/benchmarks)."""
+    return best_layout.cache_info()
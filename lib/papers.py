@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from lib.text import norm_name
+
+# -------------------------
+# Catálogo de papeles (stock)
+# -------------------------
+# cfg["papeles"]: una entrada por papel comprable (config_store._normalize_papeles_catalog)
+#   {key, tipo, marca, gramaje, hoja_w, hoja_h, costo_kg, costo_hoja, en_stock}
+# El precio puede venir por kg (costo_kg) o por hoja de compra (costo_hoja con
+# hoja_w x hoja_h); ambos se reducen a $/m² al compilar, así que el costo de
+# cualquier hoja de impresión es área x costo_m2.
+#
+# Se compila una vez por versión (como lib/finishes.compile_catalog):
+#   - índices por key, por tipo y por (tipo, gramaje)
+#   - tabla (key, hoja_w, hoja_h) -> (area_m2, peso_kg, costo_hoja) precalculada
+#     para las hojas del catálogo de pliegos (ambas orientaciones); otras medidas
+#     se calculan una vez y se agregan a la tabla.
+#
+# Sin papel de catálogo (papel_key vacío) el Cotizador sigue con los tres tipos
+# genéricos de cfg["papel"] ($/kg por tipo + gramaje capturado).
+
+_COMPILED_MAX = 16
+_compiled: Dict[str, "PaperCatalog"] = {}
+
+_TABLE_MAX = 4096  # medidas de hoja distintas por catálogo (captura libre de hoja)
+
+
+def _num(x: Any) -> float:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class PaperStock:
+    key: str
+    tipo: str
+    marca: str
+    gramaje_gm2: float
+    hoja_w: float
+    hoja_h: float
+    costo_kg: float
+    costo_hoja: float
+    en_stock: bool
+
+    # Precalculado
+    peso_m2_kg: float = 0.0
+    costo_m2: float = 0.0
+    costo_kg_efectivo: float = 0.0  # $/kg equivalente (también si se compra por hoja)
+
+    @classmethod
+    def from_def(cls, p: dict) -> "PaperStock":
+        gramaje = _num(p.get("gramaje"))
+        hoja_w, hoja_h = _num(p.get("hoja_w")), _num(p.get("hoja_h"))
+        costo_kg, costo_hoja = _num(p.get("costo_kg")), _num(p.get("costo_hoja"))
+        peso_m2 = gramaje / 1000.0
+        area_compra = (hoja_w / 100.0) * (hoja_h / 100.0)
+        if costo_hoja > 0 and area_compra > 0:
+            costo_m2 = costo_hoja / area_compra
+        else:
+            costo_m2 = peso_m2 * costo_kg
+        return cls(
+            key=str(p.get("key", "")),
+            tipo=str(p.get("tipo", "")),
+            marca=str(p.get("marca", "")),
+            gramaje_gm2=gramaje,
+            hoja_w=hoja_w,
+            hoja_h=hoja_h,
+            costo_kg=costo_kg,
+            costo_hoja=costo_hoja,
+            en_stock=bool(p.get("en_stock", True)),
+            peso_m2_kg=peso_m2,
+            costo_m2=costo_m2,
+            costo_kg_efectivo=(costo_m2 / peso_m2) if peso_m2 > 0 else costo_kg,
+        )
+
+    @property
+    def label(self) -> str:
+        marca = f" {self.marca}" if self.marca else ""
+        medida = f" · {self.hoja_w:g}×{self.hoja_h:g}" if self.hoja_w and self.hoja_h else ""
+        stock = "" if self.en_stock else " · sin stock"
+        return f"{self.tipo}{marca} · {self.gramaje_gm2:g} g/m²{medida}{stock}"
+
+    def sheet(self, w_cm: float, h_cm: float) -> Tuple[float, float, float]:
+        """(area_m2, peso_hoja_kg, costo_hoja) de una hoja de impresión de w x h cm."""
+        area = (float(w_cm) / 100.0) * (float(h_cm) / 100.0)
+        return area, area * self.peso_m2_kg, area * self.costo_m2
+
+
+class PaperCatalog:
+    """
+    Catálogo compilado (índices de solo lectura) + tabla de costos por hoja.
+    Clase normal y no dataclass congelada: la tabla crece con medidas nuevas
+    (sheet_cost), así que el objeto no es inmutable.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        stocks: tuple[PaperStock, ...] = (),
+        by_key: Optional[Dict[str, PaperStock]] = None,
+        by_tipo: Optional[Dict[str, tuple[int, ...]]] = None,  # tipo -> posiciones (por gramaje)
+        by_tipo_gramaje: Optional[Dict[Tuple[str, float], tuple[int, ...]]] = None,
+        by_gramaje: Optional[Dict[float, tuple[int, ...]]] = None,
+        search_text: tuple[str, ...] = (),  # normalizado, por posición
+        sheets: Optional[Dict[Tuple[str, float, float], Tuple[float, float, float]]] = None,
+    ):
+        self.version = version
+        self.stocks = stocks
+        self.by_key = by_key or {}
+        self.by_tipo = by_tipo or {}
+        self.by_tipo_gramaje = by_tipo_gramaje or {}
+        self.by_gramaje = by_gramaje or {}
+        self.search_text = search_text
+        self._sheets = sheets or {}
+
+    def __len__(self) -> int:
+        return len(self.stocks)
+
+    def get(self, key: str) -> PaperStock | None:
+        return self.by_key.get(key) if key else None
+
+    def tipos(self) -> List[str]:
+        return list(self.by_tipo)
+
+    def gramajes(self, tipo: str) -> List[float]:
+        return sorted({self.stocks[i].gramaje_gm2 for i in self.by_tipo.get(tipo, ())})
+
+    def find(self, tipo: str, gramaje: Optional[float] = None, solo_stock: bool = False) -> List[PaperStock]:
+        """Papeles de un tipo (y gramaje) por índice, ordenados por gramaje."""
+        if gramaje is None:
+            idx = self.by_tipo.get(tipo, ())
+        else:
+            idx = self.by_tipo_gramaje.get((tipo, float(gramaje)), ())
+        out = [self.stocks[i] for i in idx]
+        return [s for s in out if s.en_stock] if solo_stock else out
+
+    def search(self, text: str, solo_stock: bool = False, limit: int = 200) -> List[PaperStock]:
+        """
+        Búsqueda libre: los números se toman como gramaje (índice), el resto como
+        texto (tipo / marca, sin acentos ni mayúsculas). Todos los términos deben coincidir.
+        """
+        words = norm_name(text or "").split()
+        nums = [float(w) for w in words if re.fullmatch(r"\d+(\.\d+)?", w)]
+        terms = [w for w in words if not re.fullmatch(r"\d+(\.\d+)?", w)]
+
+        if len(set(nums)) > 1:
+            return []
+        if nums:
+            cand = self.by_gramaje.get(nums[0], ())
+        else:
+            cand = range(len(self.stocks))
+
+        out: List[PaperStock] = []
+        for i in cand:
+            s = self.stocks[i]
+            if solo_stock and not s.en_stock:
+                continue
+            if all(t in self.search_text[i] for t in terms):
+                out.append(s)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def sheet_cost(self, key: str, w_cm: float, h_cm: float) -> Tuple[float, float, float]:
+        """(area_m2, peso_hoja_kg, costo_hoja): lectura de tabla; medidas nuevas se agregan."""
+        k = (key, round(float(w_cm), 4), round(float(h_cm), 4))
+        row = self._sheets.get(k)
+        if row is None:
+            stock = self.by_key[key]
+            row = stock.sheet(w_cm, h_cm)
+            if len(self._sheets) < _TABLE_MAX:
+                self._sheets[k] = row
+        return row
+
+
+def _hash(obj: Any) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def papers_version(papeles: Any) -> str:
+    """Hash del contenido del catálogo de papeles (lo que mueve el precio)."""
+    return _hash(papeles)
+
+
+def _compile(papeles: list, pliegos: Sequence[dict], version: str) -> PaperCatalog:
+    stocks = tuple(PaperStock.from_def(p) for p in papeles if isinstance(p, dict) and p.get("key"))
+
+    order = sorted(range(len(stocks)), key=lambda i: (stocks[i].gramaje_gm2, stocks[i].marca))
+    by_tipo: Dict[str, List[int]] = {}
+    by_tg: Dict[Tuple[str, float], List[int]] = {}
+    by_g: Dict[float, List[int]] = {}
+    for i in order:
+        s = stocks[i]
+        by_tipo.setdefault(s.tipo, []).append(i)
+        by_tg.setdefault((s.tipo, s.gramaje_gm2), []).append(i)
+        by_g.setdefault(s.gramaje_gm2, []).append(i)
+
+    sheets: Dict[Tuple[str, float, float], Tuple[float, float, float]] = {}
+    medidas = set()
+    for pl in pliegos or ():
+        if isinstance(pl, dict):
+            w, h = _num(pl.get("hoja_w")), _num(pl.get("hoja_h"))
+            if w > 0 and h > 0:
+                medidas.update({(w, h), (h, w)})
+    for s in stocks:
+        for w, h in medidas:
+            sheets[(s.key, round(w, 4), round(h, 4))] = s.sheet(w, h)
+
+    return PaperCatalog(
+        version=version,
+        stocks=stocks,
+        by_key={s.key: s for s in stocks},
+        by_tipo={t: tuple(v) for t, v in by_tipo.items()},
+        by_tipo_gramaje={k: tuple(v) for k, v in by_tg.items()},
+        by_gramaje={k: tuple(v) for k, v in by_g.items()},
+        search_text=tuple(norm_name(f"{s.tipo} {s.marca} {s.key}") for s in stocks),
+        sheets=sheets,
+    )
+
+
+def compile_papers(papeles: Any, pliegos: Any = None) -> PaperCatalog:
+    """Catálogo de papeles compilado, memorizado por versión."""
+    if not isinstance(papeles, list):
+        papeles = []
+    if not isinstance(pliegos, list):
+        pliegos = []
+    version = papers_version(papeles)
+    memo = f"{version}:{_hash(pliegos)}"  # los pliegos solo cambian la tabla precalculada
+    cat = _compiled.get(memo)
+    if cat is None:
+        if len(_compiled) >= _COMPILED_MAX:
+            _compiled.clear()
+        cat = _compile(papeles, pliegos, version)
+        _compiled[memo] = cat
+    return cat
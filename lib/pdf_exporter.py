@@ -7,6 +7,8 @@ from pathlib import Path
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 
+from lib.quote_codec import decode_quote_row
+
 ASSETS_DIR = Path(__file__).resolve().parents[1] / "assets"
 LOGO_PATH = ASSETS_DIR / "logo_offset_santiago.png"
 
@@ -35,6 +37,7 @@ def build_quote_pdf_bytes(row: Dict[str, Any]) -> bytes:
     - Sí incluye: código, fecha, usuario/rol creador, características del trabajo, precios (unitario/total)
     """
 
+    row = decode_quote_row(row)
     inputs = _safe(row.get("inputs"))
     quote_code = str(row.get("quote_code") or "")
     created_at = str(row.get("created_at") or "")
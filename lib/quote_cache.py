@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Hashable
+
+from lib.calc import PricingParams, QuoteInputs, QuoteResult, _as_params, price
+
+# -------------------------
+# Caché de cotizaciones (por proceso, compartido entre sesiones)
+# -------------------------
+# Llave = (PricingParams.version, inputs canónicos). Los mismos trabajos estándar
+# (carta, tabloide, tirajes comunes) que cotizan varios usuarios se sirven sin
+# recalcular; al cambiar la config cambia la versión y las entradas viejas
+# simplemente dejan de usarse (y salen por LRU).
+#
+# Los QuoteResult se comparten entre sesiones: tratarlos como solo-lectura
+# (no mutar metrics / acabados_items).
+
+QUOTE_CACHE_SIZE = 2048
+
+# Decimales para normalizar floats de la llave (cm / pesos / coberturas)
+_KEY_DECIMALS = 6
+
+
+def _f(x: Any) -> float | None:
+    return None if x is None else round(float(x), _KEY_DECIMALS)
+
+
+def canonical_inputs(inputs: QuoteInputs) -> tuple:
+    """
+    Forma canónica (hashable) de QuoteInputs: 21.5 == 21.50000000001, 1000 == 1000.0.
+    Acabados y extras entran tal cual: son tuplas de dataclasses congeladas (hash/eq
+    por valor, y en Python 1000 == 1000.0 con el mismo hash).
+    """
+    return (
+        inputs.tipo_producto,
+        _f(inputs.ancho_final_cm), _f(inputs.alto_final_cm),
+        int(inputs.piezas), int(inputs.lados), int(inputs.paginas),
+        _f(inputs.hoja_w_cm), _f(inputs.hoja_h_cm),
+        _f(inputs.area_w_cm), _f(inputs.area_h_cm),
+        _f(inputs.bleed_cm), _f(inputs.gutter_cm),
+        bool(inputs.allow_rotate), bool(inputs.allow_mixed),
+        inputs.tipo_papel, _f(inputs.papel_gramaje_gm2), inputs.papel_key, int(inputs.n_tintas),
+        inputs.acabados,
+        inputs.extras,
+    )
+
+
+class QuoteCache:
+    """LRU acotado, thread-safe (Streamlit atiende sesiones en hilos), con contadores."""
+
+    def __init__(self, maxsize: int = QUOTE_CACHE_SIZE):
+        self.maxsize = int(maxsize)
+        self._data: OrderedDict[Hashable, QuoteResult] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def price(self, inputs: QuoteInputs, params: PricingParams) -> QuoteResult:
+        key = (params.version, canonical_inputs(inputs))
+
+        with self._lock:
+            res = self._data.get(key)
+            if res is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+        if res is not None:
+            # Mismo trabajo capturado con otros floats: devolver los inputs del que pregunta
+            return res if res.inputs == inputs else replace(res, inputs=inputs)
+
+        res = price(inputs, params)  # fuera del lock: no bloquear otras sesiones
+
+        with self._lock:
+            self.misses += 1
+            self._data[key] = res
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return res
+
+    def info(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+_CACHE = QuoteCache(QUOTE_CACHE_SIZE)
+
+
+def cached_price(inputs: QuoteInputs, config: dict | PricingParams) -> QuoteResult:
+    """price() con caché de proceso. Sin versión de config (PricingParams armado a mano) no cachea."""
+    p = _as_params(config)
+    if not p.version:
+        return price(inputs, p)
+    return _CACHE.price(inputs, p)
+
+
+def quote_cache_info() -> dict:
+    return _CACHE.info()
+
+
+def quote_cache_clear() -> None:
+    _CACHE.clear()
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Tuple
+
+from lib.calc import TIPO_EXTENDIDO, factor_vs_carta
+
+# -------------------------
+# Codificación compacta (versionada) de quotes.inputs / quotes.breakdown
+# -------------------------
+# v1 (filas viejas): el Cotizador guardaba todo expandido; acabados_items y
+# acabados_metrics iban en inputs Y en breakdown, las fórmulas como texto en cada
+# fila, y muchos campos derivados (clicks, factor carta, totales, copias de papel).
+#
+# v2: inputs lleva lo capturado + los resultados que no se pueden recalcular sin
+# la config (cubicación, hojas, merma); breakdown solo los costos unitarios y los
+# totales cobrados (solo admin/cotizador). Lo demás lo reconstruye decode_quote_row
+# con las mismas operaciones de lib/calc.py, así que los exporters y el Historial
+# siguen leyendo la forma v1 sin cambios.
+#
+# La versión va en inputs["_v"]; sin ella la fila es v1 y se lee tal cual.
+
+PAYLOAD_VERSION = 2
+VERSION_KEY = "_v"
+
+FORMULAS = {
+    "impresion_costo": "total = unidades_carta_lado * costo_unitario_carta_lado",
+    "impresion_clicks": "clicks_maquina = hojas_fisicas * lados (extendido) | hojas_fisicas * 2 (libro)",
+    "acabados": "total = suma(items.total)",
+    "papel": "hojas_con_merma = ceil(hojas_fisicas * (1 + merma)); total = hojas_con_merma * costo_hoja",
+    "adicionales": "total = suma(importes)",
+    "precio": "precio_total = subtotal_antes_margen * (1 + margen)",
+}
+
+# inputs v1 que se recalculan al decodificar
+_DERIVED_INPUT_KEYS = {
+    "factor_carta",
+    "clicks_maquina",
+    "paginas_totales",
+    "acabados_total",
+    "acabados_metrics",
+    "adicionales_total",
+    "papel_costo_kg_aplicado",  # va en breakdown["costos"] (solo admin/cotizador)
+}
+
+# breakdown v2 (solo con permisos de costos): v2 -> (sección v1, llave v1)
+_COSTOS = {
+    "impresion_total": ("impresion", "total"),
+    "mo_dep_unit": ("impresion.params", "mo_dep_unit"),
+    "tinta_unit": ("impresion.params", "tinta_unit"),
+    "click_unit": ("impresion.params", "click_unit"),
+    "cobertura_op_unit": ("impresion.params", "cobertura_op_unit"),
+    "papel_costo_kg": ("papel", "costo_kg"),
+    "costo_hoja": ("papel", "costo_hoja"),
+    "merma": ("papel", "merma"),
+    "papel_total": ("papel", "total"),
+    "subtotal": ("totales", "subtotal_antes_margen"),
+    "margen": ("totales", "margen"),
+}
+
+
+def payload_version(row: Dict[str, Any]) -> int:
+    inputs = (row or {}).get("inputs")
+    if isinstance(inputs, dict):
+        try:
+            return int(inputs.get(VERSION_KEY, 1))
+        except (TypeError, ValueError):
+            return 1
+    return 1
+
+
+def _section(d: dict, path: str) -> dict:
+    for k in path.split("."):
+        d = (d.get(k) if isinstance(d, dict) else None) or {}
+    return d if isinstance(d, dict) else {}
+
+
+def _encode_item(it: dict) -> dict:
+    bd = it.get("breakdown")
+    if isinstance(bd, dict) and "total" in bd and bd.get("total") == it.get("total"):
+        it = {**it, "breakdown": {k: v for k, v in bd.items() if k != "total"}}
+    return it
+
+
+def _decode_item(it: dict) -> dict:
+    bd = it.get("breakdown")
+    if it.get("type") == "computed" and isinstance(bd, dict) and "total" not in bd and "qty_used" in bd:
+        it = {**it, "breakdown": {**bd, "total": it.get("total")}}
+    return it
+
+
+def encode_quote_payload(inputs: Dict[str, Any], breakdown: Dict[str, Any]) -> Tuple[dict, dict]:
+    """(inputs, breakdown) v1 -> v2. Si breakdown no trae costos (vendedor) queda vacío."""
+    inputs = dict(inputs or {})
+    breakdown = breakdown or {}
+
+    enc_inputs: Dict[str, Any] = {VERSION_KEY: PAYLOAD_VERSION}
+    for k, v in inputs.items():
+        if k in _DERIVED_INPUT_KEYS:
+            continue
+        if k == "lados" and inputs.get("tipo_producto") != TIPO_EXTENDIDO:
+            continue  # libro: siempre 2
+        if k == "acabados_items":
+            v = [_encode_item(it) if isinstance(it, dict) else it for it in (v or [])]
+        enc_inputs[k] = v
+
+    enc_breakdown: Dict[str, Any] = {}
+    if _section(breakdown, "totales").get("margen") is not None:
+        enc_breakdown["costos"] = {
+            k: _section(breakdown, sec).get(key) for k, (sec, key) in _COSTOS.items()
+        }
+    return enc_inputs, enc_breakdown
+
+
+def _sum_totals(values) -> float:
+    total = 0.0
+    for v in values:
+        total += float(v or 0.0)
+    return float(total)
+
+
+def decode_quote_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Row de quotes con inputs/breakdown en forma v1 (la que leen exporters e Historial).
+    Filas v1 se devuelven tal cual; nunca muta el row original.
+    """
+    if payload_version(row) < PAYLOAD_VERSION:
+        return row
+
+    enc = dict(row.get("inputs") or {})
+    enc.pop(VERSION_KEY, None)
+    costos = (row.get("breakdown") or {}).get("costos")
+
+    extendido = enc.get("tipo_producto") == TIPO_EXTENDIDO
+    piezas = int(enc.get("tiraje_piezas" if extendido else "tiraje_libros") or 0)
+    lados = int(enc.get("lados", 1)) if extendido else 2
+    hojas_fisicas = int(enc.get("hojas_fisicas") or 0)
+    hojas_con_merma = enc.get("hojas_con_merma")
+    n_tintas = int(enc.get("n_tintas", 4))
+    unidades = float(enc.get("clicks_facturable") or 0.0)
+
+    acabados_items = [_decode_item(it) if isinstance(it, dict) else it for it in (enc.get("acabados_items") or [])]
+    adicionales_items = list(enc.get("adicionales_items") or [])
+    acabados_total = _sum_totals(it.get("total") for it in acabados_items if isinstance(it, dict))
+    adicionales_total = float(sum(float(r.get("importe", 0.0)) for r in adicionales_items if isinstance(r, dict)))
+
+    sheet_area_m2 = (float(enc.get("hoja_w_cm") or 0.0) / 100.0) * (float(enc.get("hoja_h_cm") or 0.0) / 100.0)
+    metrics = {
+        "sheet_m2_total": float(sheet_area_m2 * hojas_fisicas),
+        "sheets_total": hojas_fisicas,
+        "pieces_total": piezas,
+    }
+    clicks_maquina = hojas_fisicas * lados
+
+    inputs = dict(enc)
+    inputs.update({
+        "factor_carta": float(factor_vs_carta(float(enc.get("ancho_final_cm") or 0.0), float(enc.get("alto_final_cm") or 0.0))),
+        "clicks_maquina": clicks_maquina,
+        "acabados_total": acabados_total,
+        "acabados_items": acabados_items,
+        "acabados_metrics": metrics,
+        "adicionales_total": adicionales_total,
+        "adicionales_items": adicionales_items,
+    })
+    if not extendido:
+        inputs["paginas_totales"] = piezas * int(enc.get("paginas_por_libro") or 0)
+        inputs["lados"] = 2
+
+    papel = {
+        "tipo_papel": enc.get("tipo_papel"),
+        "gramaje_gm2": enc.get("papel_gramaje_gm2"),
+        "hojas_fisicas": hojas_fisicas,
+        "hojas_con_merma": hojas_con_merma,
+    }
+    totales = {
+        "precio_unitario": row.get("price_unit"),
+        "precio_total": row.get("price_total"),
+    }
+
+    if isinstance(costos, dict):
+        c = dict(costos)
+        inputs["papel_costo_kg_aplicado"] = c.get("papel_costo_kg")
+        mo_dep, tinta_unit = float(c.get("mo_dep_unit") or 0.0), float(c.get("tinta_unit") or 0.0)
+        click_unit, cobertura_op = float(c.get("click_unit") or 0.0), float(c.get("cobertura_op_unit") or 0.0)
+        breakdown = {
+            "impresion": {
+                "unidades_carta_lado": unidades,
+                "costo_unitario_carta_lado": float(mo_dep + tinta_unit + click_unit + cobertura_op),
+                "formula_costo": FORMULAS["impresion_costo"],
+                "total": c.get("impresion_total"),
+                "params": {
+                    "n_tintas": n_tintas,
+                    "factor_tintas": float(n_tintas) / 4.0,
+                    "cobertura_tinta_base_pct": enc.get("cobertura_tinta_base_pct"),
+                    "mo_dep_unit": mo_dep,
+                    "tinta_unit": tinta_unit,
+                    "click_unit": click_unit,
+                    "cobertura_op_unit": cobertura_op,
+                },
+                "clicks_maquina": clicks_maquina,
+                "formula_clicks_maquina": FORMULAS["impresion_clicks"],
+            },
+            "acabados": {
+                "total": acabados_total,
+                "items": acabados_items,
+                "metrics": metrics,
+                "formula": FORMULAS["acabados"],
+            },
+            "papel": {
+                **papel,
+                "costo_kg": c.get("papel_costo_kg"),
+                "costo_hoja": c.get("costo_hoja"),
+                "merma": c.get("merma"),
+                "formula": FORMULAS["papel"],
+                "total": c.get("papel_total"),
+            },
+            "adicionales": {
+                "total": adicionales_total,
+                "formula": FORMULAS["adicionales"],
+                "items": adicionales_items,
+            },
+            "totales": {
+                "subtotal_antes_margen": c.get("subtotal"),
+                "margen": c.get("margen"),
+                **totales,
+                "formula_precio": FORMULAS["precio"],
+            },
+        }
+    else:
+        breakdown = {
+            "impresion": {
+                "unidades_carta_lado": unidades,
+                "clicks_maquina": clicks_maquina,
+                "clicks_facturable": unidades,
+                "n_tintas": n_tintas,
+            },
+            "papel": papel,
+            "acabados": {"total": acabados_total, "items": acabados_items, "metrics": metrics},
+            "adicionales": {"total": adicionales_total, "items": adicionales_items},
+            "totales": {**totales, "margen": None},
+        }
+
+    out = dict(row)
+    out["inputs"] = inputs
+    out["breakdown"] = breakdown
+    return out
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from cachetools import TTLCache
+
+# -------------------------
+# Detalle de cotizaciones (select "*") con caché por quote_code
+# -------------------------
+# "Abrir detalle" pedía la fila completa a Supabase cada vez, aunque se acabara
+# de ver. Ahora las filas se guardan en un TTLCache por proceso (compartido entre
+# sesiones, acotado a DETAIL_MAX filas y DETAIL_TTL_S segundos) y los faltantes
+# se piden en UNA consulta con in_("quote_code", [...]) por bloque de
+# DETAIL_BATCH, así que abrir N cotizaciones cuesta un viaje, no N.
+#
+# Una cotización guardada no se edita desde la app; el TTL acota lo que tarda en
+# verse un cambio hecho por fuera (p.ej. scripts/recotizar_historial.py).
+# Los códigos que no existen no se guardan en caché.
+
+DETAIL_MAX = 256
+DETAIL_TTL_S = 600
+DETAIL_BATCH = 200  # códigos por consulta (largo de la URL de PostgREST)
+
+_cache: TTLCache = TTLCache(maxsize=DETAIL_MAX, ttl=DETAIL_TTL_S)
+_lock = threading.Lock()
+
+
+def _cached(code: str) -> Optional[dict]:
+    with _lock:
+        return _cache.get(code)
+
+
+def get_quote_details(sb, quote_codes: Iterable[str]) -> Dict[str, dict]:
+    """
+    {quote_code: fila completa} para los códigos que existen. Los que están en
+    caché no tocan la red; el resto va en una consulta in_() por bloque.
+    Cada fila devuelta es una copia superficial (tratar inputs/breakdown como solo lectura).
+    """
+    codes = list(dict.fromkeys(str(c) for c in quote_codes if c))
+    out: Dict[str, dict] = {}
+    missing: List[str] = []
+    for c in codes:
+        row = _cached(c)
+        if row is None:
+            missing.append(c)
+        else:
+            out[c] = row
+
+    for i in range(0, len(missing), DETAIL_BATCH):
+        chunk = missing[i:i + DETAIL_BATCH]
+        res = sb.table("quotes").select("*").in_("quote_code", chunk).execute()
+        rows = getattr(res, "data", None) or []
+        with _lock:
+            for row in rows:
+                code = str(row.get("quote_code"))
+                _cache[code] = row
+                out[code] = row
+
+    return {c: dict(out[c]) for c in codes if c in out}
+
+
+def get_quote_detail(sb, quote_code: str) -> Optional[dict]:
+    return get_quote_details(sb, [quote_code]).get(str(quote_code))
+
+
+def forget_quote_details(quote_codes: Iterable[str] | None = None) -> None:
+    """Saca códigos del caché (todos si None)."""
+    with _lock:
+        if quote_codes is None:
+            _cache.clear()
+            return
+        for c in quote_codes:
+            _cache.pop(str(c), None)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# -------------------------
+# Lista del Historial: filtros en el servidor + paginación por llave
+# -------------------------
+# Antes se traían hasta 1000 filas y se filtraba en pandas: una cotización vieja
+# fuera de ese límite no aparecía. Ahora todos los filtros van en la consulta
+# PostgREST y la lista se pagina por llave (keyset) sobre
+# (quote_number desc, created_at desc): cada página pide "las N siguientes a la
+# última fila vista", así que cuesta lo mismo la página 1 que la 5000 (sin offset).
+#
+# Supabase (una vez):
+#   create index if not exists quotes_number_created_idx on quotes (quote_number desc, created_at desc);
+#   create index if not exists quotes_created_by_idx on quotes (created_by, quote_number desc);
+#   create index if not exists quotes_created_at_idx on quotes (created_at);
+
+LIST_COLUMNS = (
+    "quote_code, created_at, created_by, created_role, customer_name, "
+    "price_unit, price_total, currency, quote_number"
+)
+
+TZ = ZoneInfo("America/Mexico_City")  # las fechas del filtro son días locales
+
+Cursor = Tuple[int, str]  # (quote_number, created_at) de la última fila de la página
+
+
+@dataclass(frozen=True, slots=True)
+class QuoteFilters:
+    number: Optional[int] = None       # No. exacto
+    code: str = ""                     # prefijo de quote_code (ID)
+    created_by: str = ""
+    customer: str = ""                 # contiene (sin mayúsculas)
+    date_from: Optional[date] = None   # inclusive
+    date_to: Optional[date] = None     # inclusive
+
+    @classmethod
+    def from_search(cls, text: str, **kw) -> "QuoteFilters":
+        """El campo de búsqueda acepta No. (solo dígitos) o ID (prefijo)."""
+        s = (text or "").strip()
+        if s.isdigit():
+            return cls(number=int(s), **kw)
+        return cls(code=s, **kw)
+
+
+@dataclass(frozen=True, slots=True)
+class QuotePage:
+    rows: List[Dict[str, Any]]
+    next_cursor: Optional[Cursor]  # None = no hay más páginas
+
+
+def _like(text: str) -> str:
+    # % y * son comodines en PostgREST; el texto del usuario se toma literal
+    return "".join(ch for ch in text.strip() if ch not in "%*")
+
+
+def local_day_start(d: date) -> str:
+    """Inicio del día local (America/Mexico_City) en ISO con zona, para comparar con created_at."""
+    return datetime.combine(d, time.min, tzinfo=TZ).isoformat()
+
+
+def apply_filters(q, f: QuoteFilters):
+    if f.number is not None:
+        q = q.eq("quote_number", f.number)
+    code = _like(f.code)
+    if code:
+        q = q.ilike("quote_code", f"{code}%")
+    if f.created_by:
+        q = q.eq("created_by", f.created_by)
+    customer = _like(f.customer)
+    if customer:
+        q = q.ilike("customer_name", f"%{customer}%")
+    if f.date_from:
+        q = q.gte("created_at", local_day_start(f.date_from))
+    if f.date_to:
+        q = q.lt("created_at", local_day_start(f.date_to + timedelta(days=1)))
+    return q
+
+
+def _after(q, cursor: Cursor):
+    n, ts = cursor
+    # "después" en orden descendente: número menor, o mismo número y fecha anterior
+    return q.or_(f'quote_number.lt.{int(n)},and(quote_number.eq.{int(n)},created_at.lt."{ts}")')
+
+
+def fetch_page(sb, f: QuoteFilters, cursor: Optional[Cursor] = None, page_size: int = 50) -> QuotePage:
+    """Una página de la lista; pide page_size + 1 filas para saber si hay siguiente."""
+    q = apply_filters(sb.table("quotes").select(LIST_COLUMNS), f)
+    if cursor is not None:
+        q = _after(q, cursor)
+    res = (
+        q.order("quote_number", desc=True)
+        .order("created_at", desc=True)
+        .limit(int(page_size) + 1)
+        .execute()
+    )
+    rows = res.data or []
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if more and rows:
+        last = rows[-1]
+        next_cursor = (int(last["quote_number"]), str(last["created_at"]))
+    return QuotePage(rows=rows, next_cursor=next_cursor)
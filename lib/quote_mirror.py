@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, List, Optional
+
+from lib.config_store import DATA_DIR
+from lib.quote_list import Cursor, QuoteFilters, QuotePage
+from lib.quote_search import LIST_FIELDS, SEARCH_SOURCE_COLUMNS, SqliteQuoteSearch, epoch
+
+# -------------------------
+# Espejo local de la lista del Historial (SQLite)
+# -------------------------
+# Las columnas de la lista (LIST_COLUMNS) + el documento de búsqueda viven en
+# data/quotes_mirror.sqlite, compartido por todas las sesiones del proceso.
+# Cada apertura del Historial pide a Supabase solo el delta:
+#
+#   quote_number > (último visto - SYNC_OVERLAP)   (orden ascendente, bloques de SYNC_PAGE)
+#
+# El traslape re-lee las últimas filas por si una inserción con número menor
+# confirmó después que otra con número mayor; el alta es upsert por quote_code,
+# así que re-leer no duplica. Entre sesiones, el sync se salta si otro corrió
+# hace menos de SYNC_INTERVAL_S segundos.
+#
+# Filtros y paginación por llave (mismos QuoteFilters / Cursor que
+# lib/quote_list.py) se resuelven en SQLite con índices; la búsqueda de texto es
+# la FTS5 de SqliteQuoteSearch sobre las mismas filas. El cliente se compara
+# contra norm_text(customer_name), así que "josé" encuentra "JOSÉ perez"
+# (LIKE de SQLite solo ignora mayúsculas ASCII).
+#
+# Las cotizaciones no se borran desde la app; una fila borrada a mano en
+# Supabase sigue en el espejo hasta borrar el archivo (se reconstruye solo).
+
+MIRROR_PATH = DATA_DIR / "quotes_mirror.sqlite"
+
+SYNC_PAGE = 1000
+SYNC_OVERLAP = 50
+SYNC_INTERVAL_S = 5.0
+
+
+class QuoteMirror(SqliteQuoteSearch):
+    def __init__(self, path: str | Path = MIRROR_PATH):
+        super().__init__(path)
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+
+    # --- sync ---
+    def sync(self, sb, force: bool = False) -> int:
+        """Trae el delta desde Supabase. Devuelve filas recibidas (0 si se saltó)."""
+        with self._sync_lock:  # una sesión sincroniza; las demás esperan y reusan
+            if not force and time.monotonic() - self._last_sync < SYNC_INTERVAL_S:
+                return 0
+            total = 0
+            last = self.max_quote_number()
+            after = None if last is None else max(int(last) - SYNC_OVERLAP, 0)
+            while True:
+                q = sb.table("quotes").select(SEARCH_SOURCE_COLUMNS)
+                if after is not None:
+                    q = q.gt("quote_number", after)
+                rows = q.order("quote_number").limit(SYNC_PAGE).execute().data or []
+                total += self.index(rows)
+                if len(rows) < SYNC_PAGE:
+                    break
+                after = rows[-1]["quote_number"]
+            self._last_sync = time.monotonic()
+            return total
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("select count(*) from quote_rows").fetchone()[0]
+
+    # --- lista ---
+    def fetch_page(self, f: QuoteFilters, cursor: Optional[Cursor] = None, page_size: int = 50) -> QuotePage:
+        """Igual que lib.quote_list.fetch_page, servido desde el espejo."""
+        # Mismos filtros que la búsqueda (cliente sin acentos / mayúsculas vía customer_norm)
+        where, args = self._where(f)
+        sql = [f"select {', '.join(LIST_FIELDS)}, created_ts from quote_rows where 1 = 1", *where]
+        if cursor is not None:
+            n, ts = int(cursor[0]), epoch(cursor[1])
+            sql.append("and (quote_number < ? or (quote_number = ? and created_ts < ?))")
+            args += [n, n, ts]
+        sql.append("order by quote_number desc, created_ts desc limit ?")
+        args.append(int(page_size) + 1)
+
+        with self._lock:
+            rows = [dict(r) for r in self._db.execute(" ".join(sql), args).fetchall()]
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        for r in rows:
+            r.pop("created_ts", None)
+        next_cursor = None
+        if more and rows:
+            next_cursor = (int(rows[-1]["quote_number"]), str(rows[-1]["created_at"]))
+        return QuotePage(rows=rows, next_cursor=next_cursor)
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from postgrest.exceptions import APIError
+
+from lib.config_store import DATA_DIR
+from lib.snapshots import ensure_snapshot
+
+# -------------------------
+# Bandeja de salida (outbox) para guardar cotizaciones
+# -------------------------
+# "Guardar cotización" ya no espera a Supabase: la fila se escribe en
+# data/quotes_outbox.sqlite (una transacción local, durable aunque se reinicie
+# el proceso) y un hilo de fondo la sube con reintentos:
+#
+#   pending --(upsert ok)--> synced
+#      ^  |--(sin red / 5xx)--> pending con attempts + 1, next_attempt_at = ahora + backoff
+#      |  \--(rechazo 4xx)---> igual, y a los REJECT_MAX_ATTEMPTS intentos: failed
+#      \--------------------- failed (botón "Reintentar": vuelve a pending)
+#
+# Un error de red corta la vuelta (las demás fallarían igual y esperan su turno);
+# un rechazo de Supabase (el mismo payload no va a pasar) no detiene a las
+# demás filas. Las failed quedan visibles en el Cotizador / Historial.
+#
+# Idempotencia: el insert es upsert(on_conflict="quote_code", ignore_duplicates),
+# así que reintentar una fila que sí llegó (pero cuya respuesta se perdió) no la
+# duplica. Supabase (una vez):
+#   create unique index if not exists quotes_quote_code_key on quotes (quote_code);
+#
+# El snapshot de config viaja en la misma entrada y se sube antes (config_hash
+# es FK). Si Supabase responde error al subirlo (p.ej. sin tabla
+# config_snapshots), se hace lo de antes: embeberlo en la fila (solo si el rol
+# puede ver costos) y mandar la cotización sin config_hash.
+#
+# Las entradas synced se purgan después de SYNCED_KEEP_S.
+
+OUTBOX_PATH = DATA_DIR / "quotes_outbox.sqlite"
+
+STATUS_PENDING = "pending"
+STATUS_SYNCED = "synced"
+STATUS_FAILED = "failed"
+
+FLUSH_BATCH = 20
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 300.0
+IDLE_POLL_S = 30.0
+REJECT_MAX_ATTEMPTS = 3
+SYNCED_KEEP_S = 7 * 24 * 3600
+
+
+@dataclass(frozen=True, slots=True)
+class OutboxEntry:
+    quote_code: str
+    status: str
+    attempts: int
+    last_error: str
+    created_at: float
+    synced_at: Optional[float]
+
+
+def backoff_s(attempts: int) -> float:
+    """Espera antes del siguiente intento: exponencial con tope y algo de jitter."""
+    base = min(BACKOFF_BASE_S * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_S)
+    return base * random.uniform(0.8, 1.2)
+
+
+# SQLSTATE / PostgREST que no son culpa de la fila: BD caída, sin recursos, deadlock
+_TRANSIENT_CODES = ("08", "40", "53", "57", "58", "XX", "PGRST0")
+
+
+def is_rejection(e: Exception) -> bool:
+    """True si Supabase respondió y rechazó la fila (4xx): reintentar el mismo payload no sirve."""
+    if not isinstance(e, APIError):
+        return False  # red, timeout, DNS...
+    code = str(e.code or "")
+    if code.isdigit() and len(code) == 3:  # sin JSON: viene el status HTTP
+        return 400 <= int(code) < 500
+    return bool(code) and not code.startswith(_TRANSIENT_CODES)
+
+
+class QuoteOutbox:
+    def __init__(self, path: str | Path = OUTBOX_PATH):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("pragma journal_mode=wal")
+            self._db.execute("pragma synchronous=full")  # lo guardado sobrevive a un corte
+            self._db.execute(
+                "create table if not exists outbox ("
+                " quote_code text primary key, payload text not null, status text not null,"
+                " attempts integer not null default 0, last_error text not null default '',"
+                " created_at real not null, next_attempt_at real not null, synced_at real)"
+            )
+            self._db.execute("create index if not exists outbox_due_idx on outbox (status, next_attempt_at)")
+        self._wake = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._sb = None
+
+    # --- escribir ---
+    def enqueue(self, row: Dict[str, Any], snapshot: Optional[dict] = None, embed_snapshot: bool = False) -> str:
+        """Guarda la cotización localmente (instantáneo) y despierta al hilo de envío."""
+        code = str(row["quote_code"])
+        payload = json.dumps(
+            {"row": row, "snapshot": snapshot, "embed_snapshot": bool(embed_snapshot)},
+            ensure_ascii=False,
+            default=str,
+        )
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "insert or ignore into outbox (quote_code, payload, status, created_at, next_attempt_at) "
+                "values (?, ?, ?, ?, ?)",
+                (code, payload, STATUS_PENDING, now, now),
+            )
+        self._wake.set()
+        return code
+
+    # --- leer ---
+    def status(self, quote_codes: Iterable[str]) -> Dict[str, OutboxEntry]:
+        codes = [str(c) for c in quote_codes if c]
+        if not codes:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                "select quote_code, status, attempts, last_error, created_at, synced_at from outbox "
+                f"where quote_code in ({', '.join('?' for _ in codes)})",
+                codes,
+            ).fetchall()
+        return {r["quote_code"]: OutboxEntry(**dict(r)) for r in rows}
+
+    def pending(self, limit: int = 50) -> List[OutboxEntry]:
+        with self._lock:
+            rows = self._db.execute(
+                "select quote_code, status, attempts, last_error, created_at, synced_at from outbox "
+                "where status = ? order by created_at limit ?",
+                (STATUS_PENDING, int(limit)),
+            ).fetchall()
+        return [OutboxEntry(**dict(r)) for r in rows]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._db.execute("select count(*) from outbox where status = ?", (STATUS_PENDING,)).fetchone()[0]
+
+    def failed_count(self) -> int:
+        with self._lock:
+            return self._db.execute("select count(*) from outbox where status = ?", (STATUS_FAILED,)).fetchone()[0]
+
+    # --- enviar ---
+    def _push(self, sb, entry: Dict[str, Any]) -> None:
+        row = dict(entry["row"])
+        snap = entry.get("snapshot")
+        if snap is not None:
+            try:
+                row["config_hash"] = ensure_snapshot(sb, snap)
+            except APIError:
+                # Supabase respondió (no es red): sin tabla de snapshots -> como antes
+                row.pop("config_hash", None)
+                if entry.get("embed_snapshot"):
+                    row["config_snapshot"] = snap
+        (
+            sb.table("quotes")
+            .upsert(row, on_conflict="quote_code", ignore_duplicates=True, returning="minimal")
+            .execute()
+        )
+
+    def flush(self, sb, limit: int = FLUSH_BATCH) -> int:
+        """Intenta las entradas vencidas; devuelve cuántas quedaron synced."""
+        now = time.time()
+        with self._lock:
+            due = self._db.execute(
+                "select quote_code, payload, attempts from outbox "
+                "where status = ? and next_attempt_at <= ? order by created_at limit ?",
+                (STATUS_PENDING, now, int(limit)),
+            ).fetchall()
+
+        ok = 0
+        for r in due:
+            try:
+                self._push(sb, json.loads(r["payload"]))
+            except Exception as e:
+                attempts = int(r["attempts"]) + 1
+                rejected = is_rejection(e)
+                status = STATUS_FAILED if rejected and attempts >= REJECT_MAX_ATTEMPTS else STATUS_PENDING
+                with self._lock, self._db:
+                    self._db.execute(
+                        "update outbox set status = ?, attempts = ?, last_error = ?, next_attempt_at = ? "
+                        "where quote_code = ?",
+                        (status, attempts, str(e)[:500], time.time() + backoff_s(attempts), r["quote_code"]),
+                    )
+                if rejected:
+                    continue  # problema de esta fila; las demás siguen
+                break  # sin red fallarían todas; las demás esperan a la siguiente vuelta
+            with self._lock, self._db:
+                self._db.execute(
+                    "update outbox set status = ?, synced_at = ?, last_error = '' where quote_code = ?",
+                    (STATUS_SYNCED, time.time(), r["quote_code"]),
+                )
+            ok += 1
+
+        with self._lock, self._db:
+            self._db.execute(
+                "delete from outbox where status = ? and synced_at < ?", (STATUS_SYNCED, now - SYNCED_KEEP_S)
+            )
+        return ok
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            row = self._db.execute(
+                "select min(next_attempt_at) from outbox where status = ?", (STATUS_PENDING,)
+            ).fetchone()
+        if row[0] is None:
+            return IDLE_POLL_S
+        return min(max(row[0] - time.time(), 0.0), IDLE_POLL_S)
+
+    # --- hilo de fondo ---
+    def start(self, sb) -> None:
+        """Arranca (una vez por proceso) el hilo que vacía la bandeja con `sb`."""
+        self._sb = sb
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="quote-outbox", daemon=True)
+            self._worker.start()
+
+    def kick(self) -> None:
+        self._wake.set()
+
+    def retry_now(self) -> None:
+        """
+        Adelanta el siguiente intento de todas las pendientes y devuelve las
+        failed a pending con intentos en cero (botón "Reintentar").
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "update outbox set status = ?, next_attempt_at = ?,"
+                " attempts = case when status = ? then 0 else attempts end"
+                " where status in (?, ?)",
+                (STATUS_PENDING, time.time(), STATUS_FAILED, STATUS_PENDING, STATUS_FAILED),
+            )
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.clear()  # antes de vaciar: un enqueue durante el flush no se pierde
+            try:
+                self.flush(self._sb)
+            except Exception:
+                pass  # p.ej. disco lleno; se reintenta en la siguiente vuelta
+            self._wake.wait(timeout=self._next_due_in())
+
+
+_outbox: Optional[QuoteOutbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(path: str | Path = OUTBOX_PATH) -> QuoteOutbox:
+    """La bandeja del proceso (compartida por todas las sesiones)."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = QuoteOutbox(path)
+        return _outbox
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from lib.quote_list import LIST_COLUMNS, QuoteFilters, local_day_start
+
+# -------------------------
+# Búsqueda de texto en el Historial (cliente, notas, producto, papel)
+# -------------------------
+# Misma interfaz, dos backends:
+#   SupabaseQuoteSearch: RPC search_quotes (tsvector + pg_trgm, índices GIN)
+#   SqliteQuoteSearch:   FTS5 local (corridas locales / pruebas); la usa el espejo
+#                        local del Historial (lib/quote_mirror.py)
+#
+#   backend.search(texto, filtros, limit) -> filas de la lista (LIST_COLUMNS),
+#   ordenadas por relevancia. Cada palabra cuenta como prefijo y todas deben
+#   coincidir ("couche 150 juan" -> couche* & 150* & juan*), sin acentos.
+#   Todos los QuoteFilters aplican (No., prefijo de ID, usuario, cliente, fechas);
+#   el cliente se compara sin acentos ni mayúsculas.
+#
+# Supabase (una vez):
+#   create extension if not exists pg_trgm;
+#   create extension if not exists unaccent;
+#   create or replace function quotes_search_doc(customer text, notes text, inputs jsonb)
+#   returns text language sql immutable as $$
+#     select lower(public.unaccent('public.unaccent', concat_ws(' ', customer, notes,
+#            inputs->>'tipo_producto', inputs->>'tipo_papel')))
+#   $$;
+#   alter table quotes add column if not exists search_doc tsvector
+#     generated always as (to_tsvector('simple', quotes_search_doc(customer_name, notes, inputs))) stored;
+#   create index if not exists quotes_search_doc_idx on quotes using gin (search_doc);
+#   create index if not exists quotes_customer_trgm_idx on quotes
+#     using gin (lower(public.unaccent('public.unaccent', coalesce(customer_name, ''))) gin_trgm_ops);
+#
+#   create or replace function search_quotes(
+#     q text, p_created_by text default null,
+#     p_from timestamptz default null, p_to timestamptz default null, p_limit int default 50,
+#     p_number bigint default null, p_code text default null, p_customer text default null
+#   ) returns table (
+#     quote_code text, created_at timestamptz, created_by text, created_role text,
+#     customer_name text, price_unit numeric, price_total numeric, currency text,
+#     quote_number bigint, rank real
+#   ) language sql stable as $$
+#     with t as (
+#       select lower(public.unaccent('public.unaccent', q)) as qn,
+#              to_tsquery('simple', string_agg(quote_literal(w) || ':*', ' & ')) as tsq
+#       from regexp_split_to_table(lower(public.unaccent('public.unaccent', q)), '\s+') w
+#       where w <> ''
+#     )
+#     select x.quote_code, x.created_at, x.created_by, x.created_role, x.customer_name,
+#            x.price_unit, x.price_total, x.currency, x.quote_number,
+#            ts_rank(x.search_doc, t.tsq)
+#              + similarity(lower(public.unaccent('public.unaccent', coalesce(x.customer_name, ''))), t.qn) as rank
+#     from quotes x, t
+#     where (x.search_doc @@ t.tsq
+#            or lower(public.unaccent('public.unaccent', coalesce(x.customer_name, ''))) % t.qn)
+#       and (p_created_by is null or x.created_by = p_created_by)
+#       and (p_number is null or x.quote_number = p_number)
+#       and (p_code is null or starts_with(lower(x.quote_code), lower(p_code)))
+#       and (p_customer is null or lower(public.unaccent('public.unaccent', coalesce(x.customer_name, '')))
+#            like '%' || lower(public.unaccent('public.unaccent', p_customer)) || '%')
+#       and (p_from is null or x.created_at >= p_from)
+#       and (p_to is null or x.created_at < p_to)
+#     order by rank desc, x.quote_number desc
+#     limit p_limit
+#   $$;
+
+SEARCH_RPC = "search_quotes"
+
+# Columnas extra (JSON path de PostgREST) para armar el documento de búsqueda local
+SEARCH_SOURCE_COLUMNS = (
+    LIST_COLUMNS + ", notes, tipo_producto:inputs->>tipo_producto, tipo_papel:inputs->>tipo_papel"
+)
+
+LIST_FIELDS = [c.strip() for c in LIST_COLUMNS.split(",")]
+
+_SQLITE_SCHEMA = 3  # pragma user_version; otra versión = se reconstruye (es solo caché)
+
+
+def norm_text(s: str) -> str:
+    """Sin acentos, casefold (como unaccent + lower en Postgres)."""
+    s = unicodedata.normalize("NFKD", s or "")
+    return "".join(ch for ch in s if not unicodedata.combining(ch)).casefold()
+
+
+def search_terms(text: str) -> List[str]:
+    """Palabras normalizadas (sin acentos / mayúsculas / signos) de la búsqueda."""
+    return re.findall(r"\w+", norm_text(text))
+
+
+def epoch(ts: Any) -> Optional[float]:
+    """created_at ISO (con zona) -> segundos UTC; None si no se puede leer."""
+    try:
+        return datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def date_bounds(f: QuoteFilters) -> tuple[Optional[str], Optional[str]]:
+    lo = local_day_start(f.date_from) if f.date_from else None
+    hi = local_day_start(f.date_to + timedelta(days=1)) if f.date_to else None
+    return lo, hi
+
+
+# -------------------------
+# Supabase (RPC)
+# -------------------------
+class SupabaseQuoteSearch:
+    def __init__(self, sb):
+        self.sb = sb
+
+    def search(self, text: str, f: QuoteFilters = QuoteFilters(), limit: int = 50) -> List[Dict[str, Any]]:
+        terms = search_terms(text)
+        if not terms:
+            return []
+        lo, hi = date_bounds(f)
+        params = {
+            "q": " ".join(terms),
+            "p_created_by": f.created_by or None,
+            "p_from": lo,
+            "p_to": hi,
+            "p_limit": int(limit),
+        }
+        # Solo si se usan: una search_quotes anterior (sin estos parámetros) sigue sirviendo lo demás
+        if f.number is not None:
+            params["p_number"] = int(f.number)
+        if f.code.strip():
+            params["p_code"] = f.code.strip()
+        if f.customer.strip():
+            params["p_customer"] = f.customer.strip()
+        return self.sb.rpc(SEARCH_RPC, params).execute().data or []
+
+
+# -------------------------
+# SQLite FTS5 (local)
+# -------------------------
+def search_doc(row: Dict[str, Any]) -> str:
+    """Texto indexado de una fila (mismos campos que quotes_search_doc en Postgres)."""
+    inputs = row.get("inputs") if isinstance(row.get("inputs"), dict) else {}
+    parts = [
+        row.get("customer_name"),
+        row.get("notes"),
+        row.get("tipo_producto") or inputs.get("tipo_producto"),
+        row.get("tipo_papel") or inputs.get("tipo_papel"),
+    ]
+    return norm_text(" ".join(str(p) for p in parts if p))
+
+
+def _escape_like(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SqliteQuoteSearch:
+    """
+    Índice FTS5 (bm25) + tabla con las columnas de la lista. `path` puede ser
+    ":memory:" (pruebas); el archivo se comparte entre sesiones del proceso.
+    """
+
+    def __init__(self, path: str | Path = ":memory:"):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("pragma journal_mode=wal")
+            if self._db.execute("pragma user_version").fetchone()[0] != _SQLITE_SCHEMA:
+                self._db.execute("drop table if exists quote_rows")
+                self._db.execute("drop table if exists quote_fts")
+                self._db.execute(f"pragma user_version = {_SQLITE_SCHEMA}")
+            # created_ts: created_at en segundos UTC (filtros de fecha / cursor por índice)
+            # customer_norm: norm_text(customer_name) (filtro de cliente sin acentos / mayúsculas)
+            self._db.execute(
+                "create table if not exists quote_rows ("
+                " id integer primary key, quote_code text unique not null, quote_number integer,"
+                " created_at text, created_ts real, created_by text, created_role text, customer_name text,"
+                " price_unit real, price_total real, currency text, customer_norm text)"
+            )
+            self._db.execute(
+                "create index if not exists quote_rows_number_idx on quote_rows (quote_number desc, created_ts desc)"
+            )
+            self._db.execute(
+                "create index if not exists quote_rows_user_idx on quote_rows (created_by, quote_number desc)"
+            )
+            self._db.execute("create index if not exists quote_rows_ts_idx on quote_rows (created_ts)")
+            self._db.execute(
+                "create virtual table if not exists quote_fts using fts5("
+                " doc, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def index(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Alta / reemplazo por quote_code. Devuelve cuántas filas se indexaron."""
+        n = 0
+        with self._lock, self._db:
+            for r in rows:
+                if not r.get("quote_code"):
+                    continue
+                # rowid de quote_fts = id de quote_rows (reemplazo O(log n) por quote_code)
+                rid = self._db.execute(
+                    f"insert into quote_rows ({', '.join(LIST_FIELDS)}, created_ts, customer_norm) "
+                    f"values ({', '.join('?' for _ in LIST_FIELDS)}, ?, ?) "
+                    f"on conflict(quote_code) do update set "
+                    f"{', '.join(f'{c} = excluded.{c}' for c in LIST_FIELDS if c != 'quote_code')}, "
+                    f"created_ts = excluded.created_ts, customer_norm = excluded.customer_norm "
+                    f"returning id",
+                    [r.get(c) for c in LIST_FIELDS]
+                    + [epoch(r.get("created_at")), norm_text(r.get("customer_name") or "")],
+                ).fetchone()[0]
+                self._db.execute("delete from quote_fts where rowid = ?", (rid,))
+                self._db.execute("insert into quote_fts (rowid, doc) values (?, ?)", (rid, search_doc(r)))
+                n += 1
+        return n
+
+    def max_quote_number(self) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("select max(quote_number) from quote_rows").fetchone()
+        return row[0]
+
+    @staticmethod
+    def _where(f: QuoteFilters, t: str = "") -> tuple[List[str], List[Any]]:
+        """Condiciones SQL ("and ...") de los QuoteFilters sobre quote_rows (alias `t`)."""
+        sql: List[str] = []
+        args: List[Any] = []
+        if f.number is not None:
+            sql.append(f"and {t}quote_number = ?")
+            args.append(int(f.number))
+        if f.code.strip():
+            sql.append(f"and {t}quote_code like ? escape '\\'")
+            args.append(_escape_like(f.code.strip()) + "%")
+        if f.created_by:
+            sql.append(f"and {t}created_by = ?")
+            args.append(f.created_by)
+        customer = norm_text(f.customer.strip())
+        if customer:
+            sql.append(f"and instr({t}customer_norm, ?) > 0")
+            args.append(customer)
+        lo, hi = date_bounds(f)
+        if lo:
+            sql.append(f"and {t}created_ts >= ?")
+            args.append(epoch(lo))
+        if hi:
+            sql.append(f"and {t}created_ts < ?")
+            args.append(epoch(hi))
+        return sql, args
+
+    def search(self, text: str, f: QuoteFilters = QuoteFilters(), limit: int = 50) -> List[Dict[str, Any]]:
+        terms = search_terms(text)
+        if not terms:
+            return []
+        match = " AND ".join(f'"{t}"*' for t in terms)
+        sql = [
+            f"select {', '.join('r.' + c for c in LIST_FIELDS)}, bm25(quote_fts) as rank",
+            "from quote_fts join quote_rows r on r.id = quote_fts.rowid",
+            "where quote_fts match ?",
+        ]
+        where, args = self._where(f, "r.")
+        sql += where
+        args.insert(0, match)
+        sql.append("order by rank, r.quote_number desc limit ?")
+        args.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(" ".join(sql), args).fetchall()
+        return [dict(r) for r in rows]
+
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from lib.calc import (
+    TIPO_EXTENDIDO, TIPO_LIBRO,
+    PricingParams, QuoteInputs, params_from_config, price, selections_from_items,
+)
+from lib.config_store import config_from_dict, config_hash
+
+# -------------------------
+# Recotización de cotizaciones guardadas (tabla quotes)
+# -------------------------
+# Dos modos:
+#   - "snapshot": recotiza con el config_snapshot guardado en la misma fila
+#                 (verifica que el motor reproduce el precio guardado)
+#   - "actual":   recotiza con la config vigente (mide el drift de precios)
+# El snapshot viene embebido (filas viejas) o por config_hash (tabla
+# config_snapshots, ver lib/snapshots.py; se resuelve antes de mandar a los
+# workers). Filas viejas de vendedor no traen ninguno: salen "sin_snapshot".
+
+MODE_SNAPSHOT = "snapshot"
+MODE_ACTUAL = "actual"
+
+STATUS_IGUAL = "igual"
+STATUS_DIFERENTE = "diferente"
+STATUS_SIN_SNAPSHOT = "sin_snapshot"
+STATUS_ERROR = "error"
+
+# Diferencia (en pesos) que se considera redondeo
+TOLERANCIA_MXN = 0.01
+
+QUOTE_COLUMNS = "quote_code,created_at,price_total,inputs,config_snapshot,config_hash"
+
+RESULT_COLUMNS = [
+    "quote_code",
+    "created_at",
+    "modo",
+    "price_total_old",
+    "price_total_new",
+    "delta",
+    "delta_pct",
+    "status",
+    "error",
+]
+
+_SNAPSHOT_PARAMS_MAX = 256
+_snapshot_params: dict[str, PricingParams] = {}
+
+
+def _f(v: Any, fallback: float) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return float(fallback)
+
+
+def inputs_from_payload(inputs: dict) -> QuoteInputs:
+    """Reconstruye QuoteInputs desde quotes.inputs (el payload que guarda el Cotizador)."""
+    d = QuoteInputs()
+    tipo = TIPO_LIBRO if inputs.get("tipo_producto") == TIPO_LIBRO else TIPO_EXTENDIDO
+
+    if tipo == TIPO_LIBRO:
+        piezas = int(_f(inputs.get("tiraje_libros"), d.piezas))
+        paginas = int(_f(inputs.get("paginas_por_libro"), 0))
+        lados = 2
+    else:
+        piezas = int(_f(inputs.get("tiraje_piezas"), d.piezas))
+        paginas = 0
+        lados = int(_f(inputs.get("lados"), d.lados))
+
+    extras = tuple(
+        (str(r.get("concepto", "")), _f(r.get("importe"), 0.0))
+        for r in (inputs.get("adicionales_items") or [])
+        if isinstance(r, dict) and str(r.get("concepto", "")).strip()
+    )
+
+    return QuoteInputs(
+        tipo_producto=tipo,
+        ancho_final_cm=_f(inputs.get("ancho_final_cm"), d.ancho_final_cm),
+        alto_final_cm=_f(inputs.get("alto_final_cm"), d.alto_final_cm),
+        piezas=piezas,
+        lados=lados,
+        paginas=paginas,
+        hoja_w_cm=_f(inputs.get("hoja_w_cm"), d.hoja_w_cm),
+        hoja_h_cm=_f(inputs.get("hoja_h_cm"), d.hoja_h_cm),
+        area_w_cm=_f(inputs.get("area_w_cm"), d.area_w_cm),
+        area_h_cm=_f(inputs.get("area_h_cm"), d.area_h_cm),
+        bleed_cm=_f(inputs.get("bleed_cm"), d.bleed_cm),
+        gutter_cm=_f(inputs.get("gutter_cm"), d.gutter_cm),
+        allow_rotate=bool(inputs.get("allow_rotate", d.allow_rotate)),
+        allow_mixed=bool(inputs.get("allow_mixed", False)),
+        tipo_papel=str(inputs.get("tipo_papel") or d.tipo_papel),
+        papel_gramaje_gm2=_f(inputs.get("papel_gramaje_gm2"), d.papel_gramaje_gm2),
+        papel_key=str(inputs.get("papel_key") or ""),
+        n_tintas=int(_f(inputs.get("n_tintas"), d.n_tintas)),
+        acabados=selections_from_items(inputs.get("acabados_items")),
+        extras=extras,
+    )
+
+
+def params_for_snapshot(snapshot: dict, h: Optional[str] = None) -> PricingParams:
+    """PricingParams de un config_snapshot, memorizado por hash (muchas filas comparten snapshot)."""
+    h = h or config_hash(snapshot)
+    params = _snapshot_params.get(h)
+    if params is None:
+        if len(_snapshot_params) >= _SNAPSHOT_PARAMS_MAX:
+            _snapshot_params.clear()
+        params = params_from_config(config_from_dict(snapshot))
+        _snapshot_params[h] = params
+    return params
+
+
+def reprice_row(row: dict, mode: str, current: Optional[PricingParams] = None) -> dict:
+    """Recotiza un row de quotes. Los errores quedan en la columna 'error' (no detienen el proceso)."""
+    old = row.get("price_total")
+    out = {
+        "quote_code": row.get("quote_code", ""),
+        "created_at": row.get("created_at", ""),
+        "modo": mode,
+        "price_total_old": (round(float(old), 4) if old is not None else None),
+        "price_total_new": None,
+        "delta": None,
+        "delta_pct": None,
+        "status": "",
+        "error": "",
+    }
+
+    try:
+        if mode == MODE_SNAPSHOT:
+            snapshot = row.get("config_snapshot")
+            if not isinstance(snapshot, dict) or not snapshot:
+                out["status"] = STATUS_SIN_SNAPSHOT
+                return out
+            params = params_for_snapshot(snapshot, row.get("config_hash"))
+        else:
+            if current is None:
+                raise ValueError("modo 'actual' requiere la config vigente")
+            params = current
+
+        inputs = row.get("inputs")
+        if not isinstance(inputs, dict):
+            raise ValueError("la fila no trae inputs")
+
+        new = float(price(inputs_from_payload(inputs), params).precio_total)
+    except Exception as e:
+        out["status"] = STATUS_ERROR
+        out["error"] = f"{type(e).__name__}: {e}"
+        return out
+
+    out["price_total_new"] = round(new, 4)
+    if old is None:
+        out["status"] = STATUS_DIFERENTE
+        return out
+
+    delta = new - float(old)
+    out["delta"] = round(delta, 4)
+    out["delta_pct"] = (round(delta / float(old), 6) if float(old) else None)
+    out["status"] = STATUS_IGUAL if abs(delta) <= TOLERANCIA_MXN else STATUS_DIFERENTE
+    return out
+
+
+def reprice_rows(rows: list[dict], mode: str, current: Optional[PricingParams] = None) -> list[dict]:
+    return [reprice_row(r, mode, current) for r in rows]
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from lib.config_store import DATA_DIR, config_hash
+
+# -------------------------
+# Snapshots de config direccionados por contenido
+# -------------------------
+# Antes cada row de quotes guardaba copy.deepcopy(cfg) completo en config_snapshot.
+# Ahora el snapshot se guarda UNA vez en la tabla config_snapshots (llave = hash
+# del contenido) y quotes solo guarda config_hash. Las filas viejas con
+# config_snapshot embebido se siguen leyendo igual (resolve_row_snapshot).
+#
+# Supabase (una vez):
+#   create table if not exists config_snapshots (
+#     hash text primary key,
+#     snapshot jsonb not null,
+#     created_at timestamptz not null default now()
+#   );
+#   alter table quotes add column if not exists config_hash text references config_snapshots(hash);
+#
+# Caché local (los snapshots son inmutables, nunca se invalida):
+#   - memoria: LRU por proceso
+#   - disco:   data/snapshots/<hash>.json
+
+SNAPSHOTS_TABLE = "config_snapshots"
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"
+
+_MEM_MAX = 64
+_mem: "OrderedDict[str, dict]" = OrderedDict()
+_uploaded: set[str] = set()  # hashes que ya sabemos que existen en Supabase
+_lock = threading.Lock()
+
+
+def snapshot_hash(cfg: dict) -> str:
+    return config_hash(cfg)
+
+
+def _mem_get(h: str) -> Optional[dict]:
+    with _lock:
+        snap = _mem.get(h)
+        if snap is not None:
+            _mem.move_to_end(h)
+        return snap
+
+
+def _mem_put(h: str, snap: dict) -> None:
+    with _lock:
+        _mem[h] = snap
+        _mem.move_to_end(h)
+        while len(_mem) > _MEM_MAX:
+            _mem.popitem(last=False)
+
+
+def _disk_path(h: str) -> Path:
+    return SNAPSHOTS_DIR / f"{h}.json"
+
+
+def _disk_get(h: str) -> Optional[dict]:
+    p = _disk_path(h)
+    if not p.exists():
+        return None
+    try:
+        snap = json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    return snap if isinstance(snap, dict) else None
+
+
+def _disk_put(h: str, snap: dict) -> None:
+    try:
+        SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+        p = _disk_path(h)
+        if not p.exists():
+            tmp = p.with_suffix(".tmp")
+            tmp.write_text(json.dumps(snap, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(p)
+    except Exception:
+        pass  # el caché en disco es opcional (p.ej. disco de solo lectura)
+
+
+def _remember(h: str, snap: dict) -> None:
+    _mem_put(h, snap)
+    _disk_put(h, snap)
+
+
+def ensure_snapshot(sb, cfg: dict) -> str:
+    """
+    Sube el snapshot si Supabase aún no lo tiene y devuelve su hash.
+    Misma config -> mismo hash -> un solo registro (upsert ignorando duplicados).
+    """
+    h = snapshot_hash(cfg)
+    if h in _uploaded:
+        return h
+
+    (
+        sb.table(SNAPSHOTS_TABLE)
+        .upsert({"hash": h, "snapshot": cfg}, on_conflict="hash", ignore_duplicates=True, returning="minimal")
+        .execute()
+    )
+    _uploaded.add(h)
+    _remember(h, cfg)
+    return h
+
+
+def get_snapshots(sb, hashes: Iterable[str]) -> Dict[str, dict]:
+    """Resuelve varios hashes: memoria -> disco -> una sola consulta in_() a Supabase."""
+    out: Dict[str, dict] = {}
+    missing = []
+    for h in {str(h) for h in hashes if h}:
+        snap = _mem_get(h)
+        if snap is None:
+            snap = _disk_get(h)
+            if snap is not None:
+                _mem_put(h, snap)
+        if snap is None:
+            missing.append(h)
+        else:
+            out[h] = snap
+
+    if missing and sb is not None:
+        res = sb.table(SNAPSHOTS_TABLE).select("hash, snapshot").in_("hash", missing).execute()
+        for r in (res.data or []):
+            snap = r.get("snapshot")
+            if isinstance(snap, dict):
+                _remember(str(r["hash"]), snap)
+                _uploaded.add(str(r["hash"]))
+                out[str(r["hash"])] = snap
+    return out
+
+
+def get_snapshot(sb, h: str) -> Optional[dict]:
+    return get_snapshots(sb, [h]).get(h) if h else None
+
+
+def resolve_row_snapshot(sb, row: Dict[str, Any]) -> Optional[dict]:
+    """config_snapshot de un row de quotes: embebido (filas viejas) o por config_hash."""
+    snap = row.get("config_snapshot")
+    if isinstance(snap, dict) and snap:
+        return snap
+    return get_snapshot(sb, row.get("config_hash") or "")
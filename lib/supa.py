@@ -1,8 +1,35 @@
+import os
+from pathlib import Path
+
 import streamlit as st
 from supabase import create_client
 
+SECRETS_PATH = Path(__file__).resolve().parents[1] / ".streamlit" / "secrets.toml"
+
+
 @st.cache_resource
 def get_supabase():
     url = st.secrets["supabase"]["url"]
     key = st.secrets["supabase"]["anon_key"]
     return create_client(url, key)
+
+
+def create_supabase_client(secrets_path: Path = SECRETS_PATH):
+    """
+    Cliente fuera de Streamlit (scripts / procesos por lote).
+    Toma SUPABASE_URL / SUPABASE_KEY del entorno o, si no, [supabase] de .streamlit/secrets.toml.
+    """
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY") or os.environ.get("SUPABASE_ANON_KEY")
+
+    if not (url and key) and Path(secrets_path).exists():
+        import tomllib
+
+        with open(secrets_path, "rb") as f:
+            sec = tomllib.load(f).get("supabase", {})
+        url = url or sec.get("url")
+        key = key or sec.get("service_key") or sec.get("anon_key")
+
+    if not (url and key):
+        raise RuntimeError("Faltan credenciales de Supabase (SUPABASE_URL / SUPABASE_KEY o .streamlit/secrets.toml)")
+    return create_client(url, key)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# -------------------------
+# Normalización de texto (keys y nombres de catálogo)
+# -------------------------
+# Una sola definición para las keys que generan Configuración (formulario de
+# acabados, pliegos, papeles) y la importación de acabados (lib/finishes_io.py):
+# la misma entrada produce la misma key venga de donde venga. norm_name es la
+# comparación de nombres (acabados, búsqueda de papeles).
+
+
+def canonical_key(name: str) -> str:
+    """Convierte nombre a key canónica: sin acentos, casefold, sin símbolos raros, espacios a '_'."""
+    s = unicodedata.normalize("NFKD", (name or "").strip())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).casefold()
+    s = re.sub(r"[^a-z0-9\s_-]+", "", s)
+    return re.sub(r"\s+", " ", s).strip().replace(" ", "_")
+
+
+@lru_cache(maxsize=8192)
+def norm_name(s: str) -> str:
+    """Normaliza para comparar nombres: sin acentos, casefold, espacios colapsados."""
+    s = unicodedata.normalize("NFKD", (s or "").strip())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).casefold()
+    return re.sub(r"\s+", " ", s).strip()
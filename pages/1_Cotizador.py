@@ -1,10 +1,9 @@
 import sys
 from pathlib import Path
-import math
 import datetime as dt
 import secrets
 import string
-import copy
+from dataclasses import replace
 
 import streamlit as st
 
@@ -20,6 +19,16 @@ from lib.permissions import permissions_for
 
 from lib.supa import get_supabase
 from lib.config_store import get_config
+from lib.calc import (
+    DEFAULT_HOJA_W, DEFAULT_HOJA_H, DEFAULT_AREA_W, DEFAULT_AREA_H,
+    TIPO_EXTENDIDO, TIPO_LIBRO, PAPEL_TIPOS,
+    QuoteInputs, factor_vs_carta, calc_piezas_por_lado, check_restrictions,
+    params_from_config, price_finish_items, price_ladder, rank_sheets, selections_from_items,
+)
+from lib.quote_cache import cached_price
+from lib.quote_codec import encode_quote_payload
+from lib.snapshots import snapshot_hash
+from lib.quote_outbox import STATUS_FAILED, STATUS_PENDING, STATUS_SYNCED, get_outbox
 from lib.ui import (
     inject_global_css, render_header,
     hr, section_open, section_close
@@ -47,18 +56,6 @@ render_header(
     "Área vs Carta · Tabloide 48×33 · Huella 47.4×32.4"
 )
 
-# -------------------------------------------------
-# Constantes
-# -------------------------------------------------
-CARTA_W = 21.5
-CARTA_H = 28.0
-AREA_CARTA_CM2 = CARTA_W * CARTA_H  # 602 cm²
-
-DEFAULT_HOJA_W = 48.0
-DEFAULT_HOJA_H = 33.0
-DEFAULT_AREA_W = 47.4
-DEFAULT_AREA_H = 32.4
-
 # -------------------------------------------------
 # Config (desde Configuración)
 # -------------------------------------------------
@@ -71,23 +68,18 @@ for k in ("cuche_costo_kg", "bond_costo_kg", "especial_costo_kg", "merma"):
         st.error(f"Config incompleta: falta papel.{k}. Revisa Configuración/Secrets.")
         st.stop()
 
-imp_cfg = cfg.get("impresion", {})
-margen = float(cfg.get("margen", {}).get("margen", 0.0))
+pricing = params_from_config(cfg)
 
-papel_costos_kg = {
-    "Couché": float(cfg["papel"]["cuche_costo_kg"]),
-    "Bond": float(cfg["papel"]["bond_costo_kg"]),
-    "Especial": float(cfg["papel"]["especial_costo_kg"]),
-}
-merma_papel = float(cfg["papel"]["merma"])
+margen = pricing.margen
+papel_costos_kg = pricing.papel_costos_kg
+merma_papel = pricing.merma_papel
 
 # Parámetros impresión
-mo_dep = float(imp_cfg.get("mo_dep", 0.0))
-tinta_cmyk_base = float(imp_cfg.get("tinta_cmyk_base", imp_cfg.get("tinta", 0.0)))
-click_base = float(imp_cfg.get("click_base", imp_cfg.get("click", 0.0)))
-cobertura_op = float(imp_cfg.get("cobertura_op", imp_cfg.get("cobertura", 0.0)))
-cov_base = float(imp_cfg.get("cobertura_tinta_base_pct", 7.5))
-cov_base = max(cov_base, 0.0001)
+mo_dep = pricing.mo_dep
+tinta_cmyk_base = pricing.tinta_cmyk_base
+click_base = pricing.click_base
+cobertura_op = pricing.cobertura_op
+cov_base = pricing.cov_base
 
 if perms.can_view_costs:
     with st.expander("Ver configuración aplicada (solo lectura)", expanded=False):
@@ -101,120 +93,14 @@ if perms.can_view_costs:
             "Tipo papel $/kg (Bond)": papel_costos_kg["Bond"],
             "Tipo papel $/kg (Especial)": papel_costos_kg["Especial"],
             "Merma papel": merma_papel,
+            "Papeles en catálogo": len(pricing.papers),
             "Margen": margen,
         })
 
 # -------------------------------------------------
 # Helpers
 # -------------------------------------------------
-def factor_vs_carta(ancho_cm: float, alto_cm: float) -> float:
-    return (ancho_cm * alto_cm) / AREA_CARTA_CM2
-
-def calc_piezas_por_lado(
-    area_w_cm: float,
-    area_h_cm: float,
-    pieza_w_cm: float,
-    pieza_h_cm: float,
-    gutter_cm: float,
-    bleed_cm: float,
-    allow_rotate: bool,
-) -> tuple[int, str, float, float]:
-    w_eff = pieza_w_cm + 2 * bleed_cm
-    h_eff = pieza_h_cm + 2 * bleed_cm
-
-    if w_eff <= 0 or h_eff <= 0:
-        return 0, "Inválido", w_eff, h_eff
-
-    def fit(area_w: float, area_h: float, w: float, h: float, g: float) -> int:
-        nx = int((area_w + g) // (w + g)) if (w + g) > 0 else 0
-        ny = int((area_h + g) // (h + g)) if (h + g) > 0 else 0
-        return max(nx, 0) * max(ny, 0)
-
-    fit1 = fit(area_w_cm, area_h_cm, w_eff, h_eff, gutter_cm)
-
-    fit2 = 0
-    if allow_rotate:
-        fit2 = fit(area_w_cm, area_h_cm, h_eff, w_eff, gutter_cm)
-
-    if fit2 > fit1:
-        return fit2, "Rotado 90°", w_eff, h_eff
-    return fit1, "Normal", w_eff, h_eff
-
-def compute_finish_cost(fdef: dict, metrics: dict, user_inputs: dict) -> dict:
-    """
-    Cambio clave:
-    - Si basis == sheet_m2_total => SIEMPRE aplica coverage (default 1.0)
-    """
-    basis = fdef.get("basis")
-    calc_type = fdef.get("calc_type")
-
-    # 1) qty base
-    if basis == "sheet_m2_total":
-        qty = float(metrics.get("sheet_m2_total", 0.0))
-
-        # Coverage SIEMPRE que sea m² (default 100%)
-        coverage = float(user_inputs.get("coverage", 1.0))
-        coverage = max(0.0, min(1.0, coverage))
-        qty *= coverage
-
-    elif basis == "sheets_total":
-        qty = float(metrics.get("sheets_total", 0.0))
-        mult = float(user_inputs.get("folds_per_sheet", 1.0))
-        qty *= max(mult, 0.0)
-
-    elif basis == "pieces_total":
-        qty = float(metrics.get("pieces_total", 0.0))
-        mult = float(user_inputs.get("mult_per_piece", 1.0))
-        qty *= max(mult, 0.0)
-
-    else:
-        qty = 0.0
-
-    # 2) rounding opcional
-    rounding = fdef.get("qty_rounding", "none")
-    qty_rounded = qty
-    if rounding == "ceil_1000":
-        qty_rounded = math.ceil(qty / 1000.0)
-
-    rate = float(fdef.get("rate", 0.0))
-    setup = float(fdef.get("setup", 0.0))
-    minimum = float(fdef.get("minimum", 0.0))
-
-    variable = rate * float(qty_rounded)
-
-    # 3) plantillas
-    if calc_type == "unit":
-        total = variable
-    elif calc_type == "min_or_unit":
-        total = max(minimum, variable)
-    elif calc_type == "setup_plus_unit":
-        total = setup + variable
-    elif calc_type == "setup_plus_min_or_unit":
-        total = max(minimum, setup + variable)
-    else:
-        total = 0.0
-
-    return {
-        "qty_base": float(qty),
-        "qty_used": float(qty_rounded),
-        "rate": rate,
-        "setup": setup,
-        "minimum": minimum,
-        "variable": float(variable),
-        "total": float(total),
-        "basis": basis,
-        "calc_type": calc_type,
-        "rounding": rounding,
-    }
-
-def paper_cost_for_sheet(w_cm: float, h_cm: float, gramaje_gm2: float, costo_kg: float) -> tuple[float, float, float]:
-    """Devuelve (area_m2, peso_hoja_kg, costo_hoja)"""
-    w_m = w_cm / 100.0
-    h_m = h_cm / 100.0
-    area_m2 = w_m * h_m
-    peso_kg = area_m2 * gramaje_gm2 / 1000.0
-    costo_hoja = peso_kg * costo_kg
-    return area_m2, peso_kg, costo_hoja
+OUTBOX_POLL_S = 3    # refresco del estado mientras haya guardadas sin sincronizar
 
 def make_quote_code() -> str:
     now = dt.datetime.now()
@@ -300,9 +186,12 @@ def render_extras_manual() -> tuple[float, list]:
 
     cbtn1, cbtn2 = st.columns([1, 1])
     with cbtn1:
-        if st.button("➕ Agregar concepto", key="extras_add"):
-            st.session_state.costos_adicionales.append({"Concepto": "", "Importe": 0.0})
-            st.rerun()
+        # Fila vacía: no cambia el precio; el callback solo repinta la sección (fragmento)
+        st.button(
+            "➕ Agregar concepto",
+            key="extras_add",
+            on_click=lambda: st.session_state.costos_adicionales.append({"Concepto": "", "Importe": 0.0}),
+        )
     with cbtn2:
         if st.button("🗑️ Borrar extras", key="extras_clear"):
             st.session_state.costos_adicionales = []
@@ -346,7 +235,7 @@ def render_extras_manual() -> tuple[float, list]:
 # -------------------------------------------------
 # Inputs principales
 # -------------------------------------------------
-tipo_producto = st.selectbox("Tipo de producto", ["Extendido", "Libro / Folleto (interiores)"])
+tipo_producto = st.selectbox("Tipo de producto", [TIPO_EXTENDIDO, TIPO_LIBRO])
 
 st.subheader("Medida final (libre)")
 colA, colB = st.columns(2)
@@ -360,16 +249,26 @@ st.caption(f"Factor vs Carta (por área): **{factor_carta:.4f}** (Carta=1.0000)"
 
 st.divider()
 
+# Hoja elegida desde el optimizador (se aplica antes de crear los widgets)
+pending_sheet = st.session_state.pop("sheet_pending", None)
+if pending_sheet:
+    st.session_state.update(pending_sheet)
+
+st.session_state.setdefault("job_hoja_w", DEFAULT_HOJA_W)
+st.session_state.setdefault("job_hoja_h", DEFAULT_HOJA_H)
+st.session_state.setdefault("job_area_w", DEFAULT_AREA_W)
+st.session_state.setdefault("job_area_h", DEFAULT_AREA_H)
+
 with st.expander("Cubicación / hoja de impresión (config por trabajo)", expanded=False):
     st.caption("Defaults vienen de preprensa. Ajusta sangrado y separación según trabajo.")
 
     col1, col2 = st.columns(2)
     with col1:
-        hoja_w = st.number_input("Hoja impresión ancho (cm)", value=DEFAULT_HOJA_W, step=0.5)
-        hoja_h = st.number_input("Hoja impresión alto (cm)", value=DEFAULT_HOJA_H, step=0.5)
+        hoja_w = st.number_input("Hoja impresión ancho (cm)", step=0.5, key="job_hoja_w")
+        hoja_h = st.number_input("Hoja impresión alto (cm)", step=0.5, key="job_hoja_h")
     with col2:
-        area_w = st.number_input("Huella/área útil ancho (cm)", value=DEFAULT_AREA_W, step=0.1)
-        area_h = st.number_input("Huella/área útil alto (cm)", value=DEFAULT_AREA_H, step=0.1)
+        area_w = st.number_input("Huella/área útil ancho (cm)", step=0.1, key="job_area_w")
+        area_h = st.number_input("Huella/área útil alto (cm)", step=0.1, key="job_area_h")
 
     col3, col4, col5 = st.columns(3)
     with col3:
@@ -378,30 +277,29 @@ with st.expander("Cubicación / hoja de impresión (config por trabajo)", expand
         gutter = st.number_input("Separación entre piezas (cm)", value=0.2, step=0.1)
     with col5:
         allow_rotate = st.checkbox("Permitir rotación 90°", value=True)
+        allow_mixed = st.checkbox(
+            "Permitir cubicación mixta",
+            value=False,  # opcional: sin marcarla la cubicación (y el precio) es la de siempre
+            disabled=not allow_rotate,
+            help="Bloque normal + franja rotada (un corte de guillotina) si acomoda más piezas.",
+        )
+        allow_mixed = bool(allow_mixed and allow_rotate)
 
 piezas_por_lado, orientacion, w_eff, h_eff = calc_piezas_por_lado(
     area_w, area_h,
     ancho_final, alto_final,
     gutter, bleed,
-    allow_rotate
+    allow_rotate, allow_mixed,
 )
 st.info(f"Cubicación estimada: **{piezas_por_lado} por lado** (orientación: **{orientacion}**)")
 
 # Restricciones
-area_huella = area_w * area_h
-area_pieza_eff = (ancho_final + 2 * bleed) * (alto_final + 2 * bleed)
-
-restriccion_ok = True
-motivo = ""
-
-if piezas_por_lado <= 0:
-    restriccion_ok = False
-    motivo = "La pieza no cabe en el área útil (huella) del tabloide con estos parámetros."
-
-if tipo_producto == "Libro / Folleto (interiores)":
-    if area_pieza_eff > 0.5 * area_huella:
-        restriccion_ok = False
-        motivo = "Para libro/folleto (doblado), el área final (con sangrado) debe ser ≤ 50% del área útil del tabloide."
+restriccion_ok, motivo = check_restrictions(
+    tipo_producto,
+    area_w, area_h,
+    ancho_final, alto_final, bleed,
+    piezas_por_lado,
+)
 
 if not restriccion_ok:
     st.error(motivo)
@@ -409,13 +307,45 @@ if not restriccion_ok:
 
 # Papel
 st.subheader("Papel")
-colP1, colP2 = st.columns(2)
-with colP1:
-    tipo_papel = st.selectbox("Tipo de papel", ["Couché", "Bond", "Especial"])
-with colP2:
-    papel_gramaje = st.number_input("Gramaje (g/m²)", min_value=40.0, value=150.0, step=5.0)
 
-papel_costo_kg = float(papel_costos_kg[tipo_papel])
+# Catálogo de papeles (Configuración): búsqueda por índice tipo / gramaje / marca.
+# Sin catálogo, o con "Genérico", se cotiza por tipo + gramaje como siempre.
+papeles = pricing.papers
+papel_stock = None
+if len(papeles):
+    colB1, colB2 = st.columns([2, 1])
+    with colB1:
+        papel_buscar = st.text_input(
+            "Buscar papel",
+            key="papel_buscar",
+            placeholder="couché 150, bond, marca…",
+        )
+    with colB2:
+        papel_solo_stock = st.checkbox("Solo en stock", value=True, key="papel_solo_stock")
+
+    encontrados = [s.key for s in papeles.search(papel_buscar, solo_stock=papel_solo_stock)]
+    papel_sel = st.session_state.get("papel_key", "")
+    if papel_sel and papel_sel not in encontrados and papeles.get(papel_sel) is not None:
+        encontrados.insert(0, papel_sel)  # la selección actual no desaparece al filtrar
+    papel_key_sel = st.selectbox(
+        "Papel",
+        [""] + encontrados,
+        format_func=lambda k: papeles.get(k).label if k else "— Genérico (tipo + gramaje) —",
+        key="papel_key",
+    )
+    papel_stock = papeles.get(papel_key_sel)
+
+if papel_stock is not None:
+    tipo_papel = papel_stock.tipo
+    papel_gramaje = papel_stock.gramaje_gm2
+    papel_costo_kg = papel_stock.costo_kg_efectivo
+else:
+    colP1, colP2 = st.columns(2)
+    with colP1:
+        tipo_papel = st.selectbox("Tipo de papel", list(PAPEL_TIPOS))
+    with colP2:
+        papel_gramaje = st.number_input("Gramaje (g/m²)", min_value=40.0, value=150.0, step=5.0)
+    papel_costo_kg = float(papel_costos_kg[tipo_papel])
 
 if perms.can_view_costs:
     st.caption(f"Costo aplicado: **${papel_costo_kg:,.2f}/kg** · Merma: **{merma_papel*100:.1f}%**")
@@ -427,12 +357,9 @@ st.divider()
 # -------------------------------------------------
 # Tiraje / hojas / unidades
 # -------------------------------------------------
-unidades_carta_lado = 0.0
-hojas_fisicas = 0
 paginas = None
-paginas_totales = 0
 
-if tipo_producto == "Extendido":
+if tipo_producto == TIPO_EXTENDIDO:
     col1, col2 = st.columns(2)
     with col1:
         piezas = st.number_input("Tiraje (piezas)", min_value=1, value=1000, step=1)
@@ -444,11 +371,6 @@ if tipo_producto == "Extendido":
             horizontal=True
         )
 
-    unidades_carta_lado = float(piezas) * float(factor_carta) * float(lados)
-
-    piezas_por_hoja = int(piezas_por_lado)
-    hojas_fisicas = math.ceil(int(piezas) / max(piezas_por_hoja, 1))
-
     descripcion_producto = "Extendido"
     etiqueta_tiraje = "pzas"
 else:
@@ -463,55 +385,111 @@ else:
         )
 
     piezas = int(libros)
-    descripcion_producto = "Libro / Folleto (interiores)"
+    lados = 2
+    descripcion_producto = TIPO_LIBRO
     etiqueta_tiraje = "libros"
 
-    paginas_totales = int(libros) * int(paginas)
-    unidades_carta_lado = float(paginas_totales) * float(factor_carta)
-
-    paginas_por_hoja_fyv = int(piezas_por_lado) * 2
-    hojas_fisicas = math.ceil(int(paginas_totales) / max(paginas_por_hoja_fyv, 1))
-
-# Métricas acabados
-sheet_area_m2 = (float(hoja_w) / 100.0) * (float(hoja_h) / 100.0)
-sheet_m2_total = sheet_area_m2 * int(hojas_fisicas)
-
-quote_metrics = {
-    "sheet_m2_total": float(sheet_m2_total),
-    "sheets_total": int(hojas_fisicas),
-    "pieces_total": int(piezas),
-}
-
-# Clicks
-if tipo_producto == "Extendido":
-    clicks_maquina = int(hojas_fisicas) * int(lados)
-    clicks_facturable = float(unidades_carta_lado)
-else:
-    clicks_maquina = int(hojas_fisicas) * 2
-    clicks_facturable = float(unidades_carta_lado)
-
 # Tintas
 n_tintas = st.radio("Tintas", [4, 1], horizontal=True, format_func=lambda x: "CMYK (4)" if x == 4 else "1 tinta")
-factor_tintas = float(n_tintas) / 4.0
 
-tinta_unit = tinta_cmyk_base * factor_tintas
-click_unit = click_base * factor_tintas
+# Motor de precio (lib/calc.py): aquí sin acabados/extras, solo para métricas de producción
+quote_inputs = QuoteInputs(
+    tipo_producto=tipo_producto,
+    ancho_final_cm=float(ancho_final),
+    alto_final_cm=float(alto_final),
+    piezas=int(piezas),
+    lados=int(lados),
+    paginas=int(paginas or 0),
+    hoja_w_cm=float(hoja_w),
+    hoja_h_cm=float(hoja_h),
+    area_w_cm=float(area_w),
+    area_h_cm=float(area_h),
+    bleed_cm=float(bleed),
+    gutter_cm=float(gutter),
+    allow_rotate=bool(allow_rotate),
+    allow_mixed=bool(allow_mixed),
+    tipo_papel=tipo_papel,
+    papel_gramaje_gm2=float(papel_gramaje),
+    papel_key=papel_stock.key if papel_stock is not None else "",
+    n_tintas=int(n_tintas),
+)
+base_result = cached_price(quote_inputs, pricing)
+quote_metrics = base_result.metrics
 
-# Costos impresión
-costo_mo_dep = unidades_carta_lado * mo_dep
-costo_tinta = unidades_carta_lado * tinta_unit
-costo_click = unidades_carta_lado * click_unit
-costo_cobertura_op = unidades_carta_lado * cobertura_op
-costo_impresion = costo_mo_dep + costo_tinta + costo_click + costo_cobertura_op
+# -------------------------------------------------
+# Optimizador de hoja (catálogo de pliegos)
+# -------------------------------------------------
+def _use_sheet(opt: dict):
+    st.session_state["sheet_pending"] = {
+        "job_hoja_w": float(opt["hoja_w"]),
+        "job_hoja_h": float(opt["hoja_h"]),
+        "job_area_w": float(opt["area_w"]),
+        "job_area_h": float(opt["area_h"]),
+    }
 
-# Costo papel
-area_m2, peso_hoja_kg, costo_hoja = paper_cost_for_sheet(hoja_w, hoja_h, papel_gramaje, papel_costo_kg)
-hojas_con_merma = math.ceil(hojas_fisicas * (1 + merma_papel))
-costo_papel = hojas_con_merma * costo_hoja
+pliegos_catalog = cfg.get("pliegos") or []
+if pliegos_catalog:
+    with st.expander("Optimizar hoja de impresión (catálogo)", expanded=False):
+        sheet_auto = st.checkbox(
+            "Usar siempre la hoja más barata",
+            key="sheet_auto",
+            help="Evalúa todas las hojas del catálogo (en ambas orientaciones) y aplica la de menor costo.",
+        )
+
+        sheet_opts = rank_sheets(
+            replace(quote_inputs, acabados=selections_from_items(st.session_state.get("acabados_items", []))),
+            pricing,
+            pliegos_catalog,
+        )
+        if not sheet_opts:
+            st.info("La pieza no cabe en ninguna hoja activa del catálogo.")
+        else:
+            best_sheet = sheet_opts[0]
+            current = (float(hoja_w), float(hoja_h), float(area_w), float(area_h))
+            best_dims = (best_sheet["hoja_w"], best_sheet["hoja_h"], best_sheet["area_w"], best_sheet["area_h"])
+
+            if sheet_auto and current != best_dims:
+                _use_sheet(best_sheet)
+                st.rerun()
+
+            sheet_rows = []
+            for o in sheet_opts:
+                r = {
+                    "Hoja": o["display_name"],
+                    "Orientación": o["orientacion_hoja"],
+                    "Medida (cm)": f"{o['hoja_w']:g} × {o['hoja_h']:g}",
+                    "UP por lado": o["piezas_por_lado"],
+                    "Hojas": o["hojas_fisicas"],
+                }
+                if perms.can_view_costs:
+                    r["Papel"] = f"${o['costo_papel']:,.2f}"
+                    r["Costo total"] = f"${o['costo_total']:,.2f}"
+                sheet_rows.append(r)
+            st.dataframe(sheet_rows, use_container_width=True, hide_index=True)
+
+            if current == best_dims:
+                st.caption(f"Ya estás usando la hoja más barata: **{best_sheet['display_name']}** ({best_sheet['orientacion_hoja']}).")
+            else:
+                st.button(
+                    f"✅ Usar {best_sheet['display_name']} ({best_sheet['orientacion_hoja']})",
+                    key="sheet_use_best",
+                    on_click=_use_sheet,
+                    args=(best_sheet,),
+                )
 
 # -------------------------------------------------
 # Acabados
 # -------------------------------------------------
+# Las secciones interactivas (acabados, extras, resultados, guardar) son
+# fragmentos (st.fragment): un clic dentro de una de ellas solo vuelve a correr
+# ESA sección, no la config / cubicación / papel / optimizador de hoja.
+# Solo cuando cambia algo que mueve el precio (agregar/quitar acabado, importe de
+# un extra) se pide un rerun completo para refrescar Resultados, Guardar y Texto.
+ACABADOS_CAMBIARON = "_acabados_cambiaron"
+EXTRAS_APLICADOS = "_extras_aplicados"
+MANUAL_ACAB_AVISO = "_manual_acab_aviso"
+
+
 def _add_finish_and_reset(fdef, preview, user_inputs, selectbox_key: str):
     st.session_state.acabados_items.append({
         "type": "computed",
@@ -530,113 +508,19 @@ def _add_finish_and_reset(fdef, preview, user_inputs, selectbox_key: str):
     for kk in (f"cov_opt_{k}", f"cov_custom_{k}", f"folds_{k}"):
         st.session_state.pop(kk, None)
 
-    st.rerun()
+    st.session_state[ACABADOS_CAMBIARON] = True
 
-st.subheader("Acabados")
-st.session_state.setdefault("acabados_items", [])
-
-finishes_catalog = cfg.get("acabados")
-if not isinstance(finishes_catalog, list):
-    finishes_catalog = []
-
-# Validación (no obligamos allow_partial ya)
-required_keys = ["key", "display_name", "basis", "calc_type", "rate", "minimum", "setup", "qty_rounding"]
-for i, f in enumerate(finishes_catalog):
-    if not isinstance(f, dict):
-        st.error(f"Config inválida: acabados[{i}] no es dict.")
-        st.stop()
-    missing = [k for k in required_keys if k not in f]
-    if missing:
-        st.error(f"Config inválida: acabados[{i}] ({f.get('display_name','sin nombre')}) le faltan: {', '.join(missing)}")
-        st.stop()
-    if "requires" in f and not isinstance(f["requires"], list):
-        st.error(f"Config inválida: acabados[{i}] 'requires' debe ser lista.")
-        st.stop()
-
-options = [
-    {"key": f.get("key", ""), "name": f.get("display_name", "")}
-    for f in finishes_catalog
-    if isinstance(f, dict) and str(f.get("key", "")).strip() and str(f.get("display_name", "")).strip()
-]
-key_to_name = {o["key"]: o["name"] for o in options}
-
-if options:
-    keys = ["__none__"] + [o["key"] for o in options]
-
-    def _fmt_finish(k: str) -> str:
-        if k == "__none__":
-            return "— Selecciona —"
-        return key_to_name.get(k, k)
-
-    sel_key = st.selectbox(
-        "Agregar acabado (catálogo)",
-        keys,
-        format_func=_fmt_finish,
-        key="select_finish_key",
-    )
-
-    if sel_key and sel_key != "__none__":
-        fdef = next((f for f in finishes_catalog if isinstance(f, dict) and f.get("key") == sel_key), None)
-        if fdef is None:
-            st.error("No se encontró el acabado seleccionado (revisa Configuración).")
-            st.stop()
-
-        user_inputs = {}
-
-        # CAMBIO CLAVE: si basis es m², SIEMPRE pedir cobertura
-        if fdef.get("basis") == "sheet_m2_total":
-            cov_opt = st.selectbox("Cobertura", ["100%", "50%", "25%", "Custom"], key=f"cov_opt_{sel_key}")
-            if cov_opt == "100%":
-                user_inputs["coverage"] = 1.0
-            elif cov_opt == "50%":
-                user_inputs["coverage"] = 0.5
-            elif cov_opt == "25%":
-                user_inputs["coverage"] = 0.25
-            else:
-                user_inputs["coverage"] = st.slider(
-                    "Cobertura custom (%)", 0, 100, 100, key=f"cov_custom_{sel_key}"
-                ) / 100.0
-
-        req = fdef.get("requires", []) or []
-        if "folds_per_sheet" in req:
-            user_inputs["folds_per_sheet"] = st.number_input(
-                "Dobleces por pliego",
-                min_value=1.0,
-                step=1.0,
-                value=1.0,
-                key=f"folds_{sel_key}",
-            )
-
-        preview = compute_finish_cost(fdef, quote_metrics, user_inputs)
-        st.caption(
-            f"Base: {preview['basis']} | Qty: {preview['qty_used']:,.3f} | "
-            f"Rate: ${preview['rate']:,.4f} | Total: ${preview['total']:,.2f}"
-        )
-
-        st.button(
-            "➕ Añadir acabado",
-            key=f"add_finish_{sel_key}",
-            on_click=_add_finish_and_reset,
-            args=(fdef, preview, user_inputs, "select_finish_key"),
-        )
-else:
-    st.info("No hay catálogo de acabados. (Puedes agregar un acabado manual abajo).")
-
-# ---------- Acabado manual (importe total) ----------
-st.caption("Acabado Extra).")
-
-st.session_state.setdefault("manual_acab_nombre", "")
-st.session_state.setdefault("manual_acab_total", 0.0)
 
 def _add_manual_acabado():
     n = str(st.session_state.get("manual_acab_nombre", "")).strip()
     a = float(st.session_state.get("manual_acab_total", 0.0) or 0.0)
 
+    # Los avisos se pintan dentro del fragmento (no desde el callback)
     if not n:
-        st.warning("Pon un nombre para el acabado manual.")
+        st.session_state[MANUAL_ACAB_AVISO] = "Pon un nombre para el acabado manual."
         return
     if a <= 0:
-        st.warning("Pon un importe mayor a 0.")
+        st.session_state[MANUAL_ACAB_AVISO] = "Pon un importe mayor a 0."
         return
 
     st.session_state.acabados_items.append({
@@ -648,315 +532,605 @@ def _add_manual_acabado():
 
     st.session_state["manual_acab_nombre"] = ""
     st.session_state["manual_acab_total"] = 0.0
+    st.session_state[ACABADOS_CAMBIARON] = True
 
-with st.form("form_manual_acabado", clear_on_submit=False):
-    cM1, cM2, cM3 = st.columns([3, 2, 1])
-    with cM1:
-        st.text_input("Acabado", key="manual_acab_nombre")
-    with cM2:
-        st.number_input("Importe total ($)", min_value=0.0, step=1.0, key="manual_acab_total")
-    with cM3:
-        st.form_submit_button("➕", on_click=_add_manual_acabado)
 
-st.divider()
+@st.fragment
+def fragment_acabados(quote_metrics: dict):
+    # Un callback (➕) cambió la lista: los totales de toda la página cambian
+    if st.session_state.pop(ACABADOS_CAMBIARON, False):
+        st.rerun()
 
-# ---------- Tabla + total acabados ----------
-total_acabados = 0.0
-if st.session_state.acabados_items:
-    st.write("**Acabados agregados**")
-    for i, it in enumerate(st.session_state.acabados_items):
-        c1, c2, c3 = st.columns([4, 2, 1])
-        with c1:
-            st.write(it.get("display_name", ""))
-        with c2:
-            st.write(f"${float(it.get('total', 0.0)):,.2f}")
-        with c3:
-            if st.button("❌", key=f"del_finish_{i}"):
-                st.session_state.acabados_items.pop(i)
-                st.rerun()
+    st.subheader("Acabados")
+
+    # Precalculado al compilar el catálogo (una vez por versión, no por rerun)
+    options = pricing.catalog.options
+    key_to_name = dict(options)
+
+    if options:
+        keys = ["__none__"] + [k for k, _ in options]
+
+        def _fmt_finish(k: str) -> str:
+            if k == "__none__":
+                return "— Selecciona —"
+            return key_to_name.get(k, k)
+
+        sel_key = st.selectbox(
+            "Agregar acabado (catálogo)",
+            keys,
+            format_func=_fmt_finish,
+            key="select_finish_key",
+        )
+
+        if sel_key and sel_key != "__none__":
+            fdef = pricing.finishes_by_key.get(sel_key)
+            finish_ev = pricing.catalog.get(sel_key)
+            if fdef is None or finish_ev is None:
+                st.error("No se encontró el acabado seleccionado (revisa Configuración).")
+                st.stop()
+
+            user_inputs = {}
+
+            # CAMBIO CLAVE: si basis es m², SIEMPRE pedir cobertura
+            if fdef.get("basis") == "sheet_m2_total":
+                cov_opt = st.selectbox("Cobertura", ["100%", "50%", "25%", "Custom"], key=f"cov_opt_{sel_key}")
+                if cov_opt == "100%":
+                    user_inputs["coverage"] = 1.0
+                elif cov_opt == "50%":
+                    user_inputs["coverage"] = 0.5
+                elif cov_opt == "25%":
+                    user_inputs["coverage"] = 0.25
+                else:
+                    user_inputs["coverage"] = st.slider(
+                        "Cobertura custom (%)", 0, 100, 100, key=f"cov_custom_{sel_key}"
+                    ) / 100.0
+
+            req = fdef.get("requires", []) or []
+            if "folds_per_sheet" in req:
+                user_inputs["folds_per_sheet"] = st.number_input(
+                    "Dobleces por pliego",
+                    min_value=1.0,
+                    step=1.0,
+                    value=1.0,
+                    key=f"folds_{sel_key}",
+                )
+
+            preview = finish_ev.evaluate(quote_metrics, user_inputs)
+            st.caption(
+                f"Base: {preview['basis']} | Qty: {preview['qty_used']:,.3f} | "
+                f"Rate: ${preview['rate']:,.4f} | Total: ${preview['total']:,.2f}"
+            )
+
+            st.button(
+                "➕ Añadir acabado",
+                key=f"add_finish_{sel_key}",
+                on_click=_add_finish_and_reset,
+                args=(fdef, preview, user_inputs, "select_finish_key"),
+            )
+    else:
+        st.info("No hay catálogo de acabados. (Puedes agregar un acabado manual abajo).")
+
+    # ---------- Acabado manual (importe total) ----------
+    st.caption("Acabado Extra).")
+
+    st.session_state.setdefault("manual_acab_nombre", "")
+    st.session_state.setdefault("manual_acab_total", 0.0)
+
+    with st.form("form_manual_acabado", clear_on_submit=False):
+        cM1, cM2, cM3 = st.columns([3, 2, 1])
+        with cM1:
+            st.text_input("Acabado", key="manual_acab_nombre")
+        with cM2:
+            st.number_input("Importe total ($)", min_value=0.0, step=1.0, key="manual_acab_total")
+        with cM3:
+            st.form_submit_button("➕", on_click=_add_manual_acabado)
 
-        total_acabados += float(it.get("total", 0.0))
+    aviso = st.session_state.pop(MANUAL_ACAB_AVISO, None)
+    if aviso:
+        st.warning(aviso)
+
+    st.divider()
+
+    # ---------- Tabla + total acabados ----------
+    # Se recalculan contra las métricas actuales (si cambió el tiraje, el total se actualiza)
+    acabados_items, total_acabados = price_finish_items(
+        selections_from_items(st.session_state.acabados_items), pricing, quote_metrics
+    )
+    if acabados_items:
+        st.write("**Acabados agregados**")
+        for i, it in enumerate(acabados_items):
+            c1, c2, c3 = st.columns([4, 2, 1])
+            with c1:
+                st.write(it.get("display_name", ""))
+            with c2:
+                st.write(f"${float(it.get('total', 0.0)):,.2f}")
+            with c3:
+                if st.button("❌", key=f"del_finish_{i}"):
+                    st.session_state.acabados_items.pop(i)
+                    st.rerun()
+
+    st.metric("Total acabados", f"${total_acabados:,.2f}")
+
+
+st.session_state.setdefault("acabados_items", [])
+
+finishes_catalog = cfg.get("acabados")
+if not isinstance(finishes_catalog, list):
+    finishes_catalog = []
+
+# Validación (no obligamos allow_partial ya)
+required_keys = ["key", "display_name", "basis", "calc_type", "rate", "minimum", "setup", "qty_rounding"]
+for i, f in enumerate(finishes_catalog):
+    if not isinstance(f, dict):
+        st.error(f"Config inválida: acabados[{i}] no es dict.")
+        st.stop()
+    missing = [k for k in required_keys if k not in f]
+    if missing:
+        st.error(f"Config inválida: acabados[{i}] ({f.get('display_name','sin nombre')}) le faltan: {', '.join(missing)}")
+        st.stop()
+    if "requires" in f and not isinstance(f["requires"], list):
+        st.error(f"Config inválida: acabados[{i}] 'requires' debe ser lista.")
+        st.stop()
 
-st.metric("Total acabados", f"${total_acabados:,.2f}")
+# En un run completo la lista ya está al día: el aviso de los callbacks sobra
+st.session_state.pop(ACABADOS_CAMBIARON, None)
+fragment_acabados(quote_metrics)
 
 # -------------------------------------------------
 # Extras manuales (independientes de Acabados)
 # -------------------------------------------------
+def _extras_from_state() -> tuple:
+    """
+    Extras que mueven el precio: con concepto e importe > 0. Filas vacías o en
+    cero (recién agregadas, a medio capturar) no cuentan, así que editarlas
+    solo repinta el fragmento.
+    """
+    extras = []
+    for r in st.session_state.costos_adicionales:
+        concepto = str(r.get("Concepto", "")).strip()
+        importe = float(r.get("Importe", 0.0) or 0.0)
+        if concepto and importe > 0:
+            extras.append((concepto, importe))
+    return tuple(extras)
+
+
+@st.fragment
+def fragment_extras():
+    render_extras_manual()
+
+    # Cambió un extra con importe: el precio cambia -> rerun completo
+    aplicados = st.session_state.get(EXTRAS_APLICADOS)
+    if aplicados is not None and _extras_from_state() != aplicados:
+        st.rerun()
+
+
 st.session_state.setdefault("costos_adicionales", [])
 
-extras_ya_capturados = any(
-    str(r.get("Concepto", "")).strip() and float(r.get("Importe", 0.0)) > 0
-    for r in st.session_state.costos_adicionales
-)
+extras_ya_capturados = bool(_extras_from_state())
 
+# Run completo: los extras se fijan después de pintar el editor
+st.session_state[EXTRAS_APLICADOS] = None
 if extras_ya_capturados:
-    total_adicionales, _extras_items = render_extras_manual()
+    fragment_extras()
+    extras = _extras_from_state()
 else:
-    total_adicionales = 0.0
-    _extras_items = st.session_state.costos_adicionales
+    extras = ()
+st.session_state[EXTRAS_APLICADOS] = extras
 
 # -------------------------------------------------
 # Subtotal y precio
 # -------------------------------------------------
-subtotal_costos = costo_impresion + costo_papel + total_acabados + total_adicionales
-precio_total = subtotal_costos * (1 + margen)
-precio_unitario = precio_total / piezas
+quote_inputs = replace(
+    quote_inputs,
+    acabados=selections_from_items(st.session_state.acabados_items),
+    extras=extras,
+)
+result = cached_price(quote_inputs, pricing)
+
+factor_carta = result.factor_carta
+unidades_carta_lado = result.unidades_carta_lado
+hojas_fisicas = result.hojas_fisicas
+hojas_con_merma = result.hojas_con_merma
+paginas_totales = result.paginas_totales
+clicks_maquina = result.clicks_maquina
+clicks_facturable = result.clicks_facturable
+factor_tintas = result.factor_tintas
+tinta_unit = result.tinta_unit
+click_unit = result.click_unit
+costo_impresion = result.costo_impresion
+papel_costo_kg = result.papel_costo_kg
+costo_hoja = result.costo_hoja
+costo_papel = result.costo_papel
+acabados_items = list(result.acabados_items)
+total_acabados = result.total_acabados
+total_adicionales = result.total_adicionales
+subtotal_costos = result.subtotal_costos
+precio_total = result.precio_total
+precio_unitario = result.precio_unitario
 
 # -------------------------------------------------
-# Resultados
+# Resultados (+ escalera de precios)
 # -------------------------------------------------
-section_open()
-st.subheader("Resultados")
-
-cA, cB = st.columns(2)
-with cA:
-    st.metric("Precio unitario", f"${precio_unitario:,.4f}")
-with cB:
-    st.metric("Precio total", f"${precio_total:,.2f}")
-
-hr()
-
-c1, c2, c3, c4 = st.columns(4)
-
-c1.markdown(f"""
-<div class="small-metric">
-<b>Unidades Carta-lado</b><br>
-<span class="val">{unidades_carta_lado:,.0f}</span>
-</div>
-""", unsafe_allow_html=True)
-
-c2.markdown(f"""
-<div class="small-metric">
-<b>Tabloides (papel)</b><br>
-<span class="val">{hojas_fisicas:,.0f}</span>
-</div>
-""", unsafe_allow_html=True)
-
-c3.markdown(f"""
-<div class="small-metric">
-<b>Clicks máquina</b><br>
-<span class="val">{clicks_maquina:,.0f}</span>
-</div>
-""", unsafe_allow_html=True)
-
-c4.markdown(f"""
-<div class="small-metric">
-<b>Clicks facturable</b><br>
-<span class="val">{clicks_facturable:,.0f}</span>
-</div>
-""", unsafe_allow_html=True)
+@st.fragment
+def fragment_resultados(result, etiqueta_tiraje: str):
+    q = result.inputs
+
+    section_open()
+    st.subheader("Resultados")
+
+    cA, cB = st.columns(2)
+    with cA:
+        st.metric("Precio unitario", f"${result.precio_unitario:,.4f}")
+    with cB:
+        st.metric("Precio total", f"${result.precio_total:,.2f}")
 
-if perms.can_view_costs:
     hr()
-    c5, c6, c7 = st.columns(3)
 
-    c5.markdown(f"""
+    c1, c2, c3, c4 = st.columns(4)
+
+    c1.markdown(f"""
     <div class="small-metric">
-    <b>Costo impresión</b><br>
-    <span class="val">${costo_impresion:,.2f}</span>
+    <b>Unidades Carta-lado</b><br>
+    <span class="val">{result.unidades_carta_lado:,.0f}</span>
     </div>
     """, unsafe_allow_html=True)
 
-    c6.markdown(f"""
+    c2.markdown(f"""
     <div class="small-metric">
-    <b>Subtotal (antes margen)</b><br>
-    <span class="val">${subtotal_costos:,.2f}</span>
+    <b>Tabloides (papel)</b><br>
+    <span class="val">{result.hojas_fisicas:,.0f}</span>
     </div>
     """, unsafe_allow_html=True)
 
-    c7.markdown(f"""
+    c3.markdown(f"""
     <div class="small-metric">
-    <b>Margen aplicado</b><br>
-    <span class="val">{margen*100:.1f}%</span>
+    <b>Clicks máquina</b><br>
+    <span class="val">{result.clicks_maquina:,.0f}</span>
     </div>
     """, unsafe_allow_html=True)
 
-section_close()
+    c4.markdown(f"""
+    <div class="small-metric">
+    <b>Clicks facturable</b><br>
+    <span class="val">{result.clicks_facturable:,.0f}</span>
+    </div>
+    """, unsafe_allow_html=True)
+
+    if perms.can_view_costs:
+        hr()
+        c5, c6, c7 = st.columns(3)
+
+        c5.markdown(f"""
+        <div class="small-metric">
+        <b>Costo impresión</b><br>
+        <span class="val">${result.costo_impresion:,.2f}</span>
+        </div>
+        """, unsafe_allow_html=True)
+
+        c6.markdown(f"""
+        <div class="small-metric">
+        <b>Subtotal (antes margen)</b><br>
+        <span class="val">${result.subtotal_costos:,.2f}</span>
+        </div>
+        """, unsafe_allow_html=True)
+
+        c7.markdown(f"""
+        <div class="small-metric">
+        <b>Margen aplicado</b><br>
+        <span class="val">{result.margen*100:.1f}%</span>
+        </div>
+        """, unsafe_allow_html=True)
+
+    section_close()
+
+    # ---------- Escalera de precios (varios tirajes en una sola pasada) ----------
+    with st.expander("Escalera de precios (tirajes)", expanded=False):
+        st.caption("Mismo trabajo, acabados y extras; solo cambia el tiraje (y opcionalmente lados/tintas).")
+
+        ladder_txt = st.text_input(
+            f"Tirajes ({etiqueta_tiraje}, separados por coma)",
+            value="500, 1000, 2000, 5000",
+            key="ladder_qtys",
+        )
+        ladder_qtys = []
+        for tok in ladder_txt.replace(";", ",").split(","):
+            tok = tok.strip().replace("_", "")
+            if tok.isdigit() and int(tok) > 0:
+                ladder_qtys.append(int(tok))
+        ladder_qtys = sorted(set(ladder_qtys))
+
+        cL1, cL2 = st.columns(2)
+        with cL1:
+            if q.tipo_producto == TIPO_EXTENDIDO:
+                ladder_lados = st.multiselect(
+                    "Impresión",
+                    [1, 2],
+                    default=[int(q.lados)],
+                    format_func=lambda x: "Frente" if x == 1 else "Frente y vuelta",
+                    key="ladder_lados",
+                )
+            else:
+                ladder_lados = [2]
+        with cL2:
+            ladder_tintas = st.multiselect(
+                "Tintas",
+                [4, 1],
+                default=[int(q.n_tintas)],
+                format_func=lambda x: "CMYK (4)" if x == 4 else "1 tinta",
+                key="ladder_tintas",
+            )
+
+        if not ladder_qtys or not ladder_lados or not ladder_tintas:
+            st.info("Captura al menos un tiraje, una opción de impresión y una de tintas.")
+        else:
+            ladder = price_ladder(q, pricing, ladder_qtys, ladder_lados, ladder_tintas)
+
+            ladder_rows = []
+            for i in range(len(ladder["piezas"])):
+                r = {
+                    "Tiraje": int(ladder["piezas"][i]),
+                    "Impresión": "Frente" if int(ladder["lados"][i]) == 1 else "Frente y vuelta",
+                    "Tintas": "CMYK (4)" if int(ladder["n_tintas"][i]) == 4 else "1 tinta",
+                    "Tabloides": int(ladder["hojas_fisicas"][i]),
+                }
+                if perms.can_view_costs:
+                    r["Subtotal costos"] = f"${float(ladder['subtotal_costos'][i]):,.2f}"
+                r["Precio unitario"] = f"${float(ladder['precio_unitario'][i]):,.4f}"
+                r["Precio total"] = f"${float(ladder['precio_total'][i]):,.2f}"
+                ladder_rows.append(r)
+
+            st.dataframe(ladder_rows, use_container_width=True, hide_index=True)
+
+
+fragment_resultados(result, etiqueta_tiraje)
 
 st.divider()
 
 # -------------------------------------------------
 # Guardar cotización
 # -------------------------------------------------
-section_open()
-st.subheader("Guardar cotización")
-
-sb = get_supabase()
-
-if st.button("💾 Guardar cotización en historial"):
-    quote_code = make_quote_code()
-    created_by = user.username
-    created_role = user.role
-
-    cfg_snapshot = copy.deepcopy(cfg)
-
-    inputs_payload = {
-        "tipo_producto": tipo_producto,
-        "ancho_final_cm": float(ancho_final),
-        "alto_final_cm": float(alto_final),
-        "factor_carta": float(factor_carta),
-        "hoja_w_cm": float(hoja_w),
-        "hoja_h_cm": float(hoja_h),
-        "area_w_cm": float(area_w),
-        "area_h_cm": float(area_h),
-        "bleed_cm": float(bleed),
-        "gutter_cm": float(gutter),
-        "allow_rotate": bool(allow_rotate),
-        "piezas_por_lado": int(piezas_por_lado),
-        "orientacion": orientacion,
-
-        "tipo_papel": tipo_papel,
-        "papel_gramaje_gm2": float(papel_gramaje),
-        "papel_costo_kg_aplicado": float(papel_costo_kg),
-
-        "hojas_fisicas": int(hojas_fisicas),
-        "clicks_maquina": int(clicks_maquina),
-        "clicks_facturable": float(clicks_facturable),
-        "hojas_con_merma": int(hojas_con_merma),
-        "n_tintas": int(n_tintas),
-        "cobertura_tinta_base_pct": float(cov_base),
-
-        "acabados_total": float(total_acabados),
-        "acabados_items": st.session_state.get("acabados_items", []),
-        "acabados_metrics": quote_metrics,
-
-        "adicionales_total": float(total_adicionales),
-        "adicionales_items": [
-            {"concepto": r.get("Concepto", ""), "importe": float(r.get("Importe", 0.0))}
-            for r in (st.session_state.get("costos_adicionales", []) or [])
-            if str(r.get("Concepto", "")).strip()
-        ],
-    }
+@st.fragment
+def fragment_guardar(result):
+    q = result.inputs
 
-    if tipo_producto == "Extendido":
-        inputs_payload.update({"tiraje_piezas": int(piezas), "lados": int(lados)})
-    else:
-        inputs_payload.update({
-            "tiraje_libros": int(libros),
-            "paginas_por_libro": int(paginas),
-            "paginas_totales": int(paginas_totales),
-            "lados": 2
-        })
+    section_open()
+    st.subheader("Guardar cotización")
 
-    costo_unitario_carta_lado = float(mo_dep + tinta_unit + click_unit + cobertura_op)
+    sb = get_supabase()
+    outbox = get_outbox()
+    outbox.start(sb)
 
-    impresion_params = {
-        "n_tintas": int(n_tintas),
-        "factor_tintas": float(factor_tintas),
-        "cobertura_tinta_base_pct": float(cov_base),
-        "mo_dep_unit": float(mo_dep),
-        "tinta_unit": float(tinta_unit),
-        "click_unit": float(click_unit),
-        "cobertura_op_unit": float(cobertura_op),
-    }
+    if st.button("💾 Guardar cotización en historial"):
+        quote_code = make_quote_code()
+        created_by = user.username
+        created_role = user.role
 
-    breakdown_payload = {
-        "impresion": {
-            "unidades_carta_lado": float(unidades_carta_lado),
-            "costo_unitario_carta_lado": float(costo_unitario_carta_lado),
-            "formula_costo": "total = unidades_carta_lado * costo_unitario_carta_lado",
-            "total": float(costo_impresion),
-            "params": impresion_params,
-            "clicks_maquina": int(clicks_maquina),
-            "formula_clicks_maquina": "clicks_maquina = hojas_fisicas * lados (extendido) | hojas_fisicas * 2 (libro)"
-        },
-        "acabados": {
-            "total": float(total_acabados),
-            "items": st.session_state.get("acabados_items", []),
-            "metrics": quote_metrics,
-            "formula": "total = suma(items.total)"
-        },
-        "papel": {
-            "tipo_papel": tipo_papel,
-            "gramaje_gm2": float(papel_gramaje),
-            "costo_kg": float(papel_costo_kg),
-            "hojas_fisicas": int(hojas_fisicas),
-            "hojas_con_merma": int(hojas_con_merma),
-            "costo_hoja": float(costo_hoja),
-            "merma": float(merma_papel),
-            "formula": "hojas_con_merma = ceil(hojas_fisicas * (1 + merma)); total = hojas_con_merma * costo_hoja",
-            "total": float(costo_papel),
-        },
-        "adicionales": {
-            "total": float(total_adicionales),
-            "formula": "total = suma(importes)",
-            "items": [
-                {"concepto": r.get("Concepto", ""), "importe": float(r.get("Importe", 0.0))}
-                for r in (st.session_state.get("costos_adicionales", []) or [])
-                if str(r.get("Concepto", "")).strip()
-            ]
-        },
-        "totales": {
-            "subtotal_antes_margen": float(subtotal_costos),
-            "margen": float(margen),
-            "precio_unitario": float(precio_unitario),
-            "precio_total": float(precio_total),
-            "formula_precio": "precio_total = subtotal_antes_margen * (1 + margen)"
+        acabados_items = list(result.acabados_items)
+        adicionales_items = [
+            {"concepto": r.get("Concepto", ""), "importe": float(r.get("Importe", 0.0))}
+            for r in (st.session_state.get("costos_adicionales", []) or [])
+            if str(r.get("Concepto", "")).strip()
+        ]
+
+        inputs_payload = {
+            "tipo_producto": q.tipo_producto,
+            "ancho_final_cm": float(q.ancho_final_cm),
+            "alto_final_cm": float(q.alto_final_cm),
+            "factor_carta": float(result.factor_carta),
+            "hoja_w_cm": float(q.hoja_w_cm),
+            "hoja_h_cm": float(q.hoja_h_cm),
+            "area_w_cm": float(q.area_w_cm),
+            "area_h_cm": float(q.area_h_cm),
+            "bleed_cm": float(q.bleed_cm),
+            "gutter_cm": float(q.gutter_cm),
+            "allow_rotate": bool(q.allow_rotate),
+            "allow_mixed": bool(q.allow_mixed),
+            "piezas_por_lado": int(result.piezas_por_lado),
+            "orientacion": result.orientacion,
+
+            "tipo_papel": q.tipo_papel,
+            "papel_gramaje_gm2": float(q.papel_gramaje_gm2),
+            "papel_costo_kg_aplicado": float(result.papel_costo_kg),
+
+            "hojas_fisicas": int(result.hojas_fisicas),
+            "clicks_maquina": int(result.clicks_maquina),
+            "clicks_facturable": float(result.clicks_facturable),
+            "hojas_con_merma": int(result.hojas_con_merma),
+            "n_tintas": int(q.n_tintas),
+            "cobertura_tinta_base_pct": float(pricing.cov_base),
+
+            "acabados_total": float(result.total_acabados),
+            "acabados_items": acabados_items,
+            "acabados_metrics": result.metrics,
+
+            "adicionales_total": float(result.total_adicionales),
+            "adicionales_items": adicionales_items,
+        }
+        if q.papel_key:
+            inputs_payload["papel_key"] = q.papel_key
+
+        if q.tipo_producto == TIPO_EXTENDIDO:
+            inputs_payload.update({"tiraje_piezas": int(q.piezas), "lados": int(q.lados)})
+        else:
+            inputs_payload.update({
+                "tiraje_libros": int(q.piezas),
+                "paginas_por_libro": int(q.paginas),
+                "paginas_totales": int(result.paginas_totales),
+                "lados": 2
+            })
+
+        impresion_params = {
+            "n_tintas": int(q.n_tintas),
+            "factor_tintas": float(result.factor_tintas),
+            "cobertura_tinta_base_pct": float(pricing.cov_base),
+            "mo_dep_unit": float(pricing.mo_dep),
+            "tinta_unit": float(result.tinta_unit),
+            "click_unit": float(result.click_unit),
+            "cobertura_op_unit": float(pricing.cobertura_op),
         }
-    }
-
-    if perms.can_view_costs:
-        cfg_snapshot_to_save = cfg_snapshot
-        breakdown_to_save = breakdown_payload
-    else:
-        cfg_snapshot_to_save = None
-        inputs_payload.pop("papel_costo_kg_aplicado", None)
 
-        breakdown_to_save = {
+        breakdown_payload = {
             "impresion": {
-                "unidades_carta_lado": float(unidades_carta_lado),
-                "clicks_maquina": int(clicks_maquina),
-                "clicks_facturable": float(clicks_facturable),
-                "n_tintas": int(n_tintas),
-            },
-            "papel": {
-                "tipo_papel": tipo_papel,
-                "gramaje_gm2": float(papel_gramaje),
-                "hojas_fisicas": int(hojas_fisicas),
-                "hojas_con_merma": int(hojas_con_merma),
+                "unidades_carta_lado": float(result.unidades_carta_lado),
+                "costo_unitario_carta_lado": float(result.costo_unitario_carta_lado),
+                "formula_costo": "total = unidades_carta_lado * costo_unitario_carta_lado",
+                "total": float(result.costo_impresion),
+                "params": impresion_params,
+                "clicks_maquina": int(result.clicks_maquina),
+                "formula_clicks_maquina": "clicks_maquina = hojas_fisicas * lados (extendido) | hojas_fisicas * 2 (libro)"
             },
             "acabados": {
-                "total": float(total_acabados),
-                "items": st.session_state.get("acabados_items", []),
-                "metrics": quote_metrics,
+                "total": float(result.total_acabados),
+                "items": acabados_items,
+                "metrics": result.metrics,
+                "formula": "total = suma(items.total)"
+            },
+            "papel": {
+                "tipo_papel": q.tipo_papel,
+                "gramaje_gm2": float(q.papel_gramaje_gm2),
+                "costo_kg": float(result.papel_costo_kg),
+                "hojas_fisicas": int(result.hojas_fisicas),
+                "hojas_con_merma": int(result.hojas_con_merma),
+                "costo_hoja": float(result.costo_hoja),
+                "merma": float(pricing.merma_papel),
+                "formula": "hojas_con_merma = ceil(hojas_fisicas * (1 + merma)); total = hojas_con_merma * costo_hoja",
+                "total": float(result.costo_papel),
             },
             "adicionales": {
-                "total": float(total_adicionales),
-                "items": [
-                    {"concepto": r.get("Concepto", ""), "importe": float(r.get("Importe", 0.0))}
-                    for r in (st.session_state.get("costos_adicionales", []) or [])
-                    if str(r.get("Concepto", "")).strip()
-                ],
+                "total": float(result.total_adicionales),
+                "formula": "total = suma(importes)",
+                "items": adicionales_items,
             },
             "totales": {
-                "precio_unitario": float(precio_unitario),
-                "precio_total": float(precio_total),
-                "margen": None,
-            },
+                "subtotal_antes_margen": float(result.subtotal_costos),
+                "margen": float(result.margen),
+                "precio_unitario": float(result.precio_unitario),
+                "precio_total": float(result.precio_total),
+                "formula_precio": "precio_total = subtotal_antes_margen * (1 + margen)"
+            }
         }
 
-    row = {
-        "quote_code": quote_code,
-        "created_by": created_by,
-        "created_role": created_role,
-        "customer_name": None,
-        "notes": None,
-        "price_unit": float(precio_unitario),
-        "price_total": float(precio_total),
-        "currency": "MXN",
-        "inputs": inputs_payload,
-        "breakdown": breakdown_to_save,
-        "config_snapshot": cfg_snapshot_to_save,
-    }
+        # Snapshot de config: se guarda una sola vez por contenido (config_snapshots)
+        # y la cotización solo referencia el hash. Lo sube la bandeja de salida
+        # antes de la fila (si la tabla aún no existe, lo embebe para admin/cotizador).
+        config_hash = snapshot_hash(cfg)
+
+        if perms.can_view_costs:
+            breakdown_to_save = breakdown_payload
+        else:
+            inputs_payload.pop("papel_costo_kg_aplicado", None)
+
+            breakdown_to_save = {
+                "impresion": {
+                    "unidades_carta_lado": float(result.unidades_carta_lado),
+                    "clicks_maquina": int(result.clicks_maquina),
+                    "clicks_facturable": float(result.clicks_facturable),
+                    "n_tintas": int(q.n_tintas),
+                },
+                "papel": {
+                    "tipo_papel": q.tipo_papel,
+                    "gramaje_gm2": float(q.papel_gramaje_gm2),
+                    "hojas_fisicas": int(result.hojas_fisicas),
+                    "hojas_con_merma": int(result.hojas_con_merma),
+                },
+                "acabados": {
+                    "total": float(result.total_acabados),
+                    "items": acabados_items,
+                    "metrics": result.metrics,
+                },
+                "adicionales": {
+                    "total": float(result.total_adicionales),
+                    "items": adicionales_items,
+                },
+                "totales": {
+                    "precio_unitario": float(result.precio_unitario),
+                    "precio_total": float(result.precio_total),
+                    "margen": None,
+                },
+            }
+
+        # Forma compacta v2 (sin duplicados ni derivados); ver lib/quote_codec.py
+        inputs_to_save, breakdown_to_save = encode_quote_payload(inputs_payload, breakdown_to_save)
+
+        row = {
+            "quote_code": quote_code,
+            "created_by": created_by,
+            "created_role": created_role,
+            "customer_name": None,
+            "notes": None,
+            "price_unit": float(result.precio_unitario),
+            "price_total": float(result.precio_total),
+            "currency": "MXN",
+            "inputs": inputs_to_save,
+            "breakdown": breakdown_to_save,
+            "config_snapshot": None,
+            "config_hash": config_hash,
+        }
 
-    try:
-        sb.table("quotes").insert(row).execute()
+        # Se guarda local (instantáneo) y el hilo de fondo la sube; ver lib/quote_outbox.py.
+        # No se espera a Supabase: el estado de abajo reporta la sincronización.
+        outbox.enqueue(row, snapshot=cfg, embed_snapshot=perms.can_view_costs)
+        st.session_state.setdefault("cotizaciones_guardadas", []).append(quote_code)
         st.success(f"Cotización guardada ✅ ID: {quote_code}")
-    except Exception as e:
-        st.error("No se pudo guardar en Supabase (revisa secrets / conexión).")
-        st.exception(e)
 
-section_close()
+    section_close()
+
+    # Dentro de este fragmento: un guardado recién hecho ya arranca el refresco
+    estado = outbox.status(st.session_state.get("cotizaciones_guardadas", [])[-10:])
+    sin_sincronizar = any(e.status == STATUS_PENDING for e in estado.values())
+    st.fragment(_outbox_status, run_every=OUTBOX_POLL_S if sin_sincronizar else None)(sin_sincronizar)
+
+
+ESTADO_OUTBOX = {STATUS_PENDING: "pendiente", STATUS_SYNCED: "sincronizada", STATUS_FAILED: "rechazada"}
+
+
+def _outbox_status(refrescando: bool):
+    outbox = get_outbox()
+    mias = st.session_state.get("cotizaciones_guardadas", [])
+    estado = outbox.status(mias[-10:])
+    pendientes = outbox.pending_count()
+    fallidas = outbox.failed_count()
+
+    if refrescando and not any(e.status == STATUS_PENDING for e in estado.values()):
+        # Ya se sincronizó lo de esta sesión: una corrida completa apaga el refresco
+        st.rerun()
+
+    if not mias and not pendientes and not fallidas:
+        return
+
+    section_open()
+    st.subheader("Sincronización con el historial")
+    if pendientes:
+        st.warning(f"{pendientes} cotización(es) pendientes de subir a Supabase.")
+    if fallidas:
+        st.error(
+            f"{fallidas} cotización(es) rechazadas por Supabase (ver último error). "
+            "Siguen guardadas en este equipo; \"Reintentar\" las vuelve a enviar."
+        )
+    if not pendientes and not fallidas:
+        st.caption("Todo sincronizado.")
+
+    filas = []
+    for code in reversed(mias[-10:]):
+        e = estado.get(code)
+        if e is None:
+            continue
+        filas.append({
+            "ID": code,
+            "Estado": ESTADO_OUTBOX.get(e.status, e.status),
+            "Intentos": e.attempts,
+            "Último error": e.last_error,
+        })
+    if filas:
+        st.dataframe(filas, hide_index=True, use_container_width=True)
+
+    if (pendientes or fallidas) and st.button("🔁 Reintentar ahora", key="outbox_retry"):
+        outbox.retry_now()
+        st.rerun()  # corrida completa: vuelve a decidir el refresco
+    section_close()
+
+
+fragment_guardar(result)
 
 # -------------------------------------------------
 # Texto copiable
@@ -968,7 +1142,7 @@ texto = build_text(
     alto_final=alto_final,
     piezas=piezas,
     tipo_producto=tipo_producto,
-    lados=locals().get("lados", 2),
+    lados=lados,
     paginas=paginas,
     piezas_por_lado=piezas_por_lado,
     orientacion=orientacion,
@@ -983,7 +1157,7 @@ texto = build_text(
     merma_papel=merma_papel,
     costo_papel=costo_papel,
     total_acabados=total_acabados,
-    acabados_items=st.session_state.get("acabados_items", []),
+    acabados_items=acabados_items,
     total_adicionales=total_adicionales,
     costos_adicionales=st.session_state.costos_adicionales,
     subtotal_costos=subtotal_costos,
@@ -2,25 +2,14 @@ import sys
 from pathlib import Path
 import copy
 import re
-import unicodedata
 import json
+from datetime import datetime
 
 import streamlit as st
 
 # -------------------------------------------------
-# Helpers (keys canónicas)
+# Helpers
 # -------------------------------------------------
-def canonical_key(name: str) -> str:
-    """Convierte nombre a key canónica: sin acentos, casefold, sin símbolos raros, espacios a '_'."""
-    s = (name or "").strip()
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.casefold()
-    s = re.sub(r"[^a-z0-9\s_-]+", "", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    s = s.replace(" ", "_")
-    return s
-
 def sentence_case(name: str) -> str:
     s = (name or "").strip()
     if not s:
@@ -28,70 +17,6 @@ def sentence_case(name: str) -> str:
     s2 = s.lower()
     return s2[0].upper() + s2[1:]
 
-import math
-
-def compute_finish_cost(fdef: dict, metrics: dict, user_inputs: dict) -> dict:
-    basis = fdef.get("basis")
-    calc_type = fdef.get("calc_type")
-
-    # 1) qty base
-    if basis == "sheet_m2_total":
-        qty = float(metrics.get("sheet_m2_total", 0.0))
-        if fdef.get("allow_partial", False):
-            coverage = float(user_inputs.get("coverage", 1.0))
-            coverage = max(0.0, min(1.0, coverage))
-            qty *= coverage
-
-    elif basis == "sheets_total":
-        qty = float(metrics.get("sheets_total", 0.0))
-        mult = float(user_inputs.get("folds_per_sheet", 1.0))
-        qty *= max(mult, 0.0)
-
-    elif basis == "pieces_total":
-        qty = float(metrics.get("pieces_total", 0.0))
-        mult = float(user_inputs.get("mult_per_piece", 1.0))
-        qty *= max(mult, 0.0)
-
-    else:
-        qty = 0.0
-
-    # 2) rounding opcional
-    rounding = fdef.get("qty_rounding", "none")
-    qty_rounded = qty
-    if rounding == "ceil_1000":
-        qty_rounded = math.ceil(qty / 1000.0)
-
-    rate = float(fdef.get("rate", 0.0))
-    setup = float(fdef.get("setup", 0.0))
-    minimum = float(fdef.get("minimum", 0.0))
-
-    variable = rate * float(qty_rounded)
-
-    # 3) plantillas
-    if calc_type == "unit":
-        total = variable
-    elif calc_type == "min_or_unit":
-        total = max(minimum, variable)
-    elif calc_type == "setup_plus_unit":
-        total = setup + variable
-    elif calc_type == "setup_plus_min_or_unit":
-        total = max(minimum, setup + variable)
-    else:
-        total = 0.0
-
-    return {
-        "qty_base": float(qty),
-        "qty_used": float(qty_rounded),
-        "rate": rate,
-        "setup": setup,
-        "minimum": minimum,
-        "variable": float(variable),
-        "total": float(total),
-        "basis": basis,
-        "calc_type": calc_type,
-        "rounding": rounding,
-    }
-
 # -------------------------------------------------
 # Root / imports internos
 # -------------------------------------------------
@@ -100,8 +25,18 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from lib.auth_users_yaml import require_login
+from lib.calc import params_from_config
 from lib.permissions import permissions_for
-from lib.config_store import get_config, reset_config, save_config
+from lib.text import canonical_key
+from lib.config_changes import ChangeTracker, apply_editor_delta, changed, diff_values
+from lib.config_history import history_count, list_versions, read_version, restore_version
+from lib.config_store import (
+    REVISION_KEY, ConfigConflictError, config_revision, get_config, reset_config, save_config,
+)
+from lib.finishes import FinishCatalog, compile_catalog
+from lib.finishes_io import (
+    FINISH_COLUMNS, export_finishes_csv, export_finishes_xlsx, read_finishes, upsert_finishes,
+)
 from lib.ui import inject_global_css, render_header
 
 # -------------------------------------------------
@@ -124,93 +59,173 @@ render_header(
 
 
 # -------------------------------------------------
-# Load config + defaults defensivos
+# Load config
 # -------------------------------------------------
-cfg = get_config()
-cfg_original = copy.deepcopy(cfg)
+# get_config() ya viene migrada al esquema actual (llaves legacy resueltas en
+# config_store.migrate_config) y es compartida entre sesiones.
+#
+# La copia de trabajo (ChangeTracker, lib/config_changes.py) vive en la sesión
+# junto con la revisión sobre la que se empezó a editar: cada widget registra
+# su cambio en on_change, así que un rerun no recorre la config. Se arma de
+# nuevo solo al guardar, al descartar / recargar, o si otra sesión guardó y
+# aquí no hay nada pendiente.
+revision_vigente = config_revision(get_config())
+
+
+def _widgets_registrados() -> set:
+    return st.session_state.setdefault("cfg_widgets", set())
+
+
+def soltar_tracker(limpiar_widgets: bool = False):
+    """La siguiente corrida arma un tracker nuevo sobre la config vigente."""
+    for k in ("cfg_tracker", "cfg_base_revision", "cfg_catalogo"):
+        st.session_state.pop(k, None)
+    # Los data_editor guardan su delta contra la base anterior: sin base nueva
+    # lo re-aplicarían. Los number_input ya muestran lo guardado.
+    widgets = _widgets_registrados() if limpiar_widgets else ("cfg_pliegos_editor", "cfg_papeles_editor")
+    for k in list(widgets):
+        st.session_state.pop(k, None)
+
+
+tracker = st.session_state.get("cfg_tracker")
+if tracker is not None and not len(tracker) and st.session_state.get("cfg_base_revision") != revision_vigente:
+    # Otra sesión guardó y aquí no hay nada que perder: seguir la revisión vigente
+    soltar_tracker(limpiar_widgets=True)
+    tracker = None
+if tracker is None:
+    tracker = ChangeTracker(get_config())
+    st.session_state["cfg_tracker"] = tracker
+    # Revisión sobre la que se empezó a editar: si otra sesión guarda antes, el
+    # guardado se rechaza en vez de pisar sus cambios (ver save_config)
+    st.session_state["cfg_base_revision"] = revision_vigente
+cfg_original = tracker.original
+cfg = tracker.cfg
+
+
+def guardar_config(nueva: dict) -> bool:
+    try:
+        save_config(
+            nueva,
+            expected_revision=st.session_state.get("cfg_base_revision"),
+            saved_by=user.username,
+        )
+    except ConfigConflictError as e:
+        st.session_state["cfg_conflicto"] = str(e)
+        return False
+    soltar_tracker()
+    return True
 
-cfg.setdefault("impresion", {})
-cfg.setdefault("papel", {})
-cfg.setdefault("margen", {})
-cfg.setdefault("acabados", [])
 
-if not isinstance(cfg["acabados"], list):
-    cfg["acabados"] = []
+def descartar_y_recargar():
+    for k in [k for k in st.session_state if str(k).startswith("cfg_")]:
+        del st.session_state[k]
 
-cfg["impresion"].setdefault("mo_dep", 0.0)
-cfg["impresion"].setdefault("tinta_cmyk_base", 0.0)
-cfg["impresion"].setdefault("click_base", 0.0)
-cfg["impresion"].setdefault("cobertura_op", 0.0)
-cfg["impresion"].setdefault("cobertura_tinta_base_pct", 7.5)
 
-cfg["papel"].setdefault("merma", 0.0)
-cfg["margen"].setdefault("margen", 0.0)
+def _en_cfg(path, d=None):
+    d = cfg if d is None else d
+    for k in path:
+        d = d.get(k) if isinstance(d, dict) else None
+    return d
 
-# -------------------------------------------------
-# Migraciones legacy
-# -------------------------------------------------
-if "cobertura_op" not in cfg["impresion"] and "cobertura" in cfg["impresion"]:
-    cfg["impresion"]["cobertura_op"] = cfg["impresion"]["cobertura"]
 
-if "tinta_cmyk_base" not in cfg["impresion"] and "tinta" in cfg["impresion"]:
-    cfg["impresion"]["tinta_cmyk_base"] = cfg["impresion"]["tinta"]
+def cfg_number(path, label, key, factor=1.0, default=0.0, **kwargs):
+    """number_input ligado a cfg[path] (muestra valor * factor); el cambio se registra en on_change."""
+    _widgets_registrados().add(key)
+
+    def _on_change():
+        t = st.session_state.get("cfg_tracker")
+        if t is not None:
+            t.set(path, float(st.session_state[key]) / factor)
+
+    valor = _en_cfg(path)
+    return st.number_input(
+        label,
+        value=float(default if valor is None else valor) * factor,
+        key=key,
+        on_change=_on_change,
+        **kwargs,
+    )
+
 
-if "click_base" not in cfg["impresion"] and "click" in cfg["impresion"]:
-    cfg["impresion"]["click_base"] = cfg["impresion"]["click"]
+def cfg_editor(path, columnas, normalizar, key, **kwargs):
+    """data_editor sobre la lista cfg[path] de la revisión base; on_change registra la lista resultante."""
+    _widgets_registrados().add(key)
+    base = [p for p in (_en_cfg(path, cfg_original) or []) if isinstance(p, dict)]
+
+    def _on_change():
+        t = st.session_state.get("cfg_tracker")
+        if t is not None:
+            t.set_list(path, apply_editor_delta(base, st.session_state.get(key), normalizar))
+
+    return st.data_editor(
+        [{c: p.get(c) for c in columnas} for p in base],
+        key=key,
+        on_change=_on_change,
+        **kwargs,
+    )
+
+
+conflicto = st.session_state.get("cfg_conflicto")
+if conflicto:
+    st.error(
+        f"{conflicto} Otra persona guardó la configuración; no se guardó nada para no pisar sus cambios."
+    )
+    st.button("🔄 Descartar mis cambios y recargar", key="cfg_reload_btn", on_click=descartar_y_recargar)
 
 # -------------------------------------------------
 # UI: Impresión
 # -------------------------------------------------
 st.subheader("Impresión (por Carta – 1 lado)")
 
-cfg["impresion"]["mo_dep"] = st.number_input(
+cfg_number(
+    ("impresion", "mo_dep"),
     "MO + Depreciación",
+    key="cfg_imp_mo_dep",
     min_value=0.0,
-    value=float(cfg["impresion"].get("mo_dep", 0.0)),
     step=0.01,
     format="%.4f",
-    key="cfg_imp_mo_dep",
 )
 
-cfg["impresion"]["tinta_cmyk_base"] = st.number_input(
+cfg_number(
+    ("impresion", "tinta_cmyk_base"),
     "Tinta (base CMYK @ cobertura base)",
+    key="cfg_imp_tinta_cmyk_base",
     min_value=0.0,
-    value=float(cfg["impresion"].get("tinta_cmyk_base", 0.0)),
     step=0.01,
     format="%.4f",
-    key="cfg_imp_tinta_cmyk_base",
 )
 
-cfg["impresion"]["click_base"] = st.number_input(
+cfg_number(
+    ("impresion", "click_base"),
     "Click servicio (base @ cobertura base)",
+    key="cfg_imp_click_base",
     min_value=0.0,
-    value=float(cfg["impresion"].get("click_base", 0.0)),
     step=0.01,
     format="%.4f",
-    key="cfg_imp_click_base",
 )
 
-cfg["impresion"]["cobertura_op"] = st.number_input(
+cfg_number(
+    ("impresion", "cobertura_op"),
     "Cobertura operativa (costo fijo por carta-lado)",
+    key="cfg_imp_cobertura_op",
     min_value=0.0,
-    value=float(cfg["impresion"].get("cobertura_op", 0.0)),
     step=0.01,
     format="%.4f",
-    key="cfg_imp_cobertura_op",
 )
 
 st.divider()
 
 st.subheader("Cobertura de tinta (%)")
 
-cfg["impresion"]["cobertura_tinta_base_pct"] = st.number_input(
+cfg_number(
+    ("impresion", "cobertura_tinta_base_pct"),
     "Cobertura base real (%)",
+    key="cfg_imp_cobertura_tinta_base_pct",
+    default=7.5,
     min_value=0.1,
-    value=float(cfg["impresion"].get("cobertura_tinta_base_pct", 7.5)),
     step=0.1,
     format="%.2f",
     help="Porcentaje real promedio con el que están calibrados tinta_cmyk_base y click_base (ej. 7.5%).",
-    key="cfg_imp_cobertura_tinta_base_pct",
 )
 
 st.divider()
@@ -220,54 +235,147 @@ st.divider()
 # -------------------------------------------------
 st.subheader("Papel")
 
-legacy_costo = float(cfg["papel"].get("costo_kg", 0.0) or 0.0)
-cfg["papel"].setdefault("cuche_costo_kg", legacy_costo)
-cfg["papel"].setdefault("bond_costo_kg", legacy_costo)
-cfg["papel"].setdefault("especial_costo_kg", legacy_costo)
 
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    cfg["papel"]["cuche_costo_kg"] = st.number_input(
+    cfg_number(
+        ("papel", "cuche_costo_kg"),
         "Couché ($/kg)",
+        key="cfg_papel_cuche_costo_kg",
         min_value=0.0,
-        value=float(cfg["papel"].get("cuche_costo_kg", 0.0)),
         step=0.5,
         format="%.2f",
-        key="cfg_papel_cuche_costo_kg",
     )
 
 with col2:
-    cfg["papel"]["bond_costo_kg"] = st.number_input(
+    cfg_number(
+        ("papel", "bond_costo_kg"),
         "Bond ($/kg)",
+        key="cfg_papel_bond_costo_kg",
         min_value=0.0,
-        value=float(cfg["papel"].get("bond_costo_kg", 0.0)),
         step=0.5,
         format="%.2f",
-        key="cfg_papel_bond_costo_kg",
     )
 
 with col3:
-    cfg["papel"]["especial_costo_kg"] = st.number_input(
+    cfg_number(
+        ("papel", "especial_costo_kg"),
         "Especial ($/kg)",
+        key="cfg_papel_especial_costo_kg",
         min_value=0.0,
-        value=float(cfg["papel"].get("especial_costo_kg", 0.0)),
         step=0.5,
         format="%.2f",
-        key="cfg_papel_especial_costo_kg",
     )
 
 st.divider()
 
-merma_pct = st.number_input(
+cfg_number(
+    ("papel", "merma"),
     "Merma papel (%)",
+    key="cfg_papel_merma_pct",
+    factor=100.0,
     min_value=0.0,
-    value=float(cfg["papel"].get("merma", 0.0) * 100.0),
     step=0.5,
     format="%.1f",
-    key="cfg_papel_merma_pct",
 )
-cfg["papel"]["merma"] = float(merma_pct) / 100.0
+
+st.divider()
+
+# -------------------------------------------------
+# UI: Pliegos (catálogo de hojas para el optimizador del Cotizador)
+# -------------------------------------------------
+st.subheader("Hojas de impresión (catálogo)")
+st.caption("El Cotizador evalúa las hojas activas (en ambas orientaciones) y sugiere la más barata. Medidas en cm.")
+
+PLIEGO_COLS = ["key", "display_name", "hoja_w", "hoja_h", "area_w", "area_h", "activo"]
+
+
+def normalizar_pliego(r: dict):
+    if not (str(r.get("display_name") or "").strip() or r.get("hoja_w")):
+        return None
+    return {
+        "key": canonical_key(str(r.get("key") or r.get("display_name") or "")),
+        "display_name": str(r.get("display_name") or "").strip(),
+        "hoja_w": float(r.get("hoja_w") or 0.0),
+        "hoja_h": float(r.get("hoja_h") or 0.0),
+        "area_w": float(r.get("area_w") or 0.0),
+        "area_h": float(r.get("area_h") or 0.0),
+        "activo": bool(r.get("activo", True)),
+    }
+
+
+cfg_editor(
+    ("pliegos",),
+    PLIEGO_COLS,
+    normalizar_pliego,
+    key="cfg_pliegos_editor",
+    num_rows="dynamic",
+    use_container_width=True,
+    hide_index=True,
+    column_config={
+        "key": st.column_config.TextColumn("Key", help="Se genera del nombre si la dejas vacía."),
+        "display_name": st.column_config.TextColumn("Nombre"),
+        "hoja_w": st.column_config.NumberColumn("Hoja ancho", min_value=0.0, step=0.1),
+        "hoja_h": st.column_config.NumberColumn("Hoja alto", min_value=0.0, step=0.1),
+        "area_w": st.column_config.NumberColumn("Huella ancho", min_value=0.0, step=0.1),
+        "area_h": st.column_config.NumberColumn("Huella alto", min_value=0.0, step=0.1),
+        "activo": st.column_config.CheckboxColumn("Activo", default=True),
+    },
+)
+
+st.divider()
+
+# -------------------------------------------------
+# UI: Papeles (catálogo de stock)
+# -------------------------------------------------
+st.subheader("Papeles (catálogo)")
+st.caption(
+    "Papeles que el Cotizador puede buscar por tipo / gramaje / marca. Precio por kg, "
+    "o por hoja de compra (costo hoja + medida en cm). Sin catálogo se usan los tipos genéricos de arriba."
+)
+
+PAPEL_COLS = ["key", "tipo", "marca", "gramaje", "hoja_w", "hoja_h", "costo_kg", "costo_hoja", "en_stock"]
+
+
+def normalizar_papel(r: dict):
+    if not str(r.get("tipo") or "").strip():
+        return None
+    return {
+        "key": canonical_key(str(
+            r.get("key") or f"{r.get('tipo') or ''} {r.get('marca') or ''} {float(r.get('gramaje') or 0.0):g}"
+        )),
+        "tipo": str(r.get("tipo") or "").strip(),
+        "marca": str(r.get("marca") or "").strip(),
+        "gramaje": float(r.get("gramaje") or 0.0),
+        "hoja_w": float(r.get("hoja_w") or 0.0),
+        "hoja_h": float(r.get("hoja_h") or 0.0),
+        "costo_kg": float(r.get("costo_kg") or 0.0),
+        "costo_hoja": float(r.get("costo_hoja") or 0.0),
+        "en_stock": bool(r.get("en_stock", True)),
+    }
+
+
+cfg_editor(
+    ("papeles",),
+    PAPEL_COLS,
+    normalizar_papel,
+    key="cfg_papeles_editor",
+    num_rows="dynamic",
+    use_container_width=True,
+    hide_index=True,
+    column_config={
+        "key": st.column_config.TextColumn("Key", help="Se genera de tipo + marca + gramaje si la dejas vacía."),
+        "tipo": st.column_config.TextColumn("Tipo"),
+        "marca": st.column_config.TextColumn("Marca"),
+        "gramaje": st.column_config.NumberColumn("g/m²", min_value=0.0, step=1.0),
+        "hoja_w": st.column_config.NumberColumn("Hoja ancho", min_value=0.0, step=0.1),
+        "hoja_h": st.column_config.NumberColumn("Hoja alto", min_value=0.0, step=0.1),
+        "costo_kg": st.column_config.NumberColumn("$/kg", min_value=0.0, step=0.5),
+        "costo_hoja": st.column_config.NumberColumn("$/hoja", min_value=0.0, step=0.01),
+        "en_stock": st.column_config.CheckboxColumn("En stock", default=True),
+    },
+)
 
 st.divider()
 
@@ -304,58 +412,19 @@ ROUNDING_OPTIONS = {
     "Por millar (ceil(qty/1000))": "ceil_1000",
 }
 
-# Normaliza estructura interna (por si vienen acabados viejos incompletos)
-for f in cfg["acabados"]:
-    if isinstance(f, dict):
-        f.setdefault("display_name", "")    
-        f.setdefault("key", canonical_key(f.get("display_name", "")))
-        f.setdefault("basis", "sheet_m2_total")
-        f.setdefault("calc_type", "min_or_unit")
-        f.setdefault("rate", 0.0)
-        f.setdefault("minimum", 0.0)
-        f.setdefault("setup", 0.0)
-        f.setdefault("qty_rounding", "none")
-        f.setdefault("allow_partial", False)
-        f.setdefault("requires", [])
-
-def _norm_name(s: str) -> str:
-    """Normaliza para comparar nombres: sin acentos, casefold, espacios colapsados."""
-    s = (s or "").strip()
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.casefold()
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-def find_finish_by_name_insensitive(name: str):
-    """Busca por nombre ignorando mayúsculas/acentos/espacios. Retorna (idx, obj) o (None, None)."""
-    target = _norm_name(name)
-    for i, f in enumerate(cfg["acabados"]):
-        if isinstance(f, dict) and _norm_name(f.get("display_name", "")) == target:
-            return i, f
-    return None, None
-
-def find_finish_by_display_name_exact(display_name: str):
-    for i, f in enumerate(cfg["acabados"]):
-        if isinstance(f, dict) and f.get("display_name", "") == display_name:
-            return i, f
-    return None, None
-
-def find_finish_by_key(k: str):
-    """Busca por key exacta. Retorna (idx, obj) o (None, None)."""
-    k = (k or "").strip()
-    if not k:
-        return None, None
-    for i, f in enumerate(cfg["acabados"]):
-        if isinstance(f, dict) and f.get("key") == k:
-            return i, f
-    return None, None
-
-existing_names = sorted([
-    f.get("display_name", "")
-    for f in cfg["acabados"]
-    if isinstance(f, dict) and f.get("display_name", "").strip()
-])
+# Los acabados ya vienen normalizados (config_store._normalize_acabados_catalog).
+# Índices por key / nombre sobre la lista de trabajo del tracker: se arman una
+# vez por tracker (sesión) y alta / edición / baja los ajustan en su lugar; cada
+# cambio se registra en el tracker por key
+acabados_trabajo = tracker.edit_list(("acabados",))
+catalogo = st.session_state.get("cfg_catalogo")
+if catalogo is None or catalogo.items is not acabados_trabajo:
+    catalogo = FinishCatalog(acabados_trabajo)
+    st.session_state["cfg_catalogo"] = catalogo
+find_finish_by_name_insensitive = catalogo.find_by_name_insensitive
+find_finish_by_display_name_exact = catalogo.find_by_display_name
+find_finish_by_key = catalogo.find_by_key
+existing_names = catalogo.display_names()
 
 selected_name = st.selectbox(
     "Selecciona un acabado para editar",
@@ -569,11 +638,11 @@ with st.expander("Editar / crear acabado", expanded=True):
 
                 up_idx, up_obj = find_finish_by_key(key_auto)
                 if up_idx is None:
-                    cfg["acabados"].append(new_obj)
-                    save_config(cfg)
-
-                    st.session_state["cfg_flash_type"] = "success"
-                    st.session_state["cfg_flash_msg"] = "Acabado nuevo guardado ✅"
+                    catalogo.add(new_obj)
+                    tracker.record_item(("acabados",), key_auto, new_obj)
+                    if guardar_config(cfg):
+                        st.session_state["cfg_flash_type"] = "success"
+                        st.session_state["cfg_flash_msg"] = "Acabado nuevo guardado ✅"
                 else:
                     st.session_state["cfg_flash_type"] = "error"
                     st.session_state["cfg_flash_msg"] = "Ya existe un acabado con esa key. Cambia el nombre para generar otra key."
@@ -594,23 +663,24 @@ with st.expander("Editar / crear acabado", expanded=True):
                 else:
                     # Conserva la key original SIEMPRE
                     new_obj["key"] = up_obj.get("key", edit_key)
-                    cfg["acabados"][up_idx] = new_obj
-                    save_config(cfg)
-
-                    st.session_state["cfg_flash_type"] = "success"
-                    st.session_state["cfg_flash_msg"] = (
-                        f"Modificación aplicada ✅ Se actualizó el acabado: "
-                        f"{new_obj.get('display_name','')}"
-                    )
+                    catalogo.update(up_idx, new_obj)
+                    tracker.record_item(("acabados",), new_obj["key"], new_obj)
+                    if guardar_config(cfg):
+                        st.session_state["cfg_flash_type"] = "success"
+                        st.session_state["cfg_flash_msg"] = (
+                            f"Modificación aplicada ✅ Se actualizó el acabado: "
+                            f"{new_obj.get('display_name','')}"
+                        )
 
             st.rerun()
 
     with b2:
         if st.button("🗑️ Eliminar acabado", disabled=is_new, key="cfg_acab_delete"):
             if edit_idx is not None:
-                cfg["acabados"].pop(edit_idx)
-                save_config(cfg)
-                st.success("Acabado eliminado ✅")
+                catalogo.delete(edit_idx)
+                tracker.record_item(("acabados",), edit_obj.get("key", ""), None)
+                if guardar_config(cfg):
+                    st.success("Acabado eliminado ✅")
                 st.rerun()
 
 if not cfg["acabados"]:
@@ -623,6 +693,87 @@ else:
                 f"base={f.get('basis')} · cobro={f.get('calc_type')} · "
                 f"rate=${float(f.get('rate',0.0)):.4f} · arranque=${float(f.get('setup',0.0)):.2f} · mínimo=${float(f.get('minimum',0.0)):.2f}"
             )
+
+def catalogo_compilado():
+    """
+    Acabados compilados de la copia de trabajo. Sin ediciones pendientes la
+    lista es la de la config vigente y se reusa lo ya compilado para su revisión.
+    """
+    if cfg.get("acabados") is cfg_original.get("acabados"):
+        return params_from_config(cfg_original).catalog
+    return compile_catalog(cfg["acabados"])
+
+
+# -------------------------------------------------
+# Acabados en bloque (CSV / Excel)
+# -------------------------------------------------
+with st.expander("Importar / exportar acabados (CSV / Excel)", expanded=False):
+    st.caption(
+        f"Columnas: {', '.join(FINISH_COLUMNS)}. Se actualiza por **key** "
+        "(si viene vacía se genera del nombre); las keys nuevas se agregan."
+    )
+
+    exp_fmt = st.radio("Formato", ["CSV", "Excel"], horizontal=True, key="cfg_acab_export_fmt")
+    # El archivo se arma una vez por versión del catálogo, no en cada rerun
+    exp_id = (catalogo_compilado().version, exp_fmt)
+    exp_cache = st.session_state.get("cfg_acab_export")
+    if not exp_cache or exp_cache[0] != exp_id:
+        data = export_finishes_csv(cfg["acabados"]) if exp_fmt == "CSV" else export_finishes_xlsx(cfg["acabados"])
+        exp_cache = (exp_id, data)
+        st.session_state["cfg_acab_export"] = exp_cache
+    st.download_button(
+        "⬇️ Descargar acabados",
+        data=exp_cache[1],
+        file_name="acabados.csv" if exp_fmt == "CSV" else "acabados.xlsx",
+        mime="text/csv" if exp_fmt == "CSV" else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key="cfg_acab_export_btn",
+    )
+
+    # Cambiar la key del uploader lo vacía después de aplicar
+    imp_n = st.session_state.get("cfg_acab_import_n", 0)
+    up_acab = st.file_uploader(
+        "⬆️ Importar acabados",
+        type=["csv", "xlsx"],
+        key=f"cfg_acab_import_uploader_{imp_n}",
+    )
+    if up_acab is not None:
+        imp_cache = st.session_state.get("cfg_acab_import")
+        if not imp_cache or imp_cache[0] != up_acab.file_id:
+            imp_cache = (up_acab.file_id, read_finishes(up_acab.name, up_acab.getvalue()))
+            st.session_state["cfg_acab_import"] = imp_cache
+        reporte = imp_cache[1]
+
+        st.write(
+            f"{reporte.rows} filas leídas · **{len(reporte.finishes)} válidas** · "
+            f"{reporte.error_count} con error"
+        )
+        if reporte.errors:
+            st.dataframe(
+                [{"fila": n, "error": msg} for n, msg in reporte.errors],
+                hide_index=True,
+                use_container_width=True,
+            )
+            if reporte.error_count > len(reporte.errors):
+                st.caption(f"Mostrando {len(reporte.errors)} de {reporte.error_count} errores.")
+
+        if st.button(
+            f"✅ Aplicar {len(reporte.finishes)} acabados válidos",
+            disabled=not reporte.finishes,
+            key="cfg_acab_import_apply",
+        ):
+            altas, cambios_imp, rechazos = upsert_finishes(catalogo, reporte.finishes)
+            tracker.set_list(("acabados",), catalogo.items)
+            if guardar_config(cfg):
+                msg = f"Importación aplicada ✅ {altas} nuevos · {cambios_imp} actualizados"
+                if rechazos:
+                    filas = ", ".join(str(n) for n, _ in rechazos[:20])
+                    msg += f" · {len(rechazos)} rechazados por nombre repetido (filas {filas})"
+                st.session_state["cfg_flash_type"] = "success"
+                st.session_state["cfg_flash_msg"] = msg
+            st.session_state.pop("cfg_acab_import", None)
+            st.session_state["cfg_acab_import_n"] = imp_n + 1
+            st.rerun()
+
 # -------------------------------------------------
 # Simulador de cálculo (para validar acabados)
 # -------------------------------------------------
@@ -663,7 +814,7 @@ with st.expander("Simulador de acabados (Avanzado)", expanded=False):
     cU1, cU2 = st.columns(2)
     with cU1:
         sim_coverage = st.slider(
-            "Cobertura (si allow_partial)",
+            "Cobertura (acabados por m²)",
             0, 100, 100,
             key="sim_cov"
         ) / 100.0
@@ -676,28 +827,17 @@ with st.expander("Simulador de acabados (Avanzado)", expanded=False):
 
     if cfg.get("acabados"):
         st.write("**Resultados por acabado:**")
-        for f in sorted(cfg["acabados"], key=lambda x: str(x.get("display_name",""))):
-            if not isinstance(f, dict):
-                continue
-
-            user_inputs = {}
-
-            # allow_partial solo aplica si basis es m²
-            if f.get("allow_partial", False) and f.get("basis") == "sheet_m2_total":
-                user_inputs["coverage"] = float(sim_coverage)
-
-            # requires folds
-            req = f.get("requires", []) or []
-            if "folds_per_sheet" in req and f.get("basis") == "sheets_total":
-                user_inputs["folds_per_sheet"] = float(sim_folds)
-
-            out = compute_finish_cost(f, sim_metrics, user_inputs)
-
+        # Mismo evaluador que el Cotizador; todo el catálogo en una sola pasada
+        sim_catalog = catalogo_compilado()
+        sim_out = sim_catalog.evaluate_all(sim_metrics, coverage=sim_coverage, folds_per_sheet=sim_folds)
+        order = sorted(range(len(sim_catalog)), key=lambda i: sim_catalog.evaluators[i].display_name)
+        for i in order:
+            ev = sim_catalog.evaluators[i]
             st.write(
-                f"- **{f.get('display_name','(sin nombre)')}** "
-                f"| basis={out['basis']} | qty={out['qty_used']:,.3f} "
-                f"| rate=${out['rate']:,.4f} | setup=${out['setup']:,.2f} | min=${out['minimum']:,.2f} "
-                f"→ **total=${out['total']:,.2f}**"
+                f"- **{ev.display_name or '(sin nombre)'}** "
+                f"| basis={ev.basis} | qty={float(sim_out['qty_used'][i]):,.3f} "
+                f"| rate=${ev.rate:,.4f} | setup=${ev.setup:,.2f} | min=${ev.minimum:,.2f} "
+                f"→ **total=${float(sim_out['total'][i]):,.2f}**"
             )
     else:
         st.info("Aún no hay acabados en el catálogo.")
@@ -709,13 +849,13 @@ with st.expander("Simulador de acabados (Avanzado)", expanded=False):
 # -------------------------------------------------
 st.subheader("Margen")
 
-cfg["margen"]["margen"] = st.number_input(
+cfg_number(
+    ("margen", "margen"),
     "Margen (0.40 = 40%)",
+    key="cfg_margen_value",
     min_value=0.0,
-    value=float(cfg["margen"].get("margen", 0.0)),
     step=0.01,
     format="%.2f",
-    key="cfg_margen_value",
 )
 
 st.divider()
@@ -753,8 +893,9 @@ with st.expander("Respaldo de configuración (Admin)", expanded=False):
                 imported = json.loads(up.read().decode("utf-8"))
                 if not isinstance(imported, dict):
                     raise ValueError("JSON inválido")
-                save_config(imported)
-                st.success("Configuración importada y guardada ✅")
+                save_config(imported, saved_by=user.username)  # importar reemplaza todo: sin control de revisión
+                # también suelta el archivo del uploader (si no, se re-importaría en cada rerun)
+                descartar_y_recargar()
                 st.rerun()
             except Exception as e:
                 st.error(f"No se pudo importar: {e}")
@@ -762,35 +903,23 @@ with st.expander("Respaldo de configuración (Admin)", expanded=False):
 # -------------------------------------------------
 # Diffs + confirmaciones + guardado
 # -------------------------------------------------
-def _changed(a, b, tol=1e-9):
-    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
-        return abs(float(a) - float(b)) > tol
-    return a != b
-
-def diff_any(old, new, prefix=""):
-    cambios = []
-    if isinstance(old, dict) and isinstance(new, dict):
-        keys = set(old.keys()) | set(new.keys())
-        for k in sorted(keys):
-            cambios += diff_any(old.get(k, None), new.get(k, None), prefix + f"{k}.")
-        return cambios
-
-    if isinstance(old, list) and isinstance(new, list):
-        if len(old) != len(new):
-            cambios.append((prefix[:-1], old, new))
-        else:
-            for i, (ov, nv) in enumerate(zip(old, new)):
-                cambios += diff_any(ov, nv, prefix + f"[{i}].")
-        return cambios
-
-    if _changed(old, new):
-        cambios.append((prefix[:-1], old, new))
-    return cambios
-
-cambios = diff_any(cfg_original, cfg)
+def _valor(v):
+    # altas / bajas de catálogo: basta con el nombre
+    if v is None:
+        return "—"
+    if isinstance(v, dict) and "display_name" in v:
+        return v.get("display_name") or v.get("key", "")
+    return v
+
+# Los cambios se registraron en los on_change de cada widget (tracker de la
+# sesión): aquí solo se leen, O(cambios)
+cambios = tracker.changes()
 hay_cambios = len(cambios) > 0
 
-firma_cambios = tuple((p, str(ov), str(nv)) for p, ov, nv in cambios)
+if not hay_cambios:
+    st.session_state.pop("cfg_conflicto", None)
+
+firma_cambios = tracker.signature()
 if st.session_state.get("cfg_firma_cambios") != firma_cambios:
     st.session_state["cfg_firma_cambios"] = firma_cambios
     st.session_state["cfg_confirm_general"] = False
@@ -806,7 +935,7 @@ if not hay_cambios:
 else:
     max_mostrar = 25
     for path, ov, nv in cambios[:max_mostrar]:
-        st.write(f"- **{path}**: {ov} → {nv}")
+        st.write(f"- **{path}**: {_valor(ov)} → {_valor(nv)}")
     if len(cambios) > max_mostrar:
         st.caption(f"Mostrando {max_mostrar} de {len(cambios)} cambios.")
 
@@ -817,7 +946,7 @@ confirm_general = st.checkbox(
 
 base_old = float(cfg_original.get("impresion", {}).get("cobertura_tinta_base_pct", 7.5))
 base_new = float(cfg.get("impresion", {}).get("cobertura_tinta_base_pct", 7.5))
-cambio_base = _changed(base_old, base_new)
+cambio_base = changed(base_old, base_new)
 
 confirm_base = True
 if cambio_base:
@@ -838,19 +967,74 @@ c1, c2, c3 = st.columns(3)
 
 with c1:
     if st.button("💾 Guardar configuración", disabled=(not puede_guardar), key="cfg_save_btn"):
-        save_config(cfg)
-        st.success("Configuración guardada ✅")
-        st.session_state["cfg_confirm_general"] = False
-        st.session_state["cfg_confirm_base"] = False
+        if guardar_config(cfg):
+            st.success("Configuración guardada ✅")
+        # las confirmaciones se limpian solas al cambiar la firma de cambios
         st.rerun()
 
 with c2:
     if st.button("↩️ Restablecer defaults", key="cfg_reset_btn"):
-        reset_config()
-        st.success("Restablecida ✅")
-        st.session_state["cfg_confirm_general"] = False
-        st.session_state["cfg_confirm_base"] = False
+        reset_config(saved_by=user.username)
+        descartar_y_recargar()
         st.rerun()
 
 with c3:
     st.info("Tip: guarda después de cambios grandes.")
+
+# -------------------------------------------------
+# Historial de versiones (comparar / restaurar)
+# -------------------------------------------------
+HIST_POR_PAGINA = 50
+
+
+def restaurar_version(n: int, revision_vigente: int):
+    try:
+        restore_version(n, expected_revision=revision_vigente, saved_by=user.username)
+    except ConfigConflictError as e:
+        st.session_state["cfg_conflicto"] = str(e)
+        return
+    # los widgets deben mostrar la versión restaurada, no lo que tenían capturado
+    descartar_y_recargar()
+    st.session_state["cfg_flash_type"] = "success"
+    st.session_state["cfg_flash_msg"] = f"Versión #{n} restaurada ✅"
+
+
+st.divider()
+with st.expander("Historial de versiones", expanded=False):
+    total_versiones = history_count()
+    if not total_versiones:
+        st.info("Aún no hay versiones en el historial (se registran al guardar).")
+    else:
+        paginas = (total_versiones + HIST_POR_PAGINA - 1) // HIST_POR_PAGINA
+        pagina = 1
+        if paginas > 1:
+            pagina = int(st.number_input("Página", min_value=1, max_value=paginas, value=1, step=1, key="cfg_hist_pagina"))
+        versiones = list_versions(limit=HIST_POR_PAGINA, before=total_versiones - (pagina - 1) * HIST_POR_PAGINA)
+
+        def _etiqueta(v):
+            fecha = datetime.fromtimestamp(v["saved_at"]).strftime("%Y-%m-%d %H:%M") if v["saved_at"] else "previa al historial"
+            quien = f" · {v['saved_by']}" if v["saved_by"] else ""
+            return f"#{v['n']} · rev {v['revision']} · {fecha}{quien}"
+
+        etiquetas = {v["n"]: _etiqueta(v) for v in versiones}
+        pick_n = st.selectbox("Versión", options=list(etiquetas), format_func=etiquetas.get, key="cfg_hist_pick")
+        st.caption(f"{total_versiones} versiones en total.")
+
+        version_cfg = read_version(pick_n).get("config") or {}
+        cambios_version = [c for c in diff_values(cfg_original, version_cfg) if c[0] != REVISION_KEY]
+        if not cambios_version:
+            st.info("Igual a la configuración vigente.")
+        else:
+            st.write("**Vigente → esta versión**")
+            for path, ov, nv in cambios_version[:25]:
+                st.write(f"- **{path}**: {_valor(ov)} → {_valor(nv)}")
+            if len(cambios_version) > 25:
+                st.caption(f"Mostrando 25 de {len(cambios_version)} cambios.")
+
+        st.button(
+            "⏪ Restaurar esta versión",
+            disabled=not cambios_version,
+            key="cfg_hist_restore",
+            on_click=restaurar_version,
+            args=(pick_n, config_revision(cfg_original)),
+        )
@@ -1,6 +1,6 @@
 import sys
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List
 
 import streamlit as st
 import pandas as pd
@@ -9,9 +9,16 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from lib.auth_users_yaml import require_login
+from lib.auth_users_yaml import require_login, list_usernames
 from lib.permissions import permissions_for, normalize_role
 from lib.supa import get_supabase
+from lib.snapshots import resolve_row_snapshot
+from lib.quote_codec import decode_quote_row
+from lib.quote_list import QuotePage, QuoteFilters, fetch_page
+from lib.quote_search import SEARCH_RPC, SupabaseQuoteSearch, search_terms
+from lib.quote_mirror import QuoteMirror
+from lib.quote_details import get_quote_detail, get_quote_details
+from lib.quote_outbox import get_outbox
 from lib.excel_exporter import build_quote_excel_bytes
 from lib.pdf_exporter import build_quote_pdf_bytes
 from lib.ui import inject_global_css, render_header, hr, section_open, section_close
@@ -51,6 +58,7 @@ SAFE_INPUT_KEYS_FOR_VENDEDOR = {
     "bleed_cm",
     "gutter_cm",
     "allow_rotate",
+    "allow_mixed",
     "piezas_por_lado",
     "orientacion",
     "tipo_papel",
@@ -70,6 +78,7 @@ def sanitize_row_for_vendedor(row: Dict[str, Any]) -> Dict[str, Any]:
     """
     out = dict(row or {})
     out.pop("config_snapshot", None)
+    out.pop("config_hash", None)
 
     # breakdown fuera
     out["breakdown"] = {}
@@ -91,41 +100,26 @@ def money(x):
 # -----------------------------
 # Fetchers
 # -----------------------------
-def fetch_quotes(limit: int = 200, only_mine: bool = False):
-    # NOTA: tu tabla parece traer quote_number; si no existe, igual funciona sin ese campo.
-    cols = "quote_code, created_at, created_by, created_role, customer_name, price_unit, price_total, currency, quote_number"
-    q = sb.table("quotes").select(cols)
+from postgrest.exceptions import APIError
 
-    # Orden: si existe quote_number úsalo; si no, usa created_at
+def fetch_quote_details(quote_codes: List[str]) -> Dict[str, dict]:
     try:
-        q = q.order("quote_number", desc=True)
-    except Exception:
-        try:
-            q = q.order("created_at", desc=True)
-        except Exception:
-            pass
-
-    q = q.limit(limit)
-
-    if only_mine:
-        q = q.eq("created_by", username)
+        # una consulta in_() para todas las que no están en caché
+        return get_quote_details(sb, quote_codes)
+    except APIError as e:
+        st.error("Supabase rechazó la consulta de las cotizaciones a comparar.")
+        st.json(getattr(e, "message", None) or getattr(e, "args", None) or {"error": str(e)})
+        return {}
+    except Exception as e:
+        st.error("Error inesperado al traer las cotizaciones.")
+        st.exception(e)
+        return {}
 
-    res = q.execute()
-    return res.data or []
-
-from postgrest.exceptions import APIError
 
 def fetch_quote_detail(quote_code: str):
     try:
-        res = (
-            sb.table("quotes")
-            .select("*")
-            .eq("quote_code", quote_code)
-            .limit(1)
-            .execute()
-        )
-        data = getattr(res, "data", None) or []
-        return data[0] if data else None
+        # caché TTL compartido; reabrir una cotización no toca la red (lib/quote_details.py)
+        return get_quote_detail(sb, quote_code)
 
     except APIError as e:
         st.error("Supabase rechazó la consulta al abrir detalle.")
@@ -140,58 +134,141 @@ def fetch_quote_detail(quote_code: str):
         return None
 
 
+@st.cache_resource
+def get_quote_mirror():
+    # Un espejo por proceso, compartido entre sesiones (ver lib/quote_mirror.py)
+    return QuoteMirror()
+
+def _secret(section: str, key: str, default):
+    try:
+        return (st.secrets.get(section) or {}).get(key, default)
+    except Exception:
+        return default
+
+def synced_mirror():
+    """
+    El espejo local al día (delta desde Supabase), o None si está apagado
+    ([historial] mirror = false) o no se pudo sincronizar: entonces se consulta directo.
+    """
+    if not _secret("historial", "mirror", True):
+        return None
+    mirror = get_quote_mirror()
+    try:
+        if mirror.max_quote_number() is None:
+            with st.spinner("Preparando copia local del historial…"):
+                mirror.sync(sb, force=True)
+        else:
+            mirror.sync(sb)
+    except Exception as e:
+        st.warning(f"No se pudo actualizar la copia local; consultando Supabase directo. ({e})")
+        return None
+    return mirror
+
+def search_backend():
+    """
+    [search] backend = "sqlite" en secrets usa la FTS5 del espejo local (al día);
+    por omisión, o si el espejo está apagado / sin sincronizar, la RPC de Supabase.
+    """
+    if str(_secret("search", "backend", "supabase")) == "sqlite" and mirror is not None:
+        return mirror
+    return SupabaseQuoteSearch(sb)
+
+
 
 # -----------------------------
-# Filtros
+# Filtros (van en la consulta; ver lib/quote_list.py)
 # -----------------------------
+# Guardados que siguen en la bandeja local (lib/quote_outbox.py) aún no aparecen en la lista
+outbox = get_outbox()
+outbox.start(sb)
+_pendientes = outbox.pending_count()
+if _pendientes:
+    st.warning(f"{_pendientes} cotización(es) guardadas en este equipo aún no llegan a Supabase; aparecerán al sincronizarse.")
+_fallidas = outbox.failed_count()
+if _fallidas:
+    st.error(f"{_fallidas} cotización(es) guardadas en este equipo fueron rechazadas por Supabase (ver Cotizador).")
+
 st.subheader("Filtros")
 
-c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
+c1, c2, c3, c4 = st.columns([1, 1, 1, 1])
 
 with c1:
-    limit = st.number_input("Máximo a mostrar", min_value=20, max_value=1000, value=200, step=20)
+    search_text = st.text_input("Buscar por No. o ID", placeholder="154 o ID")
 
 with c2:
     only_mine_default = True if role == "vendedor" else False
     only_mine = st.checkbox("Solo mis cotizaciones", value=only_mine_default)
+    user_options = ["(Todos)"] + list_usernames()
+    search_user = st.selectbox(
+        "Filtrar por usuario", options=user_options, index=0, key="user_filter", disabled=only_mine
+    )
 
 with c3:
-    search_number = st.text_input("Buscar por No. de cotización", placeholder="00000")
+    search_customer = st.text_input("Cliente (contiene)", placeholder="Nombre del cliente")
 
-# -----------------------------
-# Lista
-# -----------------------------
-data = fetch_quotes(limit=int(limit), only_mine=only_mine)
-df = pd.DataFrame(data)
+with c4:
+    page_size = st.selectbox("Por página", options=[25, 50, 100, 200], index=1)
+
+d1, d2, d3 = st.columns([1, 1, 2])
+with d1:
+    date_from = st.date_input("Desde", value=None, format="YYYY-MM-DD")
+with d2:
+    date_to = st.date_input("Hasta", value=None, format="YYYY-MM-DD")
+with d3:
+    search_words = st.text_input(
+        "Buscar texto (cliente, notas, producto, papel)", placeholder="ej. couche volante juan"
+    )
 
-if df.empty:
-    st.info("Aún no hay cotizaciones guardadas.")
-    st.stop()
+if only_mine:
+    created_by = username
+else:
+    created_by = "" if search_user == "(Todos)" else search_user
+
+filters = QuoteFilters.from_search(
+    search_text,
+    created_by=created_by,
+    customer=search_customer,
+    date_from=date_from,
+    date_to=date_to,
+)
 
 # -----------------------------
-# Dropdown de usuarios (desde los datos)
+# Paginación por llave: pila de cursores (inicio de cada página visitada)
 # -----------------------------
-users = sorted([u for u in df.get("created_by", pd.Series([])).dropna().unique().tolist() if str(u).strip()])
-user_options = ["(Todos)"] + users
+page_sig = (filters, int(page_size))
+if st.session_state.get("hist_page_sig") != page_sig:
+    st.session_state["hist_page_sig"] = page_sig
+    st.session_state["hist_cursors"] = [None]
 
-with c4:
-    search_user = st.selectbox("Filtrar por usuario", options=user_options, index=0, key="user_filter")
+cursors = st.session_state["hist_cursors"]
 
-# -----------------------------
-# Filtros client-side
-# -----------------------------
-if search_number.strip():
-    try:
-        n = int(search_number.strip())
-        if "quote_number" in df.columns:
-            df = df[df["quote_number"] == n]
+ranked = bool(search_terms(search_words))
+mirror = synced_mirror()
+
+try:
+    if ranked:
+        # Búsqueda de texto: una página por relevancia (aplican todos los filtros)
+        page = QuotePage(rows=search_backend().search(search_words, filters, limit=int(page_size)), next_cursor=None)
+    else:
+        if mirror is not None:
+            page = mirror.fetch_page(filters, cursor=cursors[-1], page_size=int(page_size))
         else:
-            st.warning("Esta base no tiene quote_number; filtra por ID (quote_code).")
-    except ValueError:
-        st.warning("El No. de cotización debe ser un número (ej. 154).")
+            page = fetch_page(sb, filters, cursor=cursors[-1], page_size=int(page_size))
+except APIError as e:
+    st.error("Supabase rechazó la consulta de la lista.")
+    if ranked:
+        st.caption(f"¿Ya existe la función {SEARCH_RPC}? Ver lib/quote_search.py.")
+    st.json(getattr(e, "message", None) or getattr(e, "args", None) or {"error": str(e)})
+    st.stop()
+
+df = pd.DataFrame(page.rows).drop(columns=["rank"], errors="ignore")
 
-if search_user != "(Todos)" and "created_by" in df.columns:
-    df = df[df["created_by"] == search_user]
+if df.empty:
+    if filters == QuoteFilters() and len(cursors) == 1 and not ranked:
+        st.info("Aún no hay cotizaciones guardadas.")
+    else:
+        st.info("Sin cotizaciones con esos filtros.")
+    st.stop()
 
 # -----------------------------
 # Formato para mostrar
@@ -212,7 +289,10 @@ if "price_total" in df_show.columns:
     df_show["price_total"] = df_show["price_total"].apply(money)
 
 st.subheader("Cotizaciones")
-st.caption("Tip: busca por No. (si existe) o filtra por usuario.")
+if ranked:
+    st.caption(f"{len(df)} coincidencias, de más a menos relevante")
+else:
+    st.caption(f"Página {len(cursors)} · {len(df)} cotizaciones")
 
 # Column config robusta (si faltan columnas, Streamlit ignora)
 st.dataframe(
@@ -232,13 +312,74 @@ st.dataframe(
     },
 )
 
+def _page_prev():
+    if len(st.session_state["hist_cursors"]) > 1:
+        st.session_state["hist_cursors"].pop()
+
+def _page_next(cursor):
+    st.session_state["hist_cursors"].append(cursor)
+
+n1, n2, _ = st.columns([1, 1, 4])
+n1.button("◀ Anteriores", on_click=_page_prev, disabled=ranked or len(cursors) <= 1, use_container_width=True)
+n2.button(
+    "Siguientes ▶",
+    on_click=_page_next,
+    args=(page.next_cursor,),
+    disabled=page.next_cursor is None,
+    use_container_width=True,
+)
+
+ids = df["quote_code"].astype(str).tolist() if "quote_code" in df.columns else []
+
+# -----------------------------
+# Comparar cotizaciones (solo datos comerciales: sirve para todos los roles)
+# -----------------------------
+def comparison_rows(codes: List[str]) -> tuple[list, int]:
+    """Filas de la tabla comparativa (datos comerciales) y cuántas no se encontraron."""
+    detalles = fetch_quote_details(codes)
+    filas = []
+    for code in codes:
+        r = detalles.get(code)
+        if not r:
+            continue
+        r = decode_quote_row(r)
+        inp = r.get("inputs") or {}
+        tiraje = inp.get("tiraje_piezas") if inp.get("tipo_producto") == "Extendido" else inp.get("tiraje_libros")
+        filas.append({
+            "ID": code,
+            "Cliente": r.get("customer_name") or "",
+            "Producto": inp.get("tipo_producto", ""),
+            "Medida (cm)": f"{inp.get('ancho_final_cm', '')} × {inp.get('alto_final_cm', '')}",
+            "Tiraje": tiraje,
+            "Tintas": inp.get("n_tintas"),
+            "Papel": f"{inp.get('tipo_papel', '')} {inp.get('papel_gramaje_gm2', '')}".strip(),
+            "Unitario": money(r.get("price_unit")),
+            "Total": money(r.get("price_total")),
+        })
+    return filas, len(codes) - len(filas)
+
+
+with st.expander("Comparar cotizaciones", expanded=False):
+    comparar = st.multiselect("Cotizaciones de esta página", options=ids, max_selections=10, key="hist_cmp_sel")
+    if st.button("Comparar", disabled=len(comparar) < 2, key="hist_cmp_btn"):
+        filas, faltan = comparison_rows(comparar)
+        st.session_state["hist_cmp_result"] = (tuple(comparar), filas, faltan)
+
+    # El resultado queda en sesión: sigue visible en los reruns mientras no cambie la selección
+    cmp_result = st.session_state.get("hist_cmp_result")
+    if cmp_result and cmp_result[0] == tuple(comparar):
+        _, filas, faltan = cmp_result
+        if faltan:
+            st.warning(f"{faltan} cotización(es) no se encontraron en la base.")
+        if filas:
+            st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+
 # -----------------------------
 # Abrir detalle
 # -----------------------------
 st.divider()
 st.subheader("Abrir cotización")
 
-ids = df["quote_code"].astype(str).tolist() if "quote_code" in df.columns else []
 if not ids:
     st.info("No hay IDs disponibles.")
     st.stop()
@@ -254,6 +395,9 @@ if not row:
     st.error("No se encontró esa cotización en la base.")
     st.stop()
 
+# inputs/breakdown compactos (v2) -> forma completa; filas viejas pasan tal cual
+row = decode_quote_row(row)
+
 st.success(f"Cotización: {row.get('quote_code')}")
 
 # -----------------------------
@@ -422,7 +566,8 @@ if not perms.can_view_costs:
 st.divider()
 st.subheader("Detalle técnico (Admin/Cotizador)")
 
-snapshot = row.get("config_snapshot") or {}
+# Filas viejas traen el snapshot embebido; las nuevas solo config_hash
+snapshot = resolve_row_snapshot(sb, row) or {}
 
 with st.expander("Inputs (lo que se capturó)", expanded=True):
     st.json(inputs)
@@ -0,0 +1,337 @@
+"""
+Benchmarks del motor de precios (lib/calc.py).
+
+Corre el código de cotización sobre corpus generados con semilla fija y reporta
+latencia por cotización (p50/p95/p99) y throughput. Los resultados se pueden
+guardar como baseline y comparar en corridas posteriores:
+
+  python scripts/bench_pricing.py                       # solo reporta
+  python scripts/bench_pricing.py --save main           # guarda benchmarks/main.json
+  python scripts/bench_pricing.py --compare main        # compara vs baseline (exit 1 si empeora)
+  python scripts/bench_pricing.py --only libros,acabados_pesados --n 2000
+
+Cada caso corre --repeat pasadas y se queda con la de menor p50.
+
+Corpus:
+  extendidos        volantes/tarjetas/pósters, tirajes comunes, 0-2 acabados
+  libros            interiores 16-600 páginas, tirajes cortos
+  acabados_pesados  catálogo de 2,000 acabados y 15-30 seleccionados por trabajo
+  tirajes_extremos  tirajes de 1 a 10,000,000 y medidas en los límites de la huella
+
+Casos:
+  price             price() completo por trabajo (caché de cubicación caliente)
+  price_cached      cached_price() con el caché de cotizaciones caliente
+  price_cold        price() limpiando el caché de cubicación antes de cada trabajo
+  piezas_por_lado   calc_piezas_por_lado() mixto, caché frío
+  finish_cost       evaluador compilado (PricingParams.catalog) por acabado seleccionado
+  ladder            price_ladder() con 8 tirajes × 2 lados × 2 tintas
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.calc import (
+    TIPO_EXTENDIDO, TIPO_LIBRO,
+    FinishSelection, QuoteInputs,
+    calc_piezas_por_lado, finish_user_inputs,
+    params_from_config, price, price_ladder,
+)
+from lib.config_store import DEFAULT_CONFIG, _normalize_acabados_catalog
+from lib.imposition import best_layout
+from lib.quote_cache import cached_price, quote_cache_clear
+
+BASELINE_DIR = ROOT / "benchmarks"
+SEED = 20240601
+
+BASES = ("sheet_m2_total", "sheets_total", "pieces_total")
+CALC_TYPES = ("unit", "min_or_unit", "setup_plus_unit", "setup_plus_min_or_unit")
+
+
+# -------------------------
+# Config / corpus sintéticos (deterministas)
+# -------------------------
+def make_config(n_finishes: int, rng: random.Random) -> dict:
+    cfg = json.loads(json.dumps(DEFAULT_CONFIG))
+    cfg["papel"]["merma"] = 0.08
+    cfg["acabados"] = _normalize_acabados_catalog([
+        {
+            "key": f"acab_{i:05d}",
+            "display_name": f"Acabado {i}",
+            "basis": rng.choice(BASES),
+            "calc_type": rng.choice(CALC_TYPES),
+            "rate": round(rng.uniform(0.01, 5.0), 4),
+            "minimum": rng.choice([0.0, 150.0, 400.0, 1400.0]),
+            "setup": rng.choice([0.0, 90.0, 250.0]),
+            "qty_rounding": rng.choice(["none", "none", "ceil_1000"]),
+            "allow_partial": False,
+            "requires": rng.choice([[], [], ["folds_per_sheet"]]),
+        }
+        for i in range(n_finishes)
+    ])
+    return cfg
+
+
+def _selections(cfg: dict, k: int, rng: random.Random) -> tuple:
+    keys = [f["key"] for f in cfg["acabados"]]
+    out = []
+    for key in rng.sample(keys, min(k, len(keys))):
+        out.append(FinishSelection(
+            finish_key=key,
+            coverage=rng.choice([None, 1.0, 0.5, 0.25]),
+            folds_per_sheet=rng.choice([None, 1.0, 2.0, 3.0]),
+        ))
+    return tuple(out)
+
+
+def corpus_extendidos(n: int, rng: random.Random, cfg: dict) -> list:
+    sizes = [(9, 5), (10, 15), (14, 21.5), (21.5, 28), (28, 43), (11.6, 17.8), (7, 7)]
+    return [
+        QuoteInputs(
+            tipo_producto=TIPO_EXTENDIDO,
+            ancho_final_cm=w + rng.choice([0, 0.5, -0.5]),
+            alto_final_cm=h,
+            piezas=rng.choice([100, 250, 500, 1000, 2000, 5000, 10000]),
+            lados=rng.choice([1, 2]),
+            n_tintas=rng.choice([4, 4, 1]),
+            allow_mixed=rng.random() < 0.5,
+            tipo_papel=rng.choice(["Couché", "Bond", "Especial"]),
+            papel_gramaje_gm2=rng.choice([90, 130, 150, 200, 300]),
+            acabados=_selections(cfg, rng.randint(0, 2), rng),
+            extras=(("Flete", 250.0),) if rng.random() < 0.2 else (),
+        )
+        for _ in range(n)
+        for (w, h) in [rng.choice(sizes)]
+    ]
+
+
+def corpus_libros(n: int, rng: random.Random, cfg: dict) -> list:
+    sizes = [(14, 21.5), (13.5, 21), (17, 23), (21.5, 28), (10, 15)]
+    return [
+        QuoteInputs(
+            tipo_producto=TIPO_LIBRO,
+            ancho_final_cm=w,
+            alto_final_cm=h,
+            piezas=rng.choice([1, 4, 10, 50, 200, 1000]),
+            lados=2,
+            paginas=rng.choice([16, 48, 120, 240, 456, 600]),
+            n_tintas=rng.choice([4, 1, 1]),
+            papel_gramaje_gm2=rng.choice([75, 90, 105]),
+            tipo_papel="Bond",
+            acabados=_selections(cfg, rng.randint(0, 3), rng),
+        )
+        for _ in range(n)
+        for (w, h) in [rng.choice(sizes)]
+    ]
+
+
+def corpus_acabados_pesados(n: int, rng: random.Random, cfg: dict) -> list:
+    base = corpus_extendidos(n, rng, cfg)
+    return [replace(q, acabados=_selections(cfg, rng.randint(15, 30), rng)) for q in base]
+
+
+def corpus_tirajes_extremos(n: int, rng: random.Random, cfg: dict) -> list:
+    out = []
+    for _ in range(n):
+        w = rng.choice([1.0, 2.5, 23.4, 46.8, rng.uniform(1, 47)])
+        h = rng.choice([1.0, 3.0, 15.9, 31.8, rng.uniform(1, 32)])
+        out.append(QuoteInputs(
+            tipo_producto=TIPO_EXTENDIDO,
+            ancho_final_cm=round(w, 2),
+            alto_final_cm=round(h, 2),
+            piezas=rng.choice([1, 2, 3, 999_999, 1_000_000, 10_000_000]),
+            lados=rng.choice([1, 2]),
+            bleed_cm=rng.choice([0.0, 0.3]),
+            gutter_cm=rng.choice([0.0, 0.2, 1.0]),
+            allow_mixed=True,
+            acabados=_selections(cfg, rng.randint(0, 4), rng),
+        ))
+    return out
+
+
+CORPORA = {
+    "extendidos": (corpus_extendidos, 50),
+    "libros": (corpus_libros, 50),
+    "acabados_pesados": (corpus_acabados_pesados, 2000),
+    "tirajes_extremos": (corpus_tirajes_extremos, 50),
+}
+
+
+# -------------------------
+# Medición
+# -------------------------
+def _stats(samples_ns: list[int], n_ops: int, total_s: float) -> dict:
+    s = sorted(samples_ns)
+    q = statistics.quantiles(s, n=100) if len(s) >= 2 else [s[0]] * 99
+    return {
+        "n": n_ops,
+        "p50_us": q[49] / 1000.0,
+        "p95_us": q[94] / 1000.0,
+        "p99_us": q[98] / 1000.0,
+        "mean_us": statistics.fmean(s) / 1000.0,
+        "ops_per_s": (n_ops / total_s) if total_s > 0 else 0.0,
+    }
+
+
+def _timeit(fn, items, before=None, repeat: int = 1) -> dict:
+    """Mejor de `repeat` pasadas (menor p50): reduce el ruido de la máquina entre corridas."""
+    best = None
+    clock = time.perf_counter_ns
+    for _ in range(max(repeat, 1)):
+        samples = []
+        t0 = time.perf_counter()
+        for it in items:
+            if before is not None:
+                before()
+            a = clock()
+            fn(it)
+            samples.append(clock() - a)
+        st = _stats(samples, len(samples), time.perf_counter() - t0)
+        if best is None or st["p50_us"] < best["p50_us"]:
+            best = st
+    return best
+
+
+def run_corpus(name: str, n: int, repeat: int = 3) -> dict:
+    gen, n_finishes = CORPORA[name]
+    rng = random.Random(f"{SEED}:{name}")
+    cfg = make_config(n_finishes, rng)
+    params = params_from_config(cfg)
+    jobs = gen(n, rng, cfg)
+
+    out = {}
+
+    # price() con caché de cubicación caliente (una pasada de calentamiento)
+    for q in jobs:
+        price(q, params)
+    out["price"] = _timeit(lambda q: price(q, params), jobs, repeat=repeat)
+
+    # caché de cotizaciones (mismos trabajos ya vistos)
+    quote_cache_clear()
+    for q in jobs:
+        cached_price(q, params)
+    out["price_cached"] = _timeit(lambda q: cached_price(q, params), jobs, repeat=repeat)
+
+    # price() en frío (sin caché de cubicación)
+    out["price_cold"] = _timeit(lambda q: price(q, params), jobs, before=best_layout.cache_clear, repeat=repeat)
+
+    # cubicación sola (mixta, caché frío)
+    out["piezas_por_lado"] = _timeit(
+        lambda q: calc_piezas_por_lado(
+            q.area_w_cm, q.area_h_cm, q.ancho_final_cm, q.alto_final_cm,
+            q.gutter_cm, q.bleed_cm, True, True,
+        ),
+        jobs,
+        before=best_layout.cache_clear,
+        repeat=repeat,
+    )
+
+    # costo de acabado por selección (evaluador compilado)
+    finish_calls = []
+    for q in jobs:
+        metrics = price(replace(q, acabados=()), params).metrics
+        for sel in q.acabados:
+            fdef = params.finishes_by_key[sel.finish_key]
+            finish_calls.append((params.catalog.get(sel.finish_key), metrics, finish_user_inputs(sel, fdef)))
+    if finish_calls:
+        out["finish_cost"] = _timeit(lambda a: a[0].evaluate(a[1], a[2]), finish_calls, repeat=repeat)
+
+    # escalera de precios
+    ladder_q = [1, 100, 500, 1000, 2000, 5000, 10000, 100000]
+    out["ladder"] = _timeit(lambda q: price_ladder(q, params, ladder_q, [1, 2], [4, 1]), jobs[: max(n // 10, 1)], repeat=repeat)
+
+    return out
+
+
+# -------------------------
+# Baselines
+# -------------------------
+def _baseline_path(name: str) -> Path:
+    p = Path(name)
+    if p.suffix == ".json" or p.parent != Path("."):
+        return p
+    return BASELINE_DIR / f"{name}.json"
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    """Imprime la comparación de p50/throughput. Devuelve True si algo empeoró más del umbral."""
+    worse = False
+    print(f"\nComparación vs baseline ({baseline.get('meta', {}).get('created_at', '?')}), umbral {threshold:.0%}")
+    print(f"{'corpus':<18} {'caso':<16} {'p50 base':>10} {'p50 ahora':>10} {'Δ':>8}")
+    for corpus, cases in current["results"].items():
+        for case, st in cases.items():
+            base = baseline.get("results", {}).get(corpus, {}).get(case)
+            if not base:
+                continue
+            delta = st["p50_us"] / base["p50_us"] - 1.0 if base["p50_us"] > 0 else 0.0
+            flag = ""
+            if delta > threshold:
+                flag = "  ⚠ más lento"
+                worse = True
+            print(f"{corpus:<18} {case:<16} {base['p50_us']:>9.1f}µ {st['p50_us']:>9.1f}µ {delta:>+7.1%}{flag}")
+    return worse
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks del motor de precios")
+    ap.add_argument("--n", type=int, default=1000, help="Trabajos por corpus")
+    ap.add_argument("--repeat", type=int, default=3, help="Pasadas por caso (se reporta la mejor)")
+    ap.add_argument("--only", default="", help="Corpus separados por coma (default: todos)")
+    ap.add_argument("--save", default=None, help="Guardar resultados como baseline (nombre o ruta .json)")
+    ap.add_argument("--compare", default=None, help="Comparar contra baseline (nombre o ruta .json)")
+    ap.add_argument("--threshold", type=float, default=0.15, help="Regresión tolerada en p50 (0.15 = 15%%)")
+    args = ap.parse_args()
+
+    names = [s.strip() for s in args.only.split(",") if s.strip()] or list(CORPORA)
+    unknown = [s for s in names if s not in CORPORA]
+    if unknown:
+        raise SystemExit(f"Corpus desconocido: {', '.join(unknown)} (opciones: {', '.join(CORPORA)})")
+
+    results = {}
+    print(f"{'corpus':<18} {'caso':<16} {'p50':>9} {'p95':>9} {'p99':>9} {'ops/s':>11}")
+    for name in names:
+        results[name] = run_corpus(name, args.n, args.repeat)
+        for case, st in results[name].items():
+            print(
+                f"{name:<18} {case:<16} {st['p50_us']:>8.1f}µ {st['p95_us']:>8.1f}µ "
+                f"{st['p99_us']:>8.1f}µ {st['ops_per_s']:>11,.0f}"
+            )
+
+    current = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "n": args.n,
+            "repeat": args.repeat,
+            "seed": SEED,
+        },
+        "results": results,
+    }
+
+    if args.save:
+        path = _baseline_path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(current, indent=2), encoding="utf-8")
+        print(f"\nBaseline guardado: {path}")
+
+    if args.compare:
+        path = _baseline_path(args.compare)
+        if not path.exists():
+            raise SystemExit(f"No existe el baseline: {path}")
+        baseline = json.loads(path.read_text(encoding="utf-8"))
+        if compare(current, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Cotización por lote (sin UI).
+
+Lee trabajos desde CSV o JSONL, los cotiza con el mismo motor que el Cotizador
+(lib/calc.py) contra data/config.json (o un snapshot) en un pool de procesos,
+y escribe las filas con precio a CSV / JSONL / XLSX conforme van saliendo.
+La memoria queda acotada: solo hay `workers * 2` bloques en vuelo a la vez.
+
+Ejemplos:
+  python scripts/cotizar_lote.py licitacion.csv -o precios.xlsx
+  python scripts/cotizar_lote.py trabajos.jsonl -o precios.csv --config snapshot.json --workers 8
+
+Ver lib/batch.py para el formato de columnas (acabados / extras).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.batch import OUTPUT_COLUMNS, chunked, price_records
+from lib.calc import params_from_config
+from lib.config_store import CONFIG_PATH, load_config_file
+from lib.quote_cache import quote_cache_info
+
+# Parámetros de costo por worker (se mandan una sola vez en el initializer)
+_PARAMS = None
+
+
+def _init_worker(cfg: dict) -> None:
+    global _PARAMS
+    _PARAMS = params_from_config(cfg)
+
+
+def _work(args: tuple[list[dict], int]) -> list[dict]:
+    records, first_id = args
+    return price_records(records, _PARAMS, ids_from=first_id)
+
+
+# -------------------------
+# Lectura (streaming)
+# -------------------------
+def read_records(path: Path):
+    suffix = path.suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    elif suffix == ".csv":
+        with path.open("r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+    else:
+        raise SystemExit(f"Formato de entrada no soportado: {suffix} (usa .csv o .jsonl)")
+
+
+# -------------------------
+# Escritura (streaming)
+# -------------------------
+class _CsvSink:
+    def __init__(self, path: Path):
+        self.f = path.open("w", encoding="utf-8", newline="")
+        self.w = csv.DictWriter(self.f, fieldnames=OUTPUT_COLUMNS)
+        self.w.writeheader()
+
+    def write(self, rows):
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+
+class _JsonlSink:
+    def __init__(self, path: Path):
+        self.f = path.open("w", encoding="utf-8")
+
+    def write(self, rows):
+        for r in rows:
+            self.f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.f.close()
+
+
+class _XlsxSink:
+    def __init__(self, path: Path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.wb = Workbook(write_only=True)  # write_only: no guarda filas en memoria
+        self.ws = self.wb.create_sheet("Cotizaciones")
+        self.ws.append(OUTPUT_COLUMNS)
+
+    def write(self, rows):
+        for r in rows:
+            self.ws.append([r.get(c) for c in OUTPUT_COLUMNS])
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+def open_sink(path: Path):
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return _CsvSink(path)
+    if suffix in (".jsonl", ".ndjson"):
+        return _JsonlSink(path)
+    if suffix == ".xlsx":
+        return _XlsxSink(path)
+    raise SystemExit(f"Formato de salida no soportado: {suffix} (usa .csv, .jsonl o .xlsx)")
+
+
+# -------------------------
+# Main
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Cotiza trabajos por lote (CSV/JSONL) con el motor del Cotizador")
+    ap.add_argument("input", help="Archivo de trabajos (.csv o .jsonl)")
+    ap.add_argument("-o", "--output", required=True, help="Archivo de salida (.csv, .jsonl o .xlsx)")
+    ap.add_argument("--config", default=None, help=f"Config o snapshot JSON (default: {CONFIG_PATH})")
+    ap.add_argument("--workers", type=int, default=0, help="Procesos (default: núm. de CPUs; 1 = sin pool)")
+    ap.add_argument("--chunk-size", type=int, default=500, help="Filas por bloque enviado a cada worker")
+    args = ap.parse_args()
+
+    in_path = Path(args.input)
+    if not in_path.exists():
+        raise SystemExit(f"No existe: {in_path}")
+    cfg_path = Path(args.config) if args.config else CONFIG_PATH
+    if not cfg_path.exists():
+        raise SystemExit(f"No existe la config: {cfg_path}")
+
+    cfg = load_config_file(cfg_path)
+    sink = open_sink(Path(args.output))
+
+    t0 = time.perf_counter()
+    n = 0
+    n_err = 0
+    chunk_size = max(int(args.chunk_size), 1)
+
+    def _emit(rows):
+        nonlocal n, n_err
+        sink.write(rows)
+        n += len(rows)
+        n_err += sum(1 for r in rows if r.get("error"))
+
+    # ids por posición (1-based) para filas sin columna id
+    jobs = (
+        (chunk, 1 + i * chunk_size)
+        for i, chunk in enumerate(chunked(read_records(in_path), chunk_size))
+    )
+
+    try:
+        if args.workers == 1:
+            _init_worker(cfg)
+            for job in jobs:
+                _emit(_work(job))
+        else:
+            workers = args.workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(cfg,),
+            ) as ex:
+                max_in_flight = 2 * workers
+                pending = deque()
+                for job in jobs:
+                    pending.append(ex.submit(_work, job))
+                    # Salida en el mismo orden que la entrada; memoria acotada
+                    while len(pending) >= max_in_flight:
+                        _emit(pending.popleft().result())
+                while pending:
+                    _emit(pending.popleft().result())
+    finally:
+        sink.close()
+
+    dt = time.perf_counter() - t0
+    rate = n / dt if dt > 0 else 0.0
+    print(f"{n:,} trabajos cotizados en {dt:.2f}s ({rate:,.0f}/s) · {n_err:,} con error → {args.output}")
+    if args.workers == 1:
+        ci = quote_cache_info()
+        print(f"caché de cotizaciones: {ci['hits']:,} hits / {ci['misses']:,} misses ({ci['hit_rate']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
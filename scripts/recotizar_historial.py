@@ -0,0 +1,200 @@
+"""
+Recotización del historial (tabla quotes de Supabase).
+
+Recorre las cotizaciones guardadas por páginas y las vuelve a cotizar con el
+motor actual (lib/calc.py), en un pool de procesos:
+
+  --modo snapshot   con el config_snapshot de cada fila (verifica reproducibilidad)
+  --modo actual     con la config vigente (mide el drift vs el precio guardado)
+
+Escribe un archivo compacto (CSV o JSONL) con price_total viejo vs nuevo por
+quote_code. Ver lib/repricing.py para las columnas y los status.
+
+Ejemplos:
+  python scripts/recotizar_historial.py -o verificacion.csv --modo snapshot
+  python scripts/recotizar_historial.py -o drift.csv --modo actual --desde 2025-01-01
+  python scripts/recotizar_historial.py -o drift.jsonl --input export_quotes.jsonl   # sin Supabase
+
+Credenciales: SUPABASE_URL / SUPABASE_KEY o [supabase] en .streamlit/secrets.toml.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.batch import chunked
+from lib.calc import params_from_config
+from lib.config_store import CONFIG_PATH, load_config_file
+from lib.repricing import (
+    MODE_ACTUAL, MODE_SNAPSHOT, QUOTE_COLUMNS, RESULT_COLUMNS,
+    STATUS_DIFERENTE, reprice_rows,
+)
+from lib.snapshots import get_snapshots
+
+# Config vigente por worker (solo modo "actual")
+_CURRENT = None
+_MODE = MODE_SNAPSHOT
+
+
+def _init_worker(mode: str, cfg) -> None:
+    global _CURRENT, _MODE
+    _MODE = mode
+    _CURRENT = params_from_config(cfg) if cfg is not None else None
+
+
+def _work(rows: list[dict]) -> list[dict]:
+    return reprice_rows(rows, _MODE, _CURRENT)
+
+
+# -------------------------
+# Fuentes
+# -------------------------
+def iter_supabase(sb, page_size: int, desde=None, hasta=None):
+    offset = 0
+    while True:
+        q = sb.table("quotes").select(QUOTE_COLUMNS)
+        if desde:
+            q = q.gte("created_at", desde)
+        if hasta:
+            q = q.lte("created_at", hasta)
+        res = (
+            q.order("created_at")
+            .order("quote_code")
+            .range(offset, offset + page_size - 1)
+            .execute()
+        )
+        rows = res.data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        offset += page_size
+
+
+def attach_snapshots(chunk: list[dict], sb) -> list[dict]:
+    """Filas nuevas solo traen config_hash: resolver snapshots (caché local / una consulta por bloque)."""
+    need = {r.get("config_hash") for r in chunk if r.get("config_hash") and not r.get("config_snapshot")}
+    if need:
+        snaps = get_snapshots(sb, need)
+        for r in chunk:
+            h = r.get("config_hash")
+            if h and not r.get("config_snapshot"):
+                r["config_snapshot"] = snaps.get(h)
+    return chunk
+
+
+def iter_jsonl(path: Path):
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# -------------------------
+# Main
+# -------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Recotiza el historial de cotizaciones (old vs new price_total)")
+    ap.add_argument("-o", "--output", required=True, help="Archivo de salida (.csv o .jsonl)")
+    ap.add_argument("--modo", choices=[MODE_SNAPSHOT, MODE_ACTUAL], default=MODE_SNAPSHOT)
+    ap.add_argument("--config", default=None, help=f"Config vigente para --modo actual (default: {CONFIG_PATH})")
+    ap.add_argument("--input", default=None, help="Leer rows de quotes desde JSONL en vez de Supabase")
+    ap.add_argument("--desde", default=None, help="created_at >= (ISO, ej. 2025-01-01)")
+    ap.add_argument("--hasta", default=None, help="created_at <= (ISO)")
+    ap.add_argument("--page-size", type=int, default=500, help="Filas por página de Supabase / bloque por worker")
+    ap.add_argument("--workers", type=int, default=0, help="Procesos (default: núm. de CPUs; 1 = sin pool)")
+    args = ap.parse_args()
+
+    out_path = Path(args.output)
+    if out_path.suffix.lower() not in (".csv", ".jsonl", ".ndjson"):
+        raise SystemExit(f"Formato de salida no soportado: {out_path.suffix} (usa .csv o .jsonl)")
+
+    cfg = None
+    if args.modo == MODE_ACTUAL:
+        cfg_path = Path(args.config) if args.config else CONFIG_PATH
+        if not cfg_path.exists():
+            raise SystemExit(f"No existe la config: {cfg_path}")
+        cfg = load_config_file(cfg_path)
+
+    page_size = max(int(args.page_size), 1)
+    sb = None
+    if args.input:
+        src = Path(args.input)
+        if not src.exists():
+            raise SystemExit(f"No existe: {src}")
+        rows = iter_jsonl(src)
+    else:
+        from lib.supa import create_supabase_client
+
+        sb = create_supabase_client()
+        rows = iter_supabase(sb, page_size, args.desde, args.hasta)
+
+    chunks = chunked(rows, page_size)
+    if args.modo == MODE_SNAPSHOT:
+        chunks = (attach_snapshots(c, sb) for c in chunks)
+
+    t0 = time.perf_counter()
+    status = Counter()
+    deltas = []
+
+    f = out_path.open("w", encoding="utf-8", newline="")
+    writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS) if out_path.suffix.lower() == ".csv" else None
+    if writer:
+        writer.writeheader()
+
+    def _emit(results):
+        for r in results:
+            status[r["status"]] += 1
+            if r["status"] == STATUS_DIFERENTE and r["delta_pct"] is not None:
+                deltas.append(r["delta_pct"])
+            if writer:
+                writer.writerow(r)
+            else:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    try:
+        if args.workers == 1:
+            _init_worker(args.modo, cfg)
+            for chunk in chunks:
+                _emit(_work(chunk))
+        else:
+            workers = args.workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(args.modo, cfg),
+            ) as ex:
+                max_in_flight = 2 * workers
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(ex.submit(_work, chunk))
+                    while len(pending) >= max_in_flight:
+                        _emit(pending.popleft().result())
+                while pending:
+                    _emit(pending.popleft().result())
+    finally:
+        f.close()
+
+    dt = time.perf_counter() - t0
+    n = sum(status.values())
+    print(f"{n:,} cotizaciones recotizadas en {dt:.2f}s (modo {args.modo}) → {args.output}")
+    for k, v in sorted(status.items()):
+        print(f"  {k or '(vacío)'}: {v:,}")
+    if deltas:
+        deltas.sort()
+        print(
+            f"  drift: min {deltas[0]:+.2%} · mediana {deltas[len(deltas) // 2]:+.2%} · max {deltas[-1]:+.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
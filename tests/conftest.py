@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Igual que las páginas: la raíz del repo en sys.path para importar lib.*
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
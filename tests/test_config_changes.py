@@ -0,0 +1,78 @@
+from lib.config_changes import ChangeTracker, apply_editor_delta, diff_values
+
+ORIGINAL = {
+    "margen": {"margen": 0.4},
+    "impresion": {"mo_dep": 0.06, "click": 0.35},
+    "acabados": [
+        {"key": "barniz_uv", "nombre": "Barniz UV", "rate": 1.3},
+        {"key": "doblado", "nombre": "Doblado", "rate": 1.5},
+    ],
+    "pliegos": [{"key": "48x33", "w": 48.0, "h": 33.0}, {"key": "70x95", "w": 70.0, "h": 95.0}],
+}
+
+
+def test_diff_por_key_inserta_sin_correr_indices():
+    nuevo = [{"key": "anillado", "nombre": "Anillado", "rate": 2.0}] + ORIGINAL["acabados"]
+    cambios = diff_values(ORIGINAL["acabados"], nuevo, "acabados.")
+    assert [c[0] for c in cambios] == ["acabados[anillado]"]
+
+
+def test_diff_por_key_edita_y_borra():
+    nuevo = [{"key": "barniz_uv", "nombre": "Barniz UV", "rate": 1.4}]
+    cambios = {p: (a, b) for p, a, b in diff_values(ORIGINAL["acabados"], nuevo, "acabados.")}
+    assert cambios["acabados[barniz_uv].rate"] == (1.3, 1.4)
+    assert cambios["acabados[doblado]"][1] is None
+    assert len(cambios) == 2
+
+
+def test_diff_sin_key_es_por_indice():
+    assert diff_values([1, 2], [1, 3], "x.") == [("x[1]", 2, 3)]
+    assert diff_values([1, 2], [1, 2, 3], "x.") == [("x", [1, 2], [1, 2, 3])]
+
+
+def test_tracker_set_registra_y_deshace():
+    t = ChangeTracker(ORIGINAL)
+    t.set(("margen", "margen"), 0.55)
+    assert t.changes() == [("margen.margen", 0.4, 0.55)]
+    assert ORIGINAL["margen"]["margen"] == 0.4  # copia al escribir
+    assert t.cfg["impresion"] is ORIGINAL["impresion"]  # lo no tocado se comparte
+    t.set(("margen", "margen"), 0.4)
+    assert len(t) == 0
+
+
+def test_tracker_record_item():
+    t = ChangeTracker(ORIGINAL)
+    items = t.edit_list(("acabados",))
+    items.append({"key": "grapa", "nombre": "Grapa", "rate": 1.5})
+    t.record_item(("acabados",), "grapa", items[-1])
+    t.record_item(("acabados",), "doblado", None)
+    assert [c[0] for c in t.changes()] == ["acabados[doblado]", "acabados[grapa]"]
+    assert len(ORIGINAL["acabados"]) == 2
+
+
+def _norm(r):
+    if not r.get("key"):
+        return None
+    return {"key": r["key"], "w": float(r.get("w") or 0.0), "h": float(r.get("h") or 0.0)}
+
+
+def test_apply_editor_delta():
+    base = ORIGINAL["pliegos"]
+    delta = {
+        "edited_rows": {"1": {"w": 72}},
+        "added_rows": [{"key": "60x90", "w": 60, "h": 90}, {"key": "", "w": None}],
+        "deleted_rows": [0],
+    }
+    out = apply_editor_delta(base, delta, _norm)
+    assert out == [{"key": "70x95", "w": 72.0, "h": 95.0}, {"key": "60x90", "w": 60.0, "h": 90.0}]
+
+
+def test_apply_editor_delta_conserva_filas_no_tocadas():
+    base = ORIGINAL["pliegos"]
+    out = apply_editor_delta(base, {"edited_rows": {0: {"h": 34}}}, _norm)
+    assert out[1] is base[1]
+    assert apply_editor_delta(base, None, _norm) == base
+
+    t = ChangeTracker(ORIGINAL)
+    t.set_list(("pliegos",), out)
+    assert t.changes() == [("pliegos[48x33].h", 33.0, 34.0)]
@@ -0,0 +1,54 @@
+import pytest
+
+import lib.config_history as ch
+from lib.config_store import REVISION_KEY
+
+
+@pytest.fixture
+def historial(tmp_path, monkeypatch):
+    monkeypatch.setattr(ch, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(ch, "HISTORY_PATH", tmp_path / "config_history.jsonl")
+    monkeypatch.setattr(ch, "INDEX_PATH", tmp_path / "config_history.idx")
+    return ch
+
+
+def _cfg(rev):
+    return {REVISION_KEY: rev, "margen": {"margen": 0.4 + rev / 100}}
+
+
+def test_append_y_lectura(historial):
+    assert historial.append_version(_cfg(1), "ana", previous=_cfg(0)) == 1
+    assert historial.append_version(_cfg(2), "beto") == 2
+    assert historial.history_count() == 3
+    assert [v["revision"] for v in historial.list_versions()] == [2, 1, 0]
+    assert [v["saved_by"] for v in historial.list_versions(limit=2)] == ["beto", "ana"]
+    assert historial.read_version(1)["config"] == _cfg(1)
+    with pytest.raises(IndexError):
+        historial.read_version(3)
+
+
+def test_repara_linea_sin_registro(historial):
+    historial.append_version(_cfg(1), "ana")
+    historial.append_version(_cfg(2), "beto")
+    # caída entre la línea y su registro: el índice pierde el último
+    raw = historial.INDEX_PATH.read_bytes()
+    historial.INDEX_PATH.write_bytes(raw[: historial._RECORD.size])
+    assert historial.history_count() == 1
+
+    historial.append_version(_cfg(3), "carla")
+    assert historial.history_count() == 3
+    assert [historial.read_version(n)["revision"] for n in range(3)] == [1, 2, 3]
+
+
+def test_repara_registro_incompleto_y_linea_a_medias(historial):
+    historial.append_version(_cfg(1), "ana")
+    # registro del índice a medias + línea sin salto de línea al final del .jsonl
+    with open(historial.INDEX_PATH, "ab") as idx:
+        idx.write(b"\0" * 7)
+    with open(historial.HISTORY_PATH, "ab") as f:
+        f.write(b'{"revision": 2, "config": {')
+
+    historial.append_version(_cfg(3), "carla")
+    assert historial.history_count() == 2
+    assert historial.read_version(1)["config"] == _cfg(3)
+    assert historial.HISTORY_PATH.read_bytes().count(b"\n") == 2
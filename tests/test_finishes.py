@@ -0,0 +1,44 @@
+from lib.finishes import FinishCatalog
+
+
+def _acabados():
+    return [
+        {"key": "barniz_uv", "display_name": "Barniz UV"},
+        {"key": "doblado", "display_name": "Doblado"},
+        {"key": "grapa", "display_name": "Grapa"},
+        {"key": "hot_melt", "display_name": "Hot melt"},
+        {"key": "barniz_uv_2", "display_name": "Barniz UV"},  # nombre duplicado
+    ]
+
+
+def test_delete_conserva_el_orden():
+    items = _acabados()
+    cat = FinishCatalog(items)
+    cat.delete(1)
+    assert [f["key"] for f in items] == ["barniz_uv", "grapa", "hot_melt", "barniz_uv_2"]
+    cat.delete(0)
+    assert [f["key"] for f in items] == ["grapa", "hot_melt", "barniz_uv_2"]
+
+
+def test_delete_actualiza_indices():
+    items = _acabados()
+    cat = FinishCatalog(items)
+    cat.delete(1)
+    for i, f in enumerate(items):
+        assert cat.find_by_key(f["key"]) == (i, f)
+    assert cat.find_by_key("doblado") == (None, None)
+
+    cat.delete(0)  # con el duplicado, gana el siguiente "Barniz UV"
+    assert cat.find_by_display_name("Barniz UV") == (2, items[2])
+    assert cat.find_by_name_insensitive("barniz  uv") == (2, items[2])
+    assert cat.display_names() == ["Barniz UV", "Grapa", "Hot melt"]
+
+
+def test_add_y_update():
+    items = _acabados()
+    cat = FinishCatalog(items)
+    i = cat.add({"key": "troquel", "display_name": "Troquel"})
+    assert cat.find_by_key("troquel") == (i, items[i])
+    cat.update(0, {"key": "barniz_mate", "display_name": "Barniz mate"})
+    assert cat.find_by_key("barniz_uv") == (None, None)
+    assert cat.find_by_display_name("Barniz UV") == (4, items[4])
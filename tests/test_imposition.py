@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from lib.calc import calc_piezas_por_lado
+from lib.imposition import ORIENT_MIXTO, ORIENT_NORMAL, ORIENT_ROTADO, best_layout
+
+
+def _rejilla(area_w, area_h, w, h, bleed, g, allow_rotate):
+    """calc_piezas_por_lado antes de lib/imposition.py (solo rejilla pura)."""
+    w_eff, h_eff = w + 2 * bleed, h + 2 * bleed
+
+    def fit(aw, ah, pw, ph):
+        nx = int((aw + g) // (pw + g)) if (pw + g) > 0 else 0
+        ny = int((ah + g) // (ph + g)) if (ph + g) > 0 else 0
+        return max(nx, 0) * max(ny, 0)
+
+    fit1 = fit(area_w, area_h, w_eff, h_eff)
+    fit2 = fit(area_w, area_h, h_eff, w_eff) if allow_rotate else 0
+    if fit2 > fit1:
+        return fit2, ORIENT_ROTADO
+    return fit1, ORIENT_NORMAL
+
+
+def test_sin_mixto_igual_a_la_rejilla():
+    rng = random.Random(20240601)
+    for _ in range(2000):
+        area_w, area_h = rng.uniform(20, 100), rng.uniform(20, 100)
+        w, h = rng.uniform(2, 40), rng.uniform(2, 40)
+        bleed, g = rng.choice([0.0, 0.3, 0.5]), rng.choice([0.0, 0.2, 0.5])
+        rot = rng.random() < 0.7
+        up, orient, _, _ = calc_piezas_por_lado(area_w, area_h, w, h, g, bleed, rot, allow_mixed=False)
+        assert (up, orient) == _rejilla(area_w, area_h, w, h, bleed, g, rot)
+
+
+def test_mixto_nunca_empeora():
+    rng = random.Random(7)
+    for _ in range(500):
+        args = (rng.uniform(20, 100), rng.uniform(20, 100), rng.uniform(2, 40), rng.uniform(2, 40), 0.3, 0.2)
+        pura = best_layout(*args, True, False)
+        mixto = best_layout(*args, True, True)
+        assert mixto.up >= pura.up
+        if mixto.orientacion == ORIENT_MIXTO:
+            assert mixto.up > pura.up
+            assert sum(b.up for b in mixto.blocks) == mixto.up
+
+
+def test_mixto_mejora_un_caso_conocido():
+    # 10×7 en 33×48: rejilla pura 3×6 = 18 (rotada 4×4 = 16); mixto 3×4 + 4×2 = 20
+    pura = best_layout(33.0, 48.0, 10.0, 7.0, 0.0, 0.0, True, False)
+    mixto = best_layout(33.0, 48.0, 10.0, 7.0, 0.0, 0.0, True, True)
+    assert pura.up == 18
+    assert mixto.up == 20
+    assert mixto.describe().startswith(ORIENT_MIXTO)
+
+
+@pytest.mark.parametrize("w, h", [(0.0, 5.0), (-1.0, 5.0)])
+def test_pieza_invalida(w, h):
+    up, orient, _, _ = calc_piezas_por_lado(48.0, 33.0, w, h, 0.0, 0.0, True)
+    assert up == 0
+    assert orient == "Inválido"
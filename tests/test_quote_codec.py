@@ -0,0 +1,108 @@
+import copy
+
+from lib.quote_codec import PAYLOAD_VERSION, decode_quote_row, encode_quote_payload, payload_version
+
+# Fila v2 tal como la guarda el Cotizador (admin: con costos)
+INPUTS_V2 = {
+    "_v": 2,
+    "tipo_producto": "Extendido",
+    "ancho_final_cm": 21.5,
+    "alto_final_cm": 28.0,
+    "tiraje_piezas": 1000,
+    "lados": 1,
+    "n_tintas": 4,
+    "tipo_papel": "Couché",
+    "papel_gramaje_gm2": 150.0,
+    "hoja_w_cm": 48.0,
+    "hoja_h_cm": 33.0,
+    "area_w_cm": 47.4,
+    "area_h_cm": 32.4,
+    "bleed_cm": 0.3,
+    "gutter_cm": 0.2,
+    "allow_rotate": True,
+    "allow_mixed": False,
+    "orientacion": "Normal",
+    "piezas_por_lado": 2,
+    "hojas_fisicas": 500,
+    "hojas_con_merma": 550,
+    "clicks_facturable": 1000.0,
+    "cobertura_tinta_base_pct": 7.5,
+    "acabados_items": [
+        {
+            "type": "computed",
+            "finish_key": "barniz_uv",
+            "display_name": "Barniz UV",
+            "inputs": {"coverage": 1.0},
+            "total": 1400.0,
+            "breakdown": {
+                "basis": "sheet_m2_total", "calc_type": "min_or_unit", "minimum": 1400.0,
+                "qty_base": 79.2, "qty_used": 79.2, "rate": 1.3, "rounding": "none",
+                "setup": 0.0, "variable": 102.96,
+            },
+        },
+        {"type": "manual_total", "display_name": "Troquel", "total": 350.0, "breakdown": {"manual_total": True}},
+    ],
+    "adicionales_items": [{"concepto": "Flete", "importe": 300.0}],
+}
+BREAKDOWN_V2 = {
+    "costos": {
+        "impresion_total": 900.0, "mo_dep_unit": 0.06, "tinta_unit": 0.39, "click_unit": 0.35,
+        "cobertura_op_unit": 0.1, "papel_costo_kg": 21.0, "costo_hoja": 0.49896, "merma": 0.1,
+        "papel_total": 274.428, "subtotal": 3224.428, "margen": 0.4,
+    }
+}
+ROW_V2 = {
+    "quote_code": "Q-1",
+    "price_unit": 4.5142,
+    "price_total": 4514.2,
+    "inputs": INPUTS_V2,
+    "breakdown": BREAKDOWN_V2,
+}
+
+
+def test_v2_decodifica_a_forma_v1():
+    row = decode_quote_row(ROW_V2)
+    inputs, bd = row["inputs"], row["breakdown"]
+    assert "_v" not in inputs
+    assert inputs["clicks_maquina"] == 500
+    assert inputs["acabados_total"] == 1750.0
+    assert inputs["adicionales_total"] == 300.0
+    assert inputs["acabados_metrics"]["sheets_total"] == 500
+    assert inputs["papel_costo_kg_aplicado"] == 21.0
+    assert inputs["acabados_items"][0]["breakdown"]["total"] == 1400.0
+    assert bd["impresion"]["total"] == 900.0
+    assert bd["papel"]["hojas_con_merma"] == 550
+    assert bd["totales"]["margen"] == 0.4
+    assert bd["totales"]["precio_total"] == 4514.2
+
+
+def test_v2_v1_v2_ida_y_vuelta():
+    row = decode_quote_row(ROW_V2)
+    inputs, bd = encode_quote_payload(row["inputs"], row["breakdown"])
+    assert inputs == INPUTS_V2
+    assert bd == BREAKDOWN_V2
+
+
+def test_decode_no_muta_la_fila():
+    original = copy.deepcopy(ROW_V2)
+    decode_quote_row(ROW_V2)
+    assert ROW_V2 == original
+
+
+def test_v1_pasa_tal_cual():
+    row_v1 = {"quote_code": "Q-0", "inputs": {"tipo_producto": "Extendido", "clicks_maquina": 10}, "breakdown": {}}
+    assert payload_version(row_v1) == 1
+    assert decode_quote_row(row_v1) is row_v1
+
+
+def test_vendedor_sin_costos():
+    row = decode_quote_row(ROW_V2)
+    bd_vendedor = {"totales": {"precio_total": 4514.2, "margen": None}}
+    inputs, bd = encode_quote_payload(row["inputs"], bd_vendedor)
+    assert inputs["_v"] == PAYLOAD_VERSION
+    assert bd == {}
+    dec = decode_quote_row({**ROW_V2, "inputs": inputs, "breakdown": bd})
+    assert "papel_costo_kg_aplicado" not in dec["inputs"]
+    # misma forma que guardaba el Cotizador para vendedor (v1)
+    assert dec["breakdown"]["totales"]["margen"] is None
+    assert "costo_kg" not in dec["breakdown"]["papel"]
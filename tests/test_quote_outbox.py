@@ -0,0 +1,137 @@
+import pytest
+from postgrest.exceptions import APIError
+
+import lib.quote_outbox as qo
+from lib.quote_outbox import (
+    REJECT_MAX_ATTEMPTS,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_SYNCED,
+    QuoteOutbox,
+    backoff_s,
+    is_rejection,
+)
+
+
+class FakeSupabase:
+    """sb.table(...).upsert(...).execute(); `errors[quote_code]` = excepción a lanzar."""
+
+    def __init__(self):
+        self.upserts = []
+        self.errors = {}
+
+    def table(self, name):
+        self._table = name
+        return self
+
+    def upsert(self, row, **kw):
+        self._row, self._kw = row, kw
+        return self
+
+    def execute(self):
+        err = self.errors.get(self._row.get("quote_code"))
+        if err is not None:
+            raise err
+        self.upserts.append((self._table, self._row, self._kw))
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    # sin espera entre intentos: cada flush toma todas las pendientes
+    monkeypatch.setattr(qo, "backoff_s", lambda attempts: -1.0)
+    return QuoteOutbox(":memory:")
+
+
+def _status(ob, code):
+    return ob.status([code])[code]
+
+
+def test_enqueue_idempotente(outbox):
+    outbox.enqueue({"quote_code": "A", "price_total": 1.0})
+    outbox.enqueue({"quote_code": "A", "price_total": 2.0})
+    assert outbox.pending_count() == 1
+
+    sb = FakeSupabase()
+    assert outbox.flush(sb) == 1
+    table, row, kw = sb.upserts[0]
+    assert (table, row["price_total"]) == ("quotes", 1.0)
+    assert kw["on_conflict"] == "quote_code" and kw["ignore_duplicates"]
+    assert _status(outbox, "A").status == STATUS_SYNCED
+    assert outbox.flush(sb) == 0  # synced no se reenvía
+
+
+def test_error_de_red_corta_la_vuelta(outbox):
+    for c in ("A", "B"):
+        outbox.enqueue({"quote_code": c})
+    sb = FakeSupabase()
+    sb.errors["A"] = ConnectionError("sin red")
+    assert outbox.flush(sb) == 0
+    assert sb.upserts == []  # B no se intentó
+    a = _status(outbox, "A")
+    assert (a.status, a.attempts) == (STATUS_PENDING, 1)
+    assert "sin red" in a.last_error
+
+    del sb.errors["A"]
+    assert outbox.flush(sb) == 2
+    assert outbox.pending_count() == 0
+
+
+def test_rechazo_termina_en_failed_sin_detener_a_las_demas(outbox):
+    for c in ("X", "Y"):
+        outbox.enqueue({"quote_code": c})
+    sb = FakeSupabase()
+    sb.errors["X"] = APIError({"code": "23502", "message": "null value"})
+
+    assert outbox.flush(sb) == 1  # Y sube aunque X fue rechazada
+    for _ in range(REJECT_MAX_ATTEMPTS - 1):
+        assert _status(outbox, "X").status == STATUS_PENDING
+        outbox.flush(sb)
+    x = _status(outbox, "X")
+    assert (x.status, x.attempts) == (STATUS_FAILED, REJECT_MAX_ATTEMPTS)
+    assert outbox.failed_count() == 1
+    assert outbox.flush(sb) == 0  # failed no se reintenta sola
+
+    del sb.errors["X"]
+    outbox.retry_now()
+    x = _status(outbox, "X")
+    assert (x.status, x.attempts) == (STATUS_PENDING, 0)
+    assert outbox.flush(sb) == 1
+    assert outbox.failed_count() == 0
+
+
+def test_backoff_respeta_next_attempt_at(monkeypatch):
+    monkeypatch.setattr(qo, "backoff_s", lambda attempts: 3600.0)
+    ob = QuoteOutbox(":memory:")
+    ob.enqueue({"quote_code": "A"})
+    sb = FakeSupabase()
+    sb.errors["A"] = ConnectionError("sin red")
+    ob.flush(sb)
+    del sb.errors["A"]
+    assert ob.flush(sb) == 0  # aún no vence
+    ob.retry_now()
+    assert ob.flush(sb) == 1
+
+
+def test_backoff_exponencial_con_tope():
+    for attempts in range(1, 12):
+        base = min(qo.BACKOFF_BASE_S * 2 ** (attempts - 1), qo.BACKOFF_MAX_S)
+        assert 0.8 * base <= backoff_s(attempts) <= 1.2 * base
+
+
+@pytest.mark.parametrize(
+    "err, rechazo",
+    [
+        (ConnectionError("timeout"), False),
+        (APIError({"code": 409, "message": "conflict"}), True),
+        (APIError({"code": 503, "message": "unavailable"}), False),
+        (APIError({"code": "23505", "message": "duplicate"}), True),
+        (APIError({"code": "42501", "message": "permission denied"}), True),
+        (APIError({"code": "08006", "message": "connection failure"}), False),
+        (APIError({"code": "40001", "message": "serialization"}), False),
+        (APIError({"code": "PGRST000", "message": "db down"}), False),
+        (APIError({"code": "PGRST204", "message": "column not found"}), True),
+        (APIError({"message": "sin código"}), False),
+    ],
+)
+def test_is_rejection(err, rechazo):
+    assert is_rejection(err) is rechazo
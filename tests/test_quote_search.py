@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+
+from lib.quote_list import QuoteFilters
+from lib.quote_search import SqliteQuoteSearch, search_terms
+
+ROWS = [
+    {
+        "quote_code": "Q-2025-001", "quote_number": 1, "created_at": "2025-01-02T18:00:00+00:00",
+        "created_by": "ana", "customer_name": "José Pérez", "notes": "Volantes couché",
+        "inputs": {"tipo_producto": "Extendido", "tipo_papel": "Couché"}, "price_total": 100.0,
+    },
+    {
+        "quote_code": "Q-2025-002", "quote_number": 2, "created_at": "2025-01-03T18:00:00+00:00",
+        "created_by": "beto", "customer_name": "Imprenta Jose", "notes": "Libro bond",
+        "inputs": {"tipo_producto": "Libro", "tipo_papel": "Bond"}, "price_total": 200.0,
+    },
+    {
+        "quote_code": "Q_2025-003", "quote_number": 3, "created_at": "2025-02-10T18:00:00+00:00",
+        "created_by": "ana", "customer_name": "Papelería Sur", "notes": "Couché 150 tarjetas",
+        "inputs": {"tipo_producto": "Extendido", "tipo_papel": "Couché"}, "price_total": 300.0,
+    },
+]
+
+
+@pytest.fixture
+def idx():
+    s = SqliteQuoteSearch(":memory:")
+    assert s.index(ROWS) == 3
+    return s
+
+
+def _codes(rows):
+    return sorted(r["quote_code"] for r in rows)
+
+
+def test_search_terms():
+    assert search_terms("Couché, 150  JUAN") == ["couche", "150", "juan"]
+
+
+def test_prefijos_sin_acentos(idx):
+    assert _codes(idx.search("couch")) == ["Q-2025-001", "Q_2025-003"]
+    assert _codes(idx.search("jose")) == ["Q-2025-001", "Q-2025-002"]
+    assert _codes(idx.search("couche tarj")) == ["Q_2025-003"]
+    assert idx.search("   ") == []
+
+
+def test_filtros(idx):
+    assert _codes(idx.search("couche", QuoteFilters(created_by="ana"))) == ["Q-2025-001", "Q_2025-003"]
+    assert _codes(idx.search("couche", QuoteFilters(number=3))) == ["Q_2025-003"]
+    assert _codes(idx.search("jose", QuoteFilters(customer="PEREZ"))) == ["Q-2025-001"]
+    assert _codes(idx.search("couche", QuoteFilters(date_from=date(2025, 2, 1)))) == ["Q_2025-003"]
+    assert _codes(idx.search("jose", QuoteFilters(date_to=date(2025, 1, 2)))) == ["Q-2025-001"]
+
+
+def test_prefijo_de_id_escapa_comodines(idx):
+    # "_" en LIKE es comodín: sin escape "Q_" también tomaría "Q-..."
+    assert _codes(idx.search("couche", QuoteFilters(code="Q_"))) == ["Q_2025-003"]
+    assert _codes(idx.search("couche", QuoteFilters(code="Q-2025"))) == ["Q-2025-001"]
+
+
+def test_reindexar_reemplaza(idx):
+    idx.index([{**ROWS[0], "notes": "Carteles", "inputs": {"tipo_papel": "Bond"}}])
+    assert _codes(idx.search("couche")) == ["Q_2025-003"]
+    assert _codes(idx.search("carteles")) == ["Q-2025-001"]
+    assert idx.max_quote_number() == 3
+